@@ -0,0 +1,72 @@
+"""
+Fravær som intervaller per bruker: hvem er borte, og hvilke dager er ledige.
+
+En bruker kan ikke ha overlappende fravær (Absence.save() avviser det), så
+brukerens perioder er sortert både på startdato og sluttdato. Da er det nok å
+se på ett fravær for å avgjøre overlapp med en periode: det med størst
+startdato <= periodens slutt (forgjengeren). Det er én indekssøking på
+(user, start_date, end_date) (absence_user_period_idx), altså logaritmisk i
+antall fravær; se Absence.overlapping().
+
+Ledige dager for en bruker leses på samme måte: fraværene som starter i
+perioden pluss forgjengeren, i stedet for alle brukerens fravær. Radene
+legges i et IntervalList (sortert liste med bisect), som svarer på overlapp
+uten å gå gjennom alle intervallene.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.db.models import Q, Subquery
+
+from .availability import date_range
+from .models import Absence
+
+
+class IntervalList:
+    """ Sorterte, ikke-overlappende datointervaller (start, slutt, data) for én bruker. """
+
+    def __init__(self, intervals=()):
+        self.intervals = sorted(intervals, key=lambda interval: interval[0])
+        self.starts = [interval[0] for interval in self.intervals]
+
+    def overlapping(self, start, end):
+        """ Intervallene som overlapper start..end (inkl.), i rekkefølge. """
+        index = bisect_right(self.starts, end) # Første med start > end
+        found = []
+        # Sluttdatoene er også sortert: stopp ved første som slutter før start
+        while index > 0 and self.intervals[index - 1][1] >= start:
+            index -= 1
+            found.append(self.intervals[index])
+        return found[::-1]
+
+    def free_days(self, start, end):
+        busy = set()
+        for interval_start, interval_end, _ in self.overlapping(start, end):
+            busy.update(date_range(max(interval_start, start), min(interval_end, end)))
+        return [day for day in date_range(start, end) if day not in busy]
+
+
+def user_intervals(user_id, start, end):
+    """ IntervalList med brukerens fravær som overlapper perioden (to indekssøk). """
+    predecessor = Absence.objects.filter(user_id=user_id, start_date__lt=start).order_by('-start_date').values('pk')[:1]
+    rows = Absence.objects.filter(
+        Q(start_date__gte=start, start_date__lte=end) | Q(pk=Subquery(predecessor)), user_id=user_id,
+    ).values_list('start_date', 'end_date', 'pk', 'absence_type')
+    return IntervalList((row[0], row[1], {'id': row[2], 'absence_type': row[3]}) for row in rows)
+
+
+def free_days(user_id, start, end):
+    return user_intervals(user_id, start, end).free_days(start, end)
+
+
+def absent_users(start, end):
+    """
+    {bruker-id: [fravær]} for brukere med fravær som overlapper perioden,
+    avgrenset på indeksen absence_period_idx (end_date >= start, start_date <= end).
+    """
+    rows = Absence.objects.filter(end_date__gte=start, start_date__lte=end).order_by(
+        'user_id', 'start_date').values('id', 'user_id', 'start_date', 'end_date', 'absence_type')
+    absent = defaultdict(list)
+    for row in rows:
+        absent[row.pop('user_id')].append(row)
+    return absent
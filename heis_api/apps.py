@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class HeisApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'heis_api'
+
+    def ready(self):
+        from . import signals  # noqa: F401 (kobler til signalhåndterere)
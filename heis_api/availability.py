@@ -0,0 +1,126 @@
+""" Beregner tilgjengelighetsmatrise (tekniker x dag) på serversiden. """
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import User, Assignment, Absence
+
+# Maks antall dager som kan hentes i én forespørsel
+MAX_RANGE_DAYS = 366
+
+
+def _parse_date_param(params, key):
+    raw = params.get(key)
+    if not raw:
+        return None
+    try:
+        value = parse_date(raw)
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValidationError({key: 'Ugyldig dato, bruk formatet YYYY-MM-DD.'})
+    return value
+
+
+def parse_date_range(params, start_key='start', end_key='end', default_days=7):
+    """
+    Leser og validerer et datointervall fra query-parametre. end er inkludert;
+    uten end blir perioden default_days dager lang fra og med start.
+    """
+    start = _parse_date_param(params, start_key) or timezone.localdate()
+    end = _parse_date_param(params, end_key) or start + timedelta(days=default_days - 1)
+    if end < start:
+        raise ValidationError({'detail': 'Sluttdato kan ikke være før startdato.'})
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValidationError({'detail': f'Perioden kan ikke være lengre enn {MAX_RANGE_DAYS} dager.'})
+    return start, end
+
+
+def date_range(start, end):
+    """ Returnerer alle datoer fra og med start til og med end. """
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def day_bounds(start, end):
+    """ Gjør om et datointervall (inkl. end) til tidssone-bevisste [fra, til) grenser. """
+    tz = timezone.get_current_timezone()
+    start_dt = timezone.make_aware(datetime.combine(start, time.min), tz)
+    end_dt = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+    return start_dt, end_dt
+
+
+def build_availability_matrix(start, end):
+    """
+    Bygger en kompakt tekniker x dag-matrise for perioden start..end (inkl.).
+
+    Bruker tre avgrensede spørringer: aktive teknikere, oppdrag gruppert per
+    tekniker og dag innenfor perioden, og fravær som overlapper perioden.
+    Hver tekniker får parallelle lister (én verdi per dag) med antall oppdrag,
+    fraværstype (eller None) og om dagen er ledig.
+    """
+    days = date_range(start, end)
+    day_index = {day: idx for idx, day in enumerate(days)}
+    start_dt, end_dt = day_bounds(start, end)
+
+    technicians = list(
+        User.objects.filter(role='tekniker', is_active=True)
+        .order_by('username')
+        .values('id', 'username', 'first_name', 'last_name')
+    )
+    rows = {}
+    for tech in technicians:
+        rows[tech['id']] = {
+            'id': tech['id'],
+            'username': tech['username'],
+            'name': f"{tech['first_name']} {tech['last_name']}".strip() or tech['username'],
+            'assignments': [0] * len(days),
+            'absence': [None] * len(days),
+            'free': [True] * len(days),
+        }
+
+    assignment_counts = (
+        Assignment.objects.filter(
+            assigned_to__isnull=False,
+            scheduled_date__gte=start_dt,
+            scheduled_date__lt=end_dt,
+        )
+        .exclude(status='cancelled')
+        .annotate(day=TruncDate('scheduled_date'))
+        .values('assigned_to', 'day')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    for entry in assignment_counts:
+        row = rows.get(entry['assigned_to'])
+        idx = day_index.get(entry['day'])
+        if row is None or idx is None:
+            continue
+        row['assignments'][idx] = entry['count']
+        row['free'][idx] = False
+
+    absences = (
+        Absence.objects.filter(end_date__gte=start, start_date__lte=end)
+        .values_list('user_id', 'start_date', 'end_date', 'absence_type')
+        .order_by()
+    )
+    for user_id, absence_start, absence_end, absence_type in absences:
+        row = rows.get(user_id)
+        if row is None:
+            continue
+        first = day_index[max(absence_start, start)]
+        last = day_index[min(absence_end, end)]
+        for idx in range(first, last + 1):
+            row['absence'][idx] = absence_type
+            row['free'][idx] = False
+
+    return {
+        'start': start,
+        'end': end,
+        'days': days,
+        'absence_types': dict(Absence.ABSENCE_TYPE_CHOICES),
+        'technicians': list(rows.values()),
+    }
@@ -0,0 +1,165 @@
+"""
+Rammeverk for datareparasjoner (backfills) som kan avbrytes og gjenopptas.
+
+En jobb angir hvilke rader som skal endres (pending) og hva de skal settes til
+(updates, typisk F-uttrykk). Kjøringen går gjennom tabellen i pk-bolker:
+
+    UPDATE ... SET <updates> WHERE pk > :siste AND pk <= :grense AND <pending>
+
+Hver bolk og sjekkpunktet (BackfillCheckpoint) lagres i samme transaksjon, så
+en avbrutt kjøring fortsetter der den slapp uten å gjøre noe to ganger. Med
+flere arbeidere deles pk-området [min, maks] i like store deler, én per
+arbeider, som enten startes som egne prosesser eller kjøres hver for seg med
+--worker (f.eks. på flere maskiner). Tørrkjøring teller radene uten å endre noe.
+
+Nye jobber registreres med @register og kjøres med `manage.py backfill <navn>`.
+Som standard fyller en jobb bare inn det som mangler; verdier som allerede er
+satt, regnes bare ut på nytt med --overwrite (overwrite=True).
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import DateField, ExpressionWrapper, Q, Value
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+
+from .models import Assignment, BackfillCheckpoint
+
+DEFAULT_CHUNK_SIZE = 5000
+
+BACKFILLS = {}
+
+
+def register(cls):
+    BACKFILLS[cls.name] = cls
+    return cls
+
+
+class Backfill:
+    name = None
+    model = None
+    help = ''
+
+    def __init__(self, overwrite=False):
+        self.overwrite = overwrite
+
+    def get_queryset(self):
+        """ Radene jobben i det hele tatt ser på (bolkgrensene regnes ut fra disse). """
+        return self.model._default_manager.all()
+
+    def pending(self):
+        """ Q for radene i en bolk som faktisk må endres. """
+        return Q()
+
+    def updates(self):
+        """ Kolonne -> verdi/uttrykk for QuerySet.update(). """
+        raise NotImplementedError
+
+
+@register
+class AssignmentDeadlineBackfill(Backfill):
+    """
+    Frist = planlagt dato (lokal dato) + 14 dager for planlagte oppdrag uten
+    frist. Satte frister endres bare med overwrite. Kontrolloppdrag røres aldri:
+    fristen deres er kontrolldatoen som kobler dem til runden (inspections.py).
+    """
+    name = 'assignment-deadlines'
+    model = Assignment
+    help = 'Setter deadline_date = scheduled_date + 14 dager for planlagte oppdrag uten frist.'
+    deadline_offset = timedelta(days=14)
+
+    def deadline(self):
+        return Cast(
+            ExpressionWrapper(TruncDate('scheduled_date') + Value(self.deadline_offset), output_field=DateField()),
+            DateField(),
+        )
+
+    def get_queryset(self):
+        return Assignment.objects.filter(scheduled_date__isnull=False).exclude(assignment_type='inspection')
+
+    def pending(self):
+        if self.overwrite:
+            return Q(deadline_date__isnull=True) | ~Q(deadline_date=self.deadline())
+        return Q(deadline_date__isnull=True)
+
+    def updates(self):
+        return {'deadline_date': self.deadline()}
+
+
+@dataclass
+class WorkerResult:
+    worker: int
+    rows: int
+    chunks: int
+    finished: bool
+
+
+def plan_ranges(job, workers):
+    """ Deler [min pk, maks pk] i `workers` sammenhengende områder. """
+    bounds = job.get_queryset().order_by().values_list('pk', flat=True)
+    low = bounds.order_by('pk').first()
+    high = bounds.order_by('-pk').first()
+    if low is None:
+        return [(0, 0)] * workers
+    size = (high - low) // workers + 1
+    return [(low + index * size, min(low + (index + 1) * size - 1, high)) for index in range(workers)]
+
+
+def get_checkpoints(job, workers, restart=False, dry_run=False):
+    """
+    Sjekkpunkter for alle arbeiderne; nye (eller --restart) får nye pk-områder.
+    Ved tørrkjøring lagres ingenting.
+    """
+    existing = list(BackfillCheckpoint.objects.filter(job=job.name).order_by('worker'))
+    if existing and not restart:
+        if existing[0].workers != workers:
+            raise ValueError(f"Jobben '{job.name}' ble startet med {existing[0].workers} arbeidere. "
+                             f"Bruk samme antall eller --restart.")
+        return existing
+    checkpoints = [
+        BackfillCheckpoint(job=job.name, worker=index, workers=workers, range_start=start, range_end=end,
+                           last_pk=start - 1)
+        for index, (start, end) in enumerate(plan_ranges(job, workers))
+    ]
+    if dry_run:
+        return checkpoints
+    with transaction.atomic():
+        BackfillCheckpoint.objects.filter(job=job.name).delete()
+        return BackfillCheckpoint.objects.bulk_create(checkpoints)
+
+
+def run_worker(job, checkpoint, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, log=None):
+    """
+    Går gjennom arbeiderens pk-område fra sjekkpunktet. Ved tørrkjøring telles
+    radene som ville blitt endret, og sjekkpunktet røres ikke.
+    """
+    queryset = job.get_queryset().filter(pk__lte=checkpoint.range_end)
+    last_pk = checkpoint.last_pk
+    rows = chunks = 0
+    while checkpoint.finished_at is None and last_pk < checkpoint.range_end:
+        # Bolkgrense: pk nr. chunk_size etter siste, eller slutten av området
+        boundary = queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[
+            chunk_size - 1:chunk_size]
+        upper = next(iter(boundary), checkpoint.range_end)
+        chunk = job.get_queryset().filter(pk__gt=last_pk, pk__lte=upper).filter(job.pending())
+        if dry_run:
+            count = chunk.count()
+        else:
+            with transaction.atomic():
+                count = chunk.update(**job.updates())
+                checkpoint.last_pk = upper
+                checkpoint.rows_updated += count
+                if upper >= checkpoint.range_end:
+                    checkpoint.finished_at = timezone.now()
+                checkpoint.save(update_fields=['last_pk', 'rows_updated', 'finished_at', 'updated_at'])
+        last_pk = upper
+        rows += count
+        chunks += 1
+        if log:
+            log(f'  [{checkpoint.worker + 1}/{checkpoint.workers}] til pk {upper}: {count} rader')
+    if not dry_run and checkpoint.finished_at is None:
+        # Tomt område: merk som ferdig
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save(update_fields=['finished_at', 'updated_at'])
+    return WorkerResult(checkpoint.worker, rows, chunks, checkpoint.finished_at is not None)
@@ -0,0 +1,161 @@
+"""
+Masseopprettelse og -oppdatering (POST/PATCH .../bulk/) med én transaksjon.
+
+Alle elementene valideres først med samme serializer som enkeltendepunktene.
+Relaterte ID-er (kunde, heis, tekniker, ...) hentes på forhånd med én spørring
+per relasjon i stedet for én per element. Er noe ugyldig, lagres ingenting og
+svaret lister feilene per element. Ellers skrives alt med bulk_create/bulk_update
+i bolker.
+
+bulk_create/bulk_update kaller verken save() eller signaler; søkeindeksen
+oppdateres derfor eksplisitt etterpå.
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import search
+from .serializers import PrefetchedPrimaryKeyRelatedField
+
+MAX_BULK_ITEMS = 5000
+BULK_BATCH_SIZE = 500
+
+
+def prefetch_related_fields(serializer, items):
+    """ Henter alle relaterte objekter som elementene peker på, én spørring per felt. """
+    for field in serializer.fields.values():
+        if field.read_only or not isinstance(field, PrefetchedPrimaryKeyRelatedField):
+            continue
+        model_pk = field.get_queryset().model._meta.pk
+        pks = set()
+        for item in items:
+            value = item.get(field.field_name) if isinstance(item, dict) else None
+            if value is None or isinstance(value, bool):
+                continue
+            try:
+                pks.add(model_pk.to_python(value))
+            except DjangoValidationError:
+                pass # Feltet melder feil type ved valideringen
+        field.prefetched = field.get_queryset().in_bulk(pks) if pks else {}
+
+
+class BulkWriteMixin:
+    """
+    Legger til `bulk`-action på et ModelViewSet:
+
+    - POST: liste av nye objekter -> 201 med [{index, id, status: 'created', data}]
+    - PATCH: liste av delvise objekter med `id` -> 200 med [{index, id, status: 'updated', data}]
+
+    Ved valideringsfeil: 400 med [{index, status: 'invalid', errors}] for elementene som feilet.
+    """
+    bulk_max_items = MAX_BULK_ITEMS
+    bulk_batch_size = BULK_BATCH_SIZE
+
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk')
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise serializers.ValidationError({'detail': 'Forventet en ikke-tom liste.'})
+        if len(items) > self.bulk_max_items:
+            raise serializers.ValidationError({'detail': f'Maks {self.bulk_max_items} elementer per forespørsel.'})
+        if request.method == 'POST':
+            return self.create_many(items)
+        return self.update_many(items)
+
+    def get_bulk_serializer(self, partial=False):
+        return self.get_serializer_class()(context=self.get_serializer_context(), partial=partial)
+
+    def validate_items(self, serializer, items, instances=None):
+        prefetch_related_fields(serializer, items)
+        validated, errors = [], []
+        for index, item in enumerate(items):
+            serializer.instance = instances[index] if instances else None
+            serializer.initial_data = item
+            try:
+                validated.append(serializer.run_validation(item))
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'status': 'invalid', 'errors': exc.detail})
+        return validated, errors
+
+    def validate_batch(self, items):
+        """
+        Kontroller på tvers av elementene (og mot databasen) etter at hvert
+        element er validert. `items` er [(instans eller None, validated_data)];
+        returnerer feil på samme form som validate_items.
+        """
+        return []
+
+    def bulk_response(self, instances, result_status, http_status):
+        data = self.get_serializer_class()(instances, many=True, context=self.get_serializer_context()).data
+        results = [
+            {'index': index, 'id': instance.pk, 'status': result_status, 'data': row}
+            for index, (instance, row) in enumerate(zip(instances, data))
+        ]
+        return Response(results, status=http_status)
+
+    def create_many(self, items):
+        serializer = self.get_bulk_serializer()
+        validated, errors = self.validate_items(serializer, items)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        model = serializer.Meta.model
+        instances = [model(**data) for data in validated]
+        with transaction.atomic():
+            errors = self.validate_batch([(None, data) for data in validated])
+            if errors:
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+            model.objects.bulk_create(instances, batch_size=self.bulk_batch_size)
+            search.reindex(model, [instance.pk for instance in instances])
+        return self.bulk_response(instances, 'created', status.HTTP_201_CREATED)
+
+    def update_many(self, items):
+        serializer = self.get_bulk_serializer(partial=True)
+        model = serializer.Meta.model
+        ids, errors = [], []
+        for index, item in enumerate(items):
+            pk = item.get('id') if isinstance(item, dict) else None
+            if not isinstance(pk, int) or isinstance(pk, bool):
+                errors.append({'index': index, 'status': 'invalid', 'errors': {'id': ['Påkrevd heltall.']}})
+            elif pk in ids:
+                errors.append({'index': index, 'status': 'invalid', 'errors': {'id': ['Duplikat i forespørselen.']}})
+            ids.append(pk)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # get_queryset() gir tilgangsfiltrering og select_related for svaret
+            existing = self.get_queryset().select_for_update(of=('self',)).in_bulk(ids)
+            missing = [
+                {'index': index, 'status': 'invalid', 'errors': {'id': ['Finnes ikke.']}}
+                for index, pk in enumerate(ids) if pk not in existing
+            ]
+            if missing:
+                return Response(missing, status=status.HTTP_400_BAD_REQUEST)
+
+            instances = [existing[pk] for pk in ids]
+            validated, errors = self.validate_items(serializer, items, instances)
+            if not errors:
+                errors = self.validate_batch(list(zip(instances, validated)))
+            if errors:
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+            changed = set()
+            for instance, data in zip(instances, validated):
+                for name, value in data.items():
+                    setattr(instance, name, value)
+                    changed.add(name)
+            # auto_now settes bare av save()
+            now = timezone.now()
+            for field in model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False):
+                    changed.add(field.name)
+                    for instance in instances:
+                        setattr(instance, field.attname, now)
+            if changed:
+                model.objects.bulk_update(instances, sorted(changed), batch_size=self.bulk_batch_size)
+                search.reindex(model, ids)
+        return self.bulk_response(instances, 'updated', status.HTTP_200_OK)
@@ -0,0 +1,195 @@
+"""
+Konflikter i teknikernes timeplan: dobbeltbooking og oppdrag under fravær.
+
+Et oppdrag har bare starttidspunkt (scheduled_date), så det regnes å vare
+ASSIGNMENT_DURATION. Fravær dekker hele dager (start_date til og med
+end_date, lokal tid). Avlyste oppdrag teller ikke.
+
+Kontrollen er en sweep-linje per tekniker: oppdrag og fravær sorteres på
+start, og en heap holder intervallene som fortsatt er åpne. Hvert nytt
+intervall kolliderer med alle åpne, så arbeidet er O(n log n) pluss antall
+konflikter. Oppdrag og fravær hentes med én spørring hver, uansett hvor mange
+teknikere og dager som sjekkes.
+
+check() brukes ved opprettelse og endring (også bulk) og av
+dispatch.apply_plan før planen lagres: kandidatene sjekkes mot lagrede
+oppdrag og fravær og mot hverandre. find_conflicts() gir rapporten for
+en periode.
+"""
+import heapq
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .availability import day_bounds
+from .models import Absence, Assignment
+
+ASSIGNMENT_DURATION = timedelta(hours=2) # Arbeidsdagen delt på standardkapasiteten i dispatch.py
+
+DOUBLE_BOOKING = 'double_booking'
+DURING_ABSENCE = 'absence'
+
+
+@dataclass(frozen=True)
+class Booking:
+    """ Et tidsintervall [start, end) i teknikerens timeplan. """
+    kind: str # 'assignment' eller 'absence'
+    pk: int
+    technician_id: int
+    start: object
+    end: object
+    label: str = ''
+    candidate: int = None # Indeks i check()-listen for oppdrag som ikke er lagret ennå
+
+
+@dataclass(frozen=True)
+class Conflict:
+    first: Booking # Starter først (fravær før oppdrag ved lik start)
+    second: Booking
+
+    @property
+    def type(self):
+        return DURING_ABSENCE if 'absence' in (self.first.kind, self.second.kind) else DOUBLE_BOOKING
+
+    @property
+    def start(self):
+        return max(self.first.start, self.second.start)
+
+    @property
+    def end(self):
+        return min(self.first.end, self.second.end)
+
+    def other(self, booking):
+        return self.second if booking == self.first else self.first
+
+    def to_dict(self):
+        assignments = [booking for booking in (self.first, self.second) if booking.kind == 'assignment']
+        absence = next((booking for booking in (self.first, self.second) if booking.kind == 'absence'), None)
+        return {
+            'type': self.type,
+            'technician': self.first.technician_id,
+            'assignment': assignments[0].pk,
+            'other_assignment': assignments[1].pk if len(assignments) > 1 else None,
+            'absence': absence.pk if absence else None,
+            'start': self.start,
+            'end': self.end,
+        }
+
+
+def describe(conflict, booking):
+    """ Feilmelding for `booking` sett fra kandidatens side. """
+    other = conflict.other(booking)
+    if other.kind == 'absence':
+        last_day = timezone.localtime(other.end).date() - timedelta(days=1)
+        return f'Teknikeren har fravær ({other.label}) {timezone.localtime(other.start):%d.%m.%Y}-{last_day:%d.%m.%Y}.'
+    if other.pk is None:
+        return f'Kolliderer med element {other.candidate} i forespørselen.'
+    return f'Kolliderer med oppdrag #{other.pk} ({timezone.localtime(other.start):%d.%m.%Y %H:%M}).'
+
+
+def sweep(bookings):
+    """ Konfliktene blant én teknikers bookinger (fravær overlapper ikke hverandre). """
+    active = [] # (slutt, rekkefølge, booking)
+    found = []
+    ordered = sorted(bookings, key=lambda booking: (booking.start, booking.kind != 'absence', booking.end))
+    for sequence, booking in enumerate(ordered):
+        while active and active[0][0] <= booking.start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            if 'assignment' in (booking.kind, other.kind):
+                found.append(Conflict(other, booking))
+        heapq.heappush(active, (booking.end, sequence, booking))
+    return found
+
+
+def _assignment_booking(pk, technician_id, scheduled_date, title, candidate=None):
+    return Booking('assignment', pk, technician_id, scheduled_date, scheduled_date + ASSIGNMENT_DURATION,
+                   title, candidate)
+
+
+def _load(technician_ids, start, end, exclude_pks=()):
+    """
+    {tekniker-id: [Booking]} for lagrede oppdrag og fravær som overlapper
+    [start, end). To spørringer; technician_ids=None betyr alle.
+    """
+    assignments = Assignment.objects.filter(
+        assigned_to__isnull=False, scheduled_date__gt=start - ASSIGNMENT_DURATION, scheduled_date__lt=end,
+    ).exclude(status='cancelled')
+    absences = Absence.objects.filter(
+        end_date__gte=timezone.localtime(start).date(), start_date__lte=timezone.localtime(end).date(),
+    )
+    if technician_ids is not None:
+        assignments = assignments.filter(assigned_to__in=technician_ids)
+        absences = absences.filter(user__in=technician_ids)
+    if exclude_pks:
+        assignments = assignments.exclude(pk__in=exclude_pks)
+
+    bookings = defaultdict(list)
+    for pk, technician_id, scheduled_date, title in assignments.values_list(
+            'pk', 'assigned_to', 'scheduled_date', 'title').order_by():
+        bookings[technician_id].append(_assignment_booking(pk, technician_id, scheduled_date, title))
+    labels = dict(Absence.ABSENCE_TYPE_CHOICES)
+    for pk, user_id, start_date, end_date, absence_type in absences.values_list(
+            'pk', 'user_id', 'start_date', 'end_date', 'absence_type').order_by():
+        absence_start, absence_end = day_bounds(start_date, end_date)
+        bookings[user_id].append(Booking('absence', pk, user_id, absence_start, absence_end,
+                                         labels.get(absence_type, absence_type)))
+    return bookings
+
+
+def find_conflicts(start, end, technician_ids=None):
+    """ Konfliktene som overlapper dagene start..end (inkl.), sortert på tekniker og tid. """
+    start_dt, end_dt = day_bounds(start, end)
+    found = []
+    for bookings in _load(technician_ids, start_dt, end_dt).values():
+        found += [conflict for conflict in sweep(bookings) if conflict.start < end_dt and conflict.end > start_dt]
+    return sorted(found, key=lambda conflict: (conflict.first.technician_id, conflict.start, conflict.first.pk or 0))
+
+
+def is_scheduled(assignment):
+    return bool(assignment.assigned_to_id and assignment.scheduled_date and assignment.status != 'cancelled')
+
+
+def schedule_changed(instance, data):
+    """ Om endringene i `data` kan gi nye konflikter for det lagrede oppdraget `instance`. """
+    if instance is None:
+        return True
+    if 'assigned_to' in data and getattr(data['assigned_to'], 'pk', None) != instance.assigned_to_id:
+        return True
+    if 'scheduled_date' in data and data['scheduled_date'] != instance.scheduled_date:
+        return True
+    return instance.status == 'cancelled' and data.get('status', 'cancelled') != 'cancelled'
+
+
+def check(assignments):
+    """
+    {indeks: [meldinger]} for oppdragene (liste eller {indeks: oppdrag};
+    lagret eller ikke, med endringene satt på instansen) som kolliderer med
+    lagrede oppdrag, fravær eller hverandre. Oppdrag uten tekniker eller
+    tidspunkt hoppes over.
+    """
+    items = assignments.items() if isinstance(assignments, dict) else enumerate(assignments)
+    candidates = [
+        _assignment_booking(assignment.pk, assignment.assigned_to_id, assignment.scheduled_date,
+                            assignment.title, index)
+        for index, assignment in items if is_scheduled(assignment)
+    ]
+    if not candidates:
+        return {}
+    stored = _load(
+        {booking.technician_id for booking in candidates},
+        min(booking.start for booking in candidates), max(booking.end for booking in candidates),
+        exclude_pks=[booking.pk for booking in candidates if booking.pk is not None],
+    )
+    for booking in candidates:
+        stored[booking.technician_id].append(booking)
+
+    errors = defaultdict(list)
+    for bookings in stored.values():
+        for conflict in sweep(bookings):
+            for booking in (conflict.first, conflict.second):
+                if booking.candidate is not None:
+                    errors[booking.candidate].append(describe(conflict, booking))
+    return dict(errors)
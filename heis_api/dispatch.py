@@ -0,0 +1,318 @@
+"""
+Automatisk fordeling av ufordelte oppdrag på teknikere.
+
+Planleggeren tar backloggen (status 'pending', assigned_to=None), aktive
+teknikere, fravær og oppdragene som allerede er planlagt i perioden, og
+fordeler oppdragene grådig:
+
+1. Oppdragene sorteres på prioritet (kritisk først), så frist (tidligst
+   først, uten frist sist) og til slutt pk.
+2. Hvert oppdrag får den tidligste arbeidsdagen i vinduet [start, frist] der
+   en tekniker har ledig kapasitet. Oppdrag som allerede har planlagt dato i
+   perioden beholder dagen. Forfalte oppdrag planlegges så tidlig som mulig.
+3. Innen dagen går teknikerne på rundgang, så lasten fordeles jevnt.
+
+Ledigheten holdes som bitmasker: én Python-int per dag med en bit per
+tekniker som fortsatt har kapasitet (fravær og helg er nullet ut på forhånd),
+og et bytearray per tekniker med gjenværende plasser per dag. Å finne neste
+ledige dag er dermed et par heltallsoperasjoner per dag i vinduet, og 10 000
+oppdrag på 200 teknikere planlegges på sekunder uten databasekall i løkken.
+
+Arbeidsdagen er delt i `capacity` tidsluker. Oppdrag som allerede ligger hos
+teknikeren, sperrer lukene de ville kollidert med (se conflicts.py), og nye
+oppdrag får første ledige luke. Er lukene kortere enn et oppdrag (høy
+kapasitet), sperrer hvert oppdrag også nabolukene.
+
+Planen lagres med grupperte UPDATE-er (per tekniker og per tidsluke), eller
+returneres uendret ved tørrkjøring. Før lagring sjekkes planen med
+conflicts.check mot det som er lagret da, som ved opprettelse i API-et;
+oppdrag som likevel kolliderer, blir stående ufordelt.
+"""
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import conflicts
+from .availability import date_range, day_bounds
+from .models import Absence, Assignment, User
+
+DEFAULT_HORIZON_DAYS = 14
+DEFAULT_CAPACITY = 4 # Oppdrag per tekniker per dag
+WORKDAY_START = time(8)
+WORKDAY_HOURS = 8
+BATCH_SIZE = 500
+
+PRIORITY_RANK = {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+REASON_NO_CAPACITY = 'Ingen ledig tekniker innen fristen.'
+REASON_OUTSIDE_PERIOD = 'Planlagt dato er etter perioden.'
+REASON_CONFLICT = 'Kolliderer med teknikerens timeplan.'
+
+
+@dataclass
+class PlannedAssignment:
+    assignment_id: int
+    technician_id: int
+    scheduled_date: datetime
+    deadline_date: date = None
+    priority: str = 'medium'
+
+
+@dataclass
+class DispatchPlan:
+    start: date
+    end: date
+    planned: list = field(default_factory=list)
+    unplanned: list = field(default_factory=list) # [(assignment_id, årsak)]
+    technicians: dict = field(default_factory=dict) # id -> brukernavn
+
+
+def backlog():
+    return Assignment.objects.filter(assigned_to__isnull=True, status='pending')
+
+
+def _lowest_bit(mask):
+    return (mask & -mask).bit_length() - 1
+
+
+def _slot_minutes(capacity):
+    return WORKDAY_HOURS * 60 // capacity
+
+
+def _minutes_into_workday(moment):
+    local = timezone.localtime(moment)
+    return (local.hour - WORKDAY_START.hour) * 60 + local.minute - WORKDAY_START.minute
+
+
+def _blocked_slots(minutes, capacity):
+    """
+    Bitmaske over lukene et oppdrag som starter `minutes` etter arbeidsdagens
+    start, ville kollidert med: lukene som starter mindre enn ett oppdrag unna.
+    """
+    length = _slot_minutes(capacity)
+    duration = int(conflicts.ASSIGNMENT_DURATION.total_seconds() // 60)
+    first = max((minutes - duration) // length + 1, 0)
+    last = min(-(-(minutes + duration) // length) - 1, capacity - 1)
+    if last < first:
+        return 0
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+class _Capacity:
+    """
+    Ledige plasser per (tekniker, dag), med en tekniker-bitmaske per dag og en
+    bitmaske over opptatte tidsluker per (tekniker, dag).
+    """
+
+    def __init__(self, technician_ids, days, capacity, weekdays_only):
+        self.technician_ids = technician_ids
+        self.index = {tech_id: position for position, tech_id in enumerate(technician_ids)}
+        self.days = days
+        self.capacity = capacity
+        workday = bytes([capacity])
+        closed = bytes([0])
+        template = b''.join(
+            closed if weekdays_only and day.weekday() >= 5 else workday for day in days
+        )
+        self.remaining = [bytearray(template) for _ in technician_ids]
+        everyone = (1 << len(technician_ids)) - 1
+        self.open = [everyone if template[offset] else 0 for offset in range(len(days))]
+        self.cursor = [0] * len(days)
+        self.full = (1 << capacity) - 1
+        self.taken = {} # (posisjon, dag-indeks) -> opptatte luker
+
+    def block(self, tech_id, first, last):
+        """ Fravær: teknikeren er borte dagene first..last (indekser, inkl.). """
+        position = self.index.get(tech_id)
+        if position is None:
+            return
+        row = self.remaining[position]
+        for offset in range(first, last + 1):
+            row[offset] = 0
+            self.open[offset] &= ~(1 << position)
+
+    def use(self, position, offset, blocked=0):
+        """ Ett oppdrag til på dagen; `blocked` er lukene det sperrer. """
+        row = self.remaining[position]
+        row[offset] = max(row[offset] - 1, 0)
+        taken = self.taken.get((position, offset), 0) | blocked
+        self.taken[(position, offset)] = taken
+        if not row[offset] or taken == self.full:
+            row[offset] = 0
+            self.open[offset] &= ~(1 << position)
+
+    def slot(self, position, offset):
+        """ Første ledige luke på dagen. """
+        return _lowest_bit(~self.taken.get((position, offset), 0))
+
+    def _without_taken(self, mask, offset, needed):
+        """ Teknikerne i `mask` som har alle lukene i `needed` ledige. """
+        free = mask
+        remaining = mask
+        while remaining:
+            position = _lowest_bit(remaining)
+            remaining &= remaining - 1
+            if self.taken.get((position, offset), 0) & needed:
+                free &= ~(1 << position)
+        return free
+
+    def find(self, first, last, needed=0):
+        """
+        (tekniker-posisjon, dag-indeks) for tidligste ledige plass i
+        first..last, ellers None. Med `needed` må disse lukene være ledige
+        (oppdrag med fast klokkeslett).
+        """
+        for offset in range(first, last + 1):
+            mask = self.open[offset]
+            if mask and needed:
+                mask = self._without_taken(mask, offset, needed)
+            if not mask:
+                continue
+            cursor = self.cursor[offset]
+            later = mask >> cursor << cursor
+            position = _lowest_bit(later or mask)
+            self.cursor[offset] = position + 1
+            return position, offset
+        return None
+
+
+def _existing_load(start, end):
+    """ {(tekniker, dag): [starttidspunkt]} for oppdrag som allerede er tildelt og planlagt i perioden. """
+    start_dt, end_dt = day_bounds(start, end)
+    rows = (
+        Assignment.objects.filter(assigned_to__isnull=False, scheduled_date__gte=start_dt, scheduled_date__lt=end_dt)
+        .exclude(status='cancelled')
+        .values_list('assigned_to', 'scheduled_date')
+        .order_by()
+    )
+    load = defaultdict(list)
+    for tech_id, scheduled in rows:
+        load[(tech_id, timezone.localtime(scheduled).date())].append(scheduled)
+    return load
+
+
+def _slot_time(day, slot, capacity):
+    minutes = _slot_minutes(capacity) * slot
+    return timezone.make_aware(datetime.combine(day, WORKDAY_START) + timedelta(minutes=minutes))
+
+
+def build_plan(start=None, days=DEFAULT_HORIZON_DAYS, capacity=DEFAULT_CAPACITY, weekdays_only=True,
+               queryset=None):
+    """ Lager en fordelingsplan for backloggen (eller `queryset`) i perioden start..start+days-1. """
+    start = start or timezone.localdate()
+    end = start + timedelta(days=days - 1)
+    all_days = date_range(start, end)
+    day_index = {day: offset for offset, day in enumerate(all_days)}
+
+    technicians = list(
+        User.objects.filter(role='tekniker', is_active=True).order_by('pk').values_list('pk', 'username')
+    )
+    plan = DispatchPlan(start, end, technicians=dict(technicians))
+    slots = _Capacity([pk for pk, _ in technicians], all_days, capacity, weekdays_only)
+
+    absences = Absence.objects.filter(end_date__gte=start, start_date__lte=end).values_list(
+        'user_id', 'start_date', 'end_date').order_by()
+    for user_id, absence_start, absence_end in absences:
+        slots.block(user_id, day_index[max(absence_start, start)], day_index[min(absence_end, end)])
+    for (tech_id, day), times in _existing_load(start, end).items():
+        position = slots.index.get(tech_id)
+        if position is not None and day in day_index:
+            for scheduled in times:
+                slots.use(position, day_index[day], _blocked_slots(_minutes_into_workday(scheduled), capacity))
+
+    rows = (queryset if queryset is not None else backlog()).values_list(
+        'pk', 'priority', 'deadline_date', 'scheduled_date').order_by()
+    jobs = sorted(rows, key=lambda row: (PRIORITY_RANK.get(row[1], len(PRIORITY_RANK)), row[2] or date.max, row[0]))
+
+    last_offset = len(all_days) - 1
+    for pk, priority, deadline, scheduled in jobs:
+        fixed = timezone.localtime(scheduled) if scheduled else None
+        if fixed and fixed.date() > end:
+            plan.unplanned.append((pk, REASON_OUTSIDE_PERIOD))
+            continue
+        needed = 0
+        if fixed and fixed.date() >= start:
+            # Allerede planlagt: behold dag og klokkeslett, finn en tekniker som er ledig da
+            first = last = day_index[fixed.date()]
+            needed = _blocked_slots(_minutes_into_workday(scheduled), capacity)
+        else:
+            first = 0
+            last = last_offset if deadline is None or deadline < start else day_index.get(deadline, last_offset)
+        found = slots.find(first, last, needed)
+        if found is None:
+            plan.unplanned.append((pk, REASON_NO_CAPACITY))
+            continue
+        position, offset = found
+        if needed or (fixed and fixed.date() >= start):
+            scheduled_date = scheduled
+        else:
+            scheduled_date = _slot_time(all_days[offset], slots.slot(position, offset), capacity)
+            needed = _blocked_slots(_minutes_into_workday(scheduled_date), capacity)
+        slots.use(position, offset, needed)
+        plan.planned.append(PlannedAssignment(pk, slots.technician_ids[position], scheduled_date, deadline, priority))
+    return plan
+
+
+def _chunks(pks):
+    for start in range(0, len(pks), BATCH_SIZE):
+        yield pks[start:start + BATCH_SIZE]
+
+
+def apply_plan(plan):
+    """
+    Lagrer planen med én UPDATE per tekniker og én per tidsluke (i pk-bolker),
+    ikke én per oppdrag. Oppdrag som er tildelt eller har endret status siden
+    planen ble laget, hoppes over. Oppdrag som kolliderer med teknikerens
+    timeplan (conflicts.check), flyttes til plan.unplanned. Returnerer antall
+    oppdrag som ble oppdatert.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        planned_pks = [entry.assignment_id for entry in plan.planned]
+        still_open = set()
+        for chunk in _chunks(planned_pks):
+            still_open.update(backlog().filter(pk__in=chunk).select_for_update().values_list('pk', flat=True))
+        entries = [entry for entry in plan.planned if entry.assignment_id in still_open]
+        # Låser teknikerne, som API-et gjør, så samtidige bookinger ikke kolliderer med planen
+        technician_ids = {entry.technician_id for entry in entries}
+        list(User.objects.select_for_update().filter(pk__in=technician_ids).values_list('pk'))
+        clashes = conflicts.check([
+            Assignment(pk=entry.assignment_id, assigned_to_id=entry.technician_id,
+                       scheduled_date=entry.scheduled_date)
+            for entry in entries
+        ])
+        if clashes:
+            rejected = {entries[index].assignment_id for index in clashes}
+            plan.planned = [entry for entry in plan.planned if entry.assignment_id not in rejected]
+            plan.unplanned += [(pk, REASON_CONFLICT) for pk in sorted(rejected)]
+            entries = [entry for entry in entries if entry.assignment_id not in rejected]
+        by_technician = defaultdict(list)
+        by_time = defaultdict(list)
+        for entry in entries:
+            by_technician[entry.technician_id].append(entry.assignment_id)
+            by_time[entry.scheduled_date].append(entry.assignment_id)
+        for scheduled_date, pks in by_time.items():
+            for chunk in _chunks(pks):
+                Assignment.objects.filter(pk__in=chunk).update(scheduled_date=scheduled_date)
+        for technician_id, pks in by_technician.items():
+            for chunk in _chunks(pks):
+                # update() setter ikke auto_now
+                Assignment.objects.filter(pk__in=chunk).update(assigned_to_id=technician_id, updated_at=now)
+    return len(entries)
+
+
+def dispatch(start=None, days=DEFAULT_HORIZON_DAYS, capacity=DEFAULT_CAPACITY, weekdays_only=True,
+             dry_run=False):
+    plan = build_plan(start, days, capacity, weekdays_only)
+    applied = 0 if dry_run else apply_plan(plan)
+    return plan, applied
+
+
+def plan_summary(plan):
+    """ Per tekniker: antall planlagte oppdrag. """
+    counts = Counter(entry.technician_id for entry in plan.planned)
+    return [{'technician': tech_id, 'username': plan.technicians[tech_id], 'assignments': counts[tech_id]}
+            for tech_id in plan.technicians if counts[tech_id]]
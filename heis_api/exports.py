@@ -0,0 +1,93 @@
+"""
+Eksport av store tabeller som CSV eller NDJSON (én JSON-linje per rad).
+
+Radene hentes med values_list() over de eksporterte kolonnene (JOIN-ene står i
+kolonnestiene) og QuerySet.iterator(chunk_size), og skrives ut fortløpende
+med StreamingHttpResponse. Nedlastingen starter med første bolk, og
+minnebruken er flat uansett antall rader. Filtrene er de samme som for
+listeendepunktet (filterset_fields/search_fields).
+"""
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+
+from .streaming import DEFAULT_CHUNK_SIZE, iter_chunks
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _isoformat(value):
+    if hasattr(value, 'isoformat'):
+        if hasattr(value, 'tzinfo') and value.tzinfo is not None:
+            value = timezone.localtime(value)
+        return value.isoformat()
+    return value
+
+
+def iter_csv(queryset, headers, chunk_size=DEFAULT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM gjør at Excel leser filen som UTF-8 (æøå)
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    for chunk in iter_chunks(queryset, chunk_size):
+        writer.writerows([_isoformat(value) for value in row] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue() # Bare overskriften (ingen rader)
+
+
+def iter_ndjson(queryset, headers, chunk_size=DEFAULT_CHUNK_SIZE):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for chunk in iter_chunks(queryset, chunk_size):
+        yield ''.join(encoder.encode(dict(zip(headers, map(_isoformat, row)))) + '\n' for row in chunk)
+
+
+EXPORT_WRITERS = {'csv': iter_csv, 'ndjson': iter_ndjson}
+
+
+def streaming_export_response(queryset, columns, export_format, filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ columns: [(overskrift, values_list-sti)], f.eks. ('customer_name', 'customer__name'). """
+    headers = [header for header, _ in columns]
+    rows = queryset.values_list(*[path for _, path in columns])
+    writer = EXPORT_WRITERS[export_format]
+    response = StreamingHttpResponse(
+        (part.encode('utf-8') for part in writer(rows, headers, chunk_size)),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}-{timezone.localdate():%Y%m%d}.{export_format}"'
+    return response
+
+
+class ExportActionMixin:
+    """
+    GET .../export/?output=csv|ndjson pluss de vanlige listefiltrene.
+    Viewsettet angir export_columns som [(overskrift, sti)].
+    """
+    export_columns = ()
+    export_chunk_size = 2000
+    export_query_param = 'output' # ?format= er reservert av DRF
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        export_format = request.query_params.get(self.export_query_param, 'csv').lower()
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({self.export_query_param: f"Gyldige verdier: {', '.join(EXPORT_FORMATS)}."})
+        # Filtrene fra listeendepunktet, men uten planleggerens select_related/prefetch:
+        # values_list henter bare eksportkolonnene. Sortert på pk for en jevn indeksskann.
+        queryset = self.filter_queryset(self.get_queryset()).select_related(None).prefetch_related(None)
+        queryset = queryset.order_by('pk')
+        filename = getattr(self, 'basename', None) or queryset.model._meta.model_name
+        return streaming_export_response(queryset, self.export_columns, export_format, filename,
+                                         self.export_chunk_size)
@@ -0,0 +1,264 @@
+"""
+Offline geokoding av kunder og ruteforslag for en teknikers dag.
+
+Koordinatene slås opp i en lokal tabell over sentroider for postnummer
+(settings.POSTCODE_CENTROIDS_FILE, CSV med postnummer;sted;breddegrad;lengdegrad
+og valgfritt presisjon), uten nettverkskall. Tabellen kan ha fulle firesifrede
+postnummer eller prefikser; oppslaget bruker lengste treff (4, 3 eller 2
+siffer), og presisjonen følger av lengden hvis kolonnen er tom.
+
+Den medfølgende tabellen er bygget fra GeoNames' postnummerdump for Norge
+(NO.txt, CC BY 4.0, https://www.geonames.org/) med
+`manage.py build_postcode_centroids`: alle firesifrede postnummer, pluss en
+sentroide per tosifret region som reserve for nye postnummer. GeoNames har
+bare ett punkt (sentrum) for alle postnumrene i de største byene; punkter som
+deles av flere enn SHARED_PLACE_LIMIT postnummer får presisjon 'place'.
+
+Et bysentrum eller en regionsentroide kan ligge mange kilometer fra kunden, og
+alle kundene der får samme punkt. Ruteforslag og nærhetssøk bruker derfor bare
+koordinater med presisjon i PRECISE (is_precise); de andre regnes som
+uplasserte der, i stedet for å gi en rute på 0 km eller et radiussøk som
+treffer hele byen eller ingenting.
+
+Resultatet lagres på Customer (latitude/longitude/geocode_precision) sammen
+med geocode_key: postnummeret og versjonen av tabellen. Når adressen eller
+tabellen endres, er nøkkelen utdatert og koordinatene regnes ut på nytt ved
+neste lagring eller ved neste oppslag (ensure_coordinates, som også fanger opp
+bulk-importerte kunder).
+
+Ruten ordnes med nærmeste nabo fra alle mulige startpunkter (eller fra et
+fast startpunkt) og forbedres med 2-opt. Kjøreavstanden anslås som
+storsirkelavstand ganget med ROAD_FACTOR.
+"""
+import csv
+import hashlib
+import math
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0
+ROAD_FACTOR = 1.3 # Veiavstand er typisk 20-40 % lengre enn luftlinje
+PRECISIONS = {4: 'postcode', 3: 'area', 2: 'region'}
+PLACE = 'place' # Sentrum av stedet, felles for mange postnummer
+PRECISE = ('postcode', 'area') # Godt nok for ruter og nærhetssøk
+SHARED_PLACE_LIMIT = 10
+CENTROID_HEADER = ('postnummer', 'sted', 'breddegrad', 'lengdegrad', 'presisjon')
+COORDINATE_FIELDS = ('latitude', 'longitude', 'geocode_precision', 'geocode_key')
+
+_tables = {}
+
+
+@dataclass(frozen=True)
+class Location:
+    latitude: float
+    longitude: float
+    precision: str
+
+
+def load_centroids(path):
+    """
+    {postnummer/prefiks: (breddegrad, lengdegrad, presisjon eller '')} fra
+    CSV (skilletegn ; eller ,).
+    """
+    table = {}
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        sample = handle.read(4096)
+        handle.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+        reader = csv.reader(handle, dialect)
+        next(reader, None) # Overskrift
+        for row in reader:
+            if len(row) < 4 or not row[0].strip().isdigit():
+                continue
+            try:
+                table[row[0].strip()] = (float(row[2]), float(row[3]), row[4].strip() if len(row) > 4 else '')
+            except ValueError:
+                continue
+    return table
+
+
+def _load_table(path):
+    with open(path, 'rb') as handle:
+        version = hashlib.sha1(handle.read()).hexdigest()[:8]
+    return load_centroids(path), version
+
+
+def centroids():
+    path = str(settings.POSTCODE_CENTROIDS_FILE)
+    if path not in _tables:
+        _tables[path] = _load_table(path)
+    return _tables[path][0]
+
+
+def table_version():
+    """ Kort hash av tabellen; inngår i geocode_key, så nye tabeller gir ny geokoding. """
+    centroids()
+    return _tables[str(settings.POSTCODE_CENTROIDS_FILE)][1]
+
+
+def lookup(zip_code):
+    """ Location for postnummeret (lengste prefiks i tabellen), eller None. """
+    digits = ''.join(char for char in (zip_code or '') if char.isdigit())
+    if len(digits) != 4:
+        return None
+    table = centroids()
+    for length in (4, 3, 2):
+        point = table.get(digits[:length])
+        if point:
+            return Location(point[0], point[1], point[2] or PRECISIONS[length])
+    return None
+
+
+def is_precise(precision):
+    return precision in PRECISE
+
+
+def address_key(zip_code):
+    """ Det geokoderen faktisk bruker: postnummeret, normalisert, og tabellversjonen. """
+    return ''.join((zip_code or '').split()) + key_suffix()
+
+
+def key_suffix():
+    """ Slutten på alle gyldige geocode_key med gjeldende tabell. """
+    return f'@{table_version()}'
+
+
+def refresh_coordinates(customer):
+    """ Geokoder kunden hvis adressen er endret siden sist. Returnerer True hvis feltene ble endret. """
+    key = address_key(customer.zip_code)
+    if customer.geocode_key == key:
+        return False
+    location = lookup(customer.zip_code)
+    customer.latitude = location.latitude if location else None
+    customer.longitude = location.longitude if location else None
+    customer.geocode_precision = location.precision if location else ''
+    customer.geocode_key = key
+    return True
+
+
+def ensure_coordinates(customers):
+    """
+    Oppdaterer utdaterte koordinater for kundene. Alle feltene følger av
+    nøkkelen, så det blir én UPDATE per postnummer (i pk-bolker), ikke per kunde.
+    """
+    from .models import Customer # models importerer denne modulen
+    stale = [customer for customer in customers if refresh_coordinates(customer)]
+    by_key = defaultdict(list)
+    for customer in stale:
+        by_key[customer.geocode_key].append(customer)
+    for group in by_key.values():
+        values = {name: getattr(group[0], name) for name in COORDINATE_FIELDS}
+        pks = [customer.pk for customer in group]
+        for start in range(0, len(pks), 500):
+            Customer.objects.filter(pk__in=pks[start:start + 500]).update(**values)
+    return stale
+
+
+def read_geonames(handle):
+    """
+    (postnummer, sted, breddegrad, lengdegrad) fra GeoNames' postnummerdump
+    (tabulatorseparert: land, postnummer, sted, fylke, ..., breddegrad, lengdegrad, nøyaktighet).
+    """
+    for row in csv.reader(handle, delimiter='\t', quoting=csv.QUOTE_NONE):
+        if len(row) < 11 or len(row[1].strip()) != 4 or not row[1].strip().isdigit():
+            continue
+        try:
+            yield row[1].strip(), row[2].strip(), float(row[9]), float(row[10])
+        except ValueError:
+            continue
+
+
+def build_centroid_rows(entries, shared_limit=SHARED_PLACE_LIMIT):
+    """
+    Radene (postnummer, sted, breddegrad, lengdegrad, presisjon) i
+    sentroidetabellen. Et punkt som deles av flere enn shared_limit postnummer
+    er et bysentrum og får presisjon PLACE. Til slutt kommer én rad per
+    tosifret region med snittet av postnumrene der.
+    """
+    entries = sorted(set(entries))
+    shared = Counter((latitude, longitude) for _, _, latitude, longitude in entries)
+    rows = [
+        (code, place, latitude, longitude,
+         PLACE if shared[(latitude, longitude)] > shared_limit else PRECISIONS[4])
+        for code, place, latitude, longitude in entries
+    ]
+    regions = defaultdict(list)
+    for code, place, latitude, longitude in entries:
+        regions[code[:2]].append((place, latitude, longitude))
+    for prefix, points in sorted(regions.items()):
+        name = Counter(place for place, _, _ in points).most_common(1)[0][0]
+        rows.append((prefix, name, round(sum(point[1] for point in points) / len(points), 4),
+                     round(sum(point[2] for point in points) / len(points), 4), PRECISIONS[2]))
+    return rows
+
+
+def write_centroids(handle, rows):
+    writer = csv.writer(handle, delimiter=';', lineterminator='\n')
+    writer.writerow(CENTROID_HEADER)
+    writer.writerows(rows)
+
+
+def great_circle_km(a, b):
+    """ Luftlinje mellom to (breddegrad, lengdegrad). """
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def distance_km(a, b):
+    """ Anslått kjøreavstand mellom to (breddegrad, lengdegrad). """
+    return great_circle_km(a, b) * ROAD_FACTOR
+
+
+def route_length(points, order):
+    return sum(distance_km(points[a], points[b]) for a, b in zip(order, order[1:]))
+
+
+def _nearest_neighbour(points, first):
+    order = [first]
+    remaining = set(range(len(points))) - {first}
+    while remaining:
+        current = points[order[-1]]
+        nearest = min(remaining, key=lambda index: (distance_km(current, points[index]), index))
+        order.append(nearest)
+        remaining.remove(nearest)
+    return order
+
+
+def _two_opt(points, order, fixed_start):
+    """ Snur delstrekninger så lenge det forkorter den åpne ruten. """
+    def edge(a, b):
+        return 0.0 if a is None or b is None else distance_km(points[a], points[b])
+
+    size = len(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1 if fixed_start else 0, size - 1):
+            for j in range(i + 1, size):
+                before, after = (order[i - 1] if i else None), (order[j + 1] if j + 1 < size else None)
+                delta = (edge(before, order[j]) + edge(order[i], after)
+                         - edge(before, order[i]) - edge(order[j], after))
+                if delta < -1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+    return order
+
+
+def order_route(points, start=None):
+    """
+    Rekkefølge (indekser i points) for en åpen rute gjennom alle punktene og
+    anslått kjørelengde i km. Med `start` (breddegrad, lengdegrad) begynner
+    ruten der, og avstanden dit regnes med.
+    """
+    if not points:
+        return [], 0.0
+    if start is not None:
+        nodes = [start] + list(points)
+        order = _two_opt(nodes, _nearest_neighbour(nodes, 0), fixed_start=True)
+        return [index - 1 for index in order[1:]], route_length(nodes, order)
+    candidates = [_nearest_neighbour(points, first) for first in range(len(points))]
+    order = _two_opt(points, min(candidates, key=lambda order: route_length(points, order)), fixed_start=False)
+    return order, route_length(points, order)
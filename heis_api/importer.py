@@ -0,0 +1,381 @@
+"""
+Import av kunder og heiser fra CSV/XLSX, rad for rad.
+
+Filen leses som en strøm (csv.reader / openpyxl i read_only-modus) og
+behandles i bolker på chunk_size rader: hver bolk valideres, slås opp mot
+eksisterende rader med én spørring og skrives med bulk_create/bulk_update i én
+transaksjon. Minnebruken er dermed konstant uansett filstørrelse; bare
+feilrapporten vokser, og den er begrenset til MAX_REPORTED_ERRORS rader.
+
+- Kunder matches på navn + postnummer (uten hensyn til store/små bokstaver).
+- Heiser matches på serial_number. Kunde angis med customer_id eller kundenavn,
+  heistype med navn (heistypene leses én gang og caches gjennom importen).
+
+Navn sammenlignes med fold(), ikke med LOWER() i databasen: SQLite bretter bare
+ASCII, så «ØSTFOLD HEIS» og «Østfold Heis» ville vært ulike der. Kunder slås
+derfor opp på den indekserte kolonnen Customer.name_folded, bare for navnene i
+bolken.
+
+Brukes av `manage.py import_data` og av /api/imports/<type>/.
+"""
+import csv
+import io
+import os
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import geocoding, proximity, search, typeahead
+from .models import Customer, Elevator, ElevatorType, fold_name as fold
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# Norske kolonnenavn som de fleste regneark fra kundene bruker
+HEADER_ALIASES = {
+    'navn': 'name', 'kundenavn': 'name', 'kontaktperson': 'contact_person', 'e-post': 'email',
+    'epost': 'email', 'telefon': 'phone', 'adresse': 'address', 'postnummer': 'zip_code',
+    'postnr': 'zip_code', 'poststed': 'city', 'sted': 'city',
+    'serienummer': 'serial_number', 'kunde': 'customer', 'kunde_id': 'customer_id', 'heistype': 'elevator_type',
+    'installasjonsdato': 'installation_date', 'siste_kontroll': 'last_inspection_date',
+    'neste_kontroll': 'next_inspection_date', 'plassering': 'location_description',
+}
+
+
+class ImportFileError(Exception):
+    """ Filen kan ikke leses i det hele tatt (format, koding, manglende kolonner). """
+
+
+def normalize_header(name):
+    name = str(name or '').strip().lower().replace(' ', '_')
+    return HEADER_ALIASES.get(name, name)
+
+
+def _clean_value(value):
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value == '' else value
+
+
+def read_csv(stream):
+    """ (radnummer, dict) fra en CSV-strøm (tekst eller bytes); skilletegn , ; eller tab. """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    sample = stream.read(4096)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(stream, dialect)
+    try:
+        header = [normalize_header(name) for name in next(reader)]
+    except StopIteration:
+        return
+    except UnicodeDecodeError:
+        raise ImportFileError('CSV-filen må være UTF-8.')
+    try:
+        for number, values in enumerate(reader, start=2):
+            if any(values):
+                values += [''] * (len(header) - len(values))
+                yield number, {name: _clean_value(value) for name, value in zip(header, values)}
+    except UnicodeDecodeError:
+        raise ImportFileError('CSV-filen må være UTF-8.')
+
+
+def read_xlsx(stream):
+    """ (radnummer, dict) fra første ark i en XLSX-fil, lest i read_only-modus. """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError('XLSX-import krever openpyxl (pip install openpyxl).')
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as exc: # openpyxl kaster ulike unntak for ødelagte filer
+        raise ImportFileError(f'Kan ikke lese XLSX-filen: {exc}')
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        try:
+            header = [normalize_header(name) for name in next(rows)]
+        except StopIteration:
+            return
+        for number, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                values = list(values) + [None] * (len(header) - len(values))
+                yield number, {name: _clean_value(value) for name, value in zip(header, values)}
+    finally:
+        workbook.close()
+
+
+def read_rows(stream, filename):
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.xlsx':
+        return read_xlsx(stream)
+    if extension in ('.csv', '.txt', ''):
+        return read_csv(stream)
+    raise ImportFileError(f"Ukjent filtype '{extension}'. Bruk .csv eller .xlsx.")
+
+
+@dataclass
+class ImportResult:
+    dry_run: bool = False
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, row_number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run, 'rows': self.rows, 'created': self.created, 'updated': self.updated,
+            'error_count': self.error_count, 'errors': self.errors,
+            'errors_truncated': self.error_count > len(self.errors),
+        }
+
+
+class BaseImporter:
+    """
+    Felles bolkløkke. Underklasser angir model, fields (kolonner som leses
+    direkte inn i modellfelt), required_columns, og implementerer
+    resolve_chunk() og match_existing().
+    """
+    model = None
+    fields = ()
+    required_columns = ()
+    extra_update_fields = () # Felt before_write() setter, som også må med i bulk_update
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.result = ImportResult(dry_run=dry_run)
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            if self.result.rows == 0:
+                self.check_columns(chunk[0][1])
+            self.result.rows += len(chunk)
+            self.import_chunk(chunk)
+        return self.result
+
+    def check_columns(self, row):
+        missing = [name for name in self.required_columns if name not in row]
+        if missing:
+            raise ImportFileError(f"Mangler kolonner: {', '.join(missing)}.")
+
+    def clean_fields(self, row):
+        """ Modellfeltenes egen validering (to_python, lengde, e-post, dato osv.). """
+        values, errors = {}, {}
+        for name in self.fields:
+            if name not in row:
+                continue
+            model_field = self.model._meta.get_field(name)
+            raw = row[name]
+            if raw is None and model_field.null:
+                continue # Tom celle endrer ikke eksisterende verdi
+            if isinstance(raw, (int, float)) and model_field.get_internal_type() == 'CharField':
+                raw = str(int(raw)) if float(raw).is_integer() else str(raw) # Postnummer fra Excel
+            try:
+                values[name] = model_field.clean(raw if raw is not None else '', None)
+            except DjangoValidationError as exc:
+                errors[name] = exc.messages
+        return values, errors
+
+    def import_chunk(self, chunk):
+        cleaned = []
+        for number, row in chunk:
+            values, errors = self.clean_fields(row)
+            if errors:
+                self.result.add_error(number, errors)
+            else:
+                cleaned.append((number, row, values))
+
+        cleaned = self.resolve_chunk(cleaned)
+        # Samme nøkkel flere ganger i bolken: siste rad gjelder
+        by_key = {}
+        for number, values in cleaned:
+            by_key[self.key_for(values)] = (number, values)
+        existing = self.match_existing(list(by_key))
+
+        to_create, to_update = [], []
+        for key, (number, values) in by_key.items():
+            instance = existing.get(key)
+            if instance is None:
+                to_create.append(self.model(**values))
+            else:
+                for name, value in values.items():
+                    setattr(instance, name, value)
+                to_update.append(instance)
+        self.result.created += len(to_create)
+        self.result.updated += len(to_update)
+        if self.dry_run or not (to_create or to_update):
+            return
+
+        self.before_write(to_create + to_update)
+        with transaction.atomic():
+            self.model.objects.bulk_create(to_create)
+            if to_update:
+                update_fields = {name for _, values in by_key.values() for name in values}
+                update_fields.update(self.extra_update_fields)
+                # auto_now settes bare av save()
+                now = timezone.now()
+                for model_field in self.model._meta.concrete_fields:
+                    if getattr(model_field, 'auto_now', False):
+                        update_fields.add(model_field.name)
+                        for instance in to_update:
+                            setattr(instance, model_field.attname, now)
+                self.model.objects.bulk_update(to_update, sorted(update_fields))
+            # bulk-operasjonene sender ingen signaler
+            search.reindex_with_dependents(self.model, [instance.pk for instance in to_create + to_update])
+        typeahead.invalidate(self.model)
+        proximity.invalidate(self.model)
+
+    def before_write(self, instances):
+        """ Siste endringer på objektene før bulk-skrivingen (save() kalles ikke). """
+
+    def resolve_chunk(self, cleaned):
+        """ [(radnr, rad, verdier)] -> [(radnr, verdier)] med relasjoner slått opp. """
+        return [(number, values) for number, _, values in cleaned]
+
+    def key_for(self, values):
+        raise NotImplementedError
+
+    def match_existing(self, keys):
+        raise NotImplementedError
+
+
+class CustomerImporter(BaseImporter):
+    model = Customer
+    fields = ('name', 'contact_person', 'email', 'phone', 'address', 'zip_code', 'city')
+    required_columns = ('name', 'address', 'zip_code', 'city')
+    extra_update_fields = ('name_folded', *geocoding.COORDINATE_FIELDS)
+
+    def key_for(self, values):
+        return fold(values['name']), values['zip_code']
+
+    def before_write(self, instances):
+        for customer in instances:
+            customer.name_folded = fold(customer.name)
+            geocoding.refresh_coordinates(customer)
+
+    def match_existing(self, keys):
+        # Bare kunder med navn og postnummer fra bolken; parene sjekkes i Python
+        wanted = set(keys)
+        existing = {}
+        candidates = Customer.objects.filter(name_folded__in={name for name, _ in keys},
+                                             zip_code__in={zip_code for _, zip_code in keys})
+        for customer in candidates.order_by('pk'):
+            key = (fold(customer.name), customer.zip_code)
+            if key in wanted:
+                existing.setdefault(key, customer)
+        return existing
+
+
+class ElevatorImporter(BaseImporter):
+    model = Elevator
+    fields = ('serial_number', 'installation_date', 'last_inspection_date', 'next_inspection_date',
+              'location_description')
+    required_columns = ('serial_number',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # fold(navn) -> pk; leses ved første behov og gjelder hele importen
+        self.elevator_types = None
+
+    def check_columns(self, row):
+        super().check_columns(row)
+        if 'customer' not in row and 'customer_id' not in row:
+            raise ImportFileError('Mangler kolonne: customer eller customer_id.')
+
+    def resolve_elevator_types(self):
+        if self.elevator_types is None:
+            self.elevator_types = {}
+            for pk, name in ElevatorType.objects.order_by('pk').values_list('pk', 'name'):
+                self.elevator_types.setdefault(fold(name), pk)
+
+    def resolve_customers(self, cleaned):
+        """
+        customer_id og kundenavn -> pk med høyst én spørring hver per bolk,
+        begrenset til verdiene i bolken.
+        """
+        ids, names = set(), set()
+        for _, row, _ in cleaned:
+            if row.get('customer_id') is not None:
+                ids.add(str(row['customer_id']).split('.')[0])
+            elif row.get('customer'):
+                names.add(fold(row['customer']))
+        by_id = set()
+        if ids:
+            by_id = {str(pk) for pk in Customer.objects.filter(pk__in=[i for i in ids if i.isdigit()])
+                     .values_list('pk', flat=True)}
+        by_name = {}
+        if names:
+            for pk, name in Customer.objects.filter(name_folded__in=names).order_by('pk').values_list(
+                    'pk', 'name_folded'):
+                by_name.setdefault(name, []).append(pk)
+        return by_id, by_name
+
+    def resolve_chunk(self, cleaned):
+        if any(row.get('elevator_type') for _, row, _ in cleaned):
+            self.resolve_elevator_types()
+        customer_ids, customer_names = self.resolve_customers(cleaned)
+        resolved = []
+        for number, row, values in cleaned:
+            errors = {}
+            if row.get('customer_id') is not None:
+                customer_id = str(row['customer_id']).split('.')[0]
+                if customer_id not in customer_ids:
+                    errors['customer_id'] = [f'Finner ingen kunde med id {row["customer_id"]}.']
+                else:
+                    values['customer_id'] = int(customer_id)
+            elif row.get('customer'):
+                matches = customer_names.get(fold(row['customer']), [])
+                if len(matches) == 1:
+                    values['customer_id'] = matches[0]
+                elif matches:
+                    errors['customer'] = [f'Flere kunder heter «{row["customer"]}». Bruk customer_id.']
+                else:
+                    errors['customer'] = [f'Finner ingen kunde «{row["customer"]}».']
+            else:
+                errors['customer'] = ['Påkrevd.']
+
+            if row.get('elevator_type'):
+                type_id = self.elevator_types.get(fold(row['elevator_type']))
+                if type_id is None:
+                    errors['elevator_type'] = [f'Ukjent heistype «{row["elevator_type"]}».']
+                else:
+                    values['elevator_type_id'] = type_id
+
+            if errors:
+                self.result.add_error(number, errors)
+            else:
+                resolved.append((number, values))
+        return resolved
+
+    def key_for(self, values):
+        return values['serial_number']
+
+    def match_existing(self, keys):
+        return Elevator.objects.in_bulk(keys, field_name='serial_number')
+
+
+IMPORTERS = {
+    'customers': CustomerImporter,
+    'elevators': ElevatorImporter,
+}
+
+
+def import_file(kind, stream, filename, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    importer = IMPORTERS[kind](chunk_size=chunk_size, dry_run=dry_run)
+    return importer.run(read_rows(stream, filename))
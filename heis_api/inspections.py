@@ -0,0 +1,127 @@
+"""
+Periodisk kontroll: gjør Elevator.next_inspection_date om til oppdrag.
+
+Planleggeren kjøres jevnlig (`manage.py plan_inspections`, f.eks. hver natt) og
+gjør tre set-baserte steg:
+
+1. Fullførte kontroller flytter datoene: last_inspection_date = fullført-dato,
+   next_inspection_date = fullført-dato + intervall. Én UPDATE per fullført-dato.
+   Fullført-dato er completed_at, eller updated_at for eldre oppdrag som ble
+   satt til fullført uten at completed_at ble fylt ut.
+2. Heiser uten neste dato, men med siste kontroll, får neste = siste + intervall.
+3. Heiser med neste kontroll innen horisonten (områdesøk på indeksen
+   elevator_next_inspection_idx, forfalte inkludert) får et
+   Assignment(assignment_type='inspection') med deadline_date = forfallsdato,
+   opprettet med bulk_create i bolker.
+
+Oppdraget knyttes til kontrollrunden via (elevator, deadline_date), så nye
+kjøringer hopper over heiser som allerede har et kontrolloppdrag for samme
+forfallsdato (uansett status). Kjøringen er dermed idempotent.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import search
+from .models import Assignment, Elevator
+
+DEFAULT_HORIZON_DAYS = 30
+DEFAULT_INTERVAL_DAYS = 365 # Årlig periodisk kontroll
+CHUNK_SIZE = 2000
+
+
+@dataclass
+class PlanResult:
+    advanced: int = 0
+    seeded: int = 0
+    created: int = 0
+
+
+def _update_dates(groups, dry_run):
+    """ groups: {(siste, neste): [pk, ...]} -> én UPDATE per datopar (i bolker av pk). """
+    count = 0
+    for (last, next_date), pks in groups.items():
+        count += len(pks)
+        if dry_run:
+            continue
+        for start in range(0, len(pks), CHUNK_SIZE):
+            update = {'next_inspection_date': next_date}
+            if last is not None:
+                update['last_inspection_date'] = last
+            Elevator.objects.filter(pk__in=pks[start:start + CHUNK_SIZE]).update(**update)
+    return count
+
+
+def advance_completed(interval, dry_run=False):
+    """ Steg 1: fullførte kontroller for gjeldende forfallsdato flytter heisens datoer. """
+    completed = Assignment.objects.filter(
+        assignment_type='inspection', status='completed',
+        elevator__isnull=False, deadline_date=F('elevator__next_inspection_date'),
+    ).values_list('elevator_id', Coalesce('completed_at', 'updated_at'))
+    groups = defaultdict(list)
+    for elevator_id, completed_at in completed.iterator(chunk_size=CHUNK_SIZE):
+        day = timezone.localdate(completed_at)
+        groups[(day, day + interval)].append(elevator_id)
+    return _update_dates(groups, dry_run)
+
+
+def seed_next_dates(interval, dry_run=False):
+    """ Steg 2: next_inspection_date = last_inspection_date + intervall der den mangler. """
+    missing = Elevator.objects.filter(next_inspection_date__isnull=True, last_inspection_date__isnull=False)
+    groups = defaultdict(list)
+    for pk, last in missing.values_list('pk', 'last_inspection_date').iterator(chunk_size=CHUNK_SIZE):
+        groups[(None, last + interval)].append(pk)
+    return _update_dates(groups, dry_run)
+
+
+def due_elevators(until):
+    """ Heiser med kontroll forfalt eller innen `until` som ikke har oppdrag for forfallsdatoen. """
+    planned = Assignment.objects.filter(
+        elevator=OuterRef('pk'), assignment_type='inspection', deadline_date=OuterRef('next_inspection_date'),
+    )
+    return Elevator.objects.filter(next_inspection_date__lte=until).exclude(Exists(planned))
+
+
+def create_inspections(until, dry_run=False):
+    """ Steg 3: ett kontrolloppdrag per forfalt heis, med bulk_create i bolker. """
+    rows = due_elevators(until).order_by('next_inspection_date', 'pk').values_list(
+        'pk', 'customer_id', 'serial_number', 'next_inspection_date',
+    ).iterator(chunk_size=CHUNK_SIZE)
+    created = 0
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return created
+        created += len(chunk)
+        if dry_run:
+            continue
+        assignments = [
+            Assignment(
+                title=f'Periodisk kontroll {serial_number}',
+                description=f'Årlig kontroll, forfaller {due:%d.%m.%Y}.',
+                customer_id=customer_id, elevator_id=elevator_id,
+                assignment_type='inspection', status='pending', deadline_date=due,
+            )
+            for elevator_id, customer_id, serial_number, due in chunk
+        ]
+        with transaction.atomic():
+            Assignment.objects.bulk_create(assignments)
+            # bulk_create sender ingen signaler
+            search.reindex(Assignment, [assignment.pk for assignment in assignments])
+
+
+def plan_inspections(horizon_days=DEFAULT_HORIZON_DAYS, interval_days=DEFAULT_INTERVAL_DAYS, today=None,
+                     dry_run=False):
+    today = today or timezone.localdate()
+    interval = timedelta(days=interval_days)
+    result = PlanResult()
+    result.advanced = advance_completed(interval, dry_run)
+    result.seeded = seed_next_dates(interval, dry_run)
+    result.created = create_inspections(today + timedelta(days=horizon_days), dry_run)
+    return result
@@ -0,0 +1,79 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from heis_api.backfills import BACKFILLS, DEFAULT_CHUNK_SIZE, get_checkpoints, run_worker
+from heis_api.models import BackfillCheckpoint
+
+
+def _run_in_process(job_name, worker, chunk_size, overwrite):
+    # Forket prosess: lukk arvede forbindelser, Django åpner en ny ved første spørring
+    connections.close_all()
+    try:
+        checkpoint = BackfillCheckpoint.objects.get(job=job_name, worker=worker)
+        run_worker(BACKFILLS[job_name](overwrite=overwrite), checkpoint, chunk_size)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Kjører en registrert backfill-jobb i pk-bolker. Avbrutte kjøringer fortsetter fra sjekkpunktet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('job', choices=sorted(BACKFILLS), help='Jobben som skal kjøres.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rader per UPDATE.')
+        parser.add_argument('--dry-run', action='store_true', help='Tell radene som ville blitt endret.')
+        parser.add_argument('--workers', type=int, default=1, help='Del pk-området på så mange arbeidere.')
+        parser.add_argument('--worker', type=int,
+                            help='Kjør bare denne delen (0-basert), f.eks. fra en annen maskin.')
+        parser.add_argument('--restart', action='store_true', help='Forkast sjekkpunktene og start på nytt.')
+        parser.add_argument('--overwrite', action='store_true',
+                            help='Regn ut verdier som allerede er satt på nytt (med --restart etter en tidligere kjøring).')
+
+    def handle(self, *args, **options):
+        job = BACKFILLS[options['job']](overwrite=options['overwrite'])
+        workers, worker, dry_run = options['workers'], options['worker'], options['dry_run']
+        if options['chunk_size'] < 1 or workers < 1:
+            raise CommandError('--chunk-size og --workers må være minst 1.')
+        if worker is not None and not 0 <= worker < workers:
+            raise CommandError(f'--worker må være mellom 0 og {workers - 1}.')
+        try:
+            checkpoints = get_checkpoints(job, workers, restart=options['restart'], dry_run=dry_run)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if worker is not None:
+            checkpoints = [checkpoints[worker]]
+
+        if len(checkpoints) > 1 and not dry_run:
+            self._fan_out(job, checkpoints, options['chunk_size'])
+        else:
+            rows = 0
+            for checkpoint in checkpoints:
+                rows += run_worker(job, checkpoint, options['chunk_size'], dry_run=dry_run,
+                                   log=self.stdout.write if options['verbosity'] > 1 else None).rows
+            verb = 'Ville oppdatert' if dry_run else 'Oppdaterte'
+            self.stdout.write(self.style.SUCCESS(f"{verb} {rows} rader ({job.name})."))
+
+    def _fan_out(self, job, checkpoints, chunk_size):
+        if connection.vendor == 'sqlite':
+            # SQLite har én skriver om gangen; parallelle prosesser gir bare låsefeil
+            raise CommandError('Flere arbeidere i samme kjøring krever PostgreSQL. Bruk --workers 1, '
+                               'eller --worker N for én del om gangen.')
+        pending = [checkpoint for checkpoint in checkpoints if checkpoint.finished_at is None]
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=_run_in_process, args=(job.name, checkpoint.worker, chunk_size, job.overwrite))
+            for checkpoint in pending
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        failed = [checkpoint.worker for checkpoint, process in zip(pending, processes) if process.exitcode]
+        rows = sum(BackfillCheckpoint.objects.filter(job=job.name).values_list('rows_updated', flat=True))
+        if failed:
+            raise CommandError(f"Arbeider {', '.join(map(str, failed))} feilet. Kjør kommandoen på nytt "
+                               f"for å fortsette fra sjekkpunktet.")
+        self.stdout.write(self.style.SUCCESS(f"Oppdaterte {rows} rader ({job.name}) med {len(checkpoints)} arbeidere."))
@@ -0,0 +1,90 @@
+import random
+import statistics
+import time as time_module
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from heis_api.availability import build_availability_matrix
+from heis_api.models import User, Customer, Assignment, Absence
+
+
+class Command(BaseCommand):
+    help = (
+        "Måler responstid for tilgjengelighetsmatrisen mens oppdragshistorikken vokser. "
+        "Kjøres mot en midlertidig testdatabase, produksjonsdata berøres ikke."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000,1000000',
+                            help='Kommaseparert liste med totalt antall oppdrag per måling.')
+        parser.add_argument('--technicians', type=int, default=50)
+        parser.add_argument('--days', type=int, default=14, help='Antall dager i målevinduet.')
+        parser.add_argument('--repeat', type=int, default=20, help='Antall målinger per størrelse.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self._run(sizes, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _run(self, sizes, options):
+        rng = random.Random(42)
+        technicians = User.objects.bulk_create([
+            User(username=f'bench_tech_{i}', email=f'bench_tech_{i}@example.com', role='tekniker')
+            for i in range(options['technicians'])
+        ])
+        customer = Customer.objects.create(name='Benchmark AS', address='Testveien 1', zip_code='0150', city='Oslo')
+
+        window_start = timezone.localdate()
+        window_end = window_start + timedelta(days=options['days'] - 1)
+        tz = timezone.get_current_timezone()
+        history_start = timezone.make_aware(datetime.combine(window_start - timedelta(days=10 * 365), time(8)), tz)
+        history_seconds = int((timezone.make_aware(datetime.combine(window_start, time.min), tz) - history_start).total_seconds())
+
+        # Et fast antall oppdrag og fravær i målevinduet, slik at kun historikken vokser
+        self._create_assignments(customer, technicians, 500, rng, options['batch_size'],
+                                 lambda: timezone.make_aware(datetime.combine(
+                                     window_start + timedelta(days=rng.randrange(options['days'])), time(8)), tz))
+        Absence.objects.bulk_create([
+            Absence(user=tech, start_date=window_start + timedelta(days=rng.randrange(options['days'])),
+                    end_date=window_end, absence_type='vacation')
+            for tech in technicians[:len(technicians) // 5]
+        ])
+
+        created = Assignment.objects.count()
+        self.stdout.write(f"{'oppdrag':>10} {'p50 ms':>9} {'p95 ms':>9} {'spørringer':>11}")
+        for size in sizes:
+            missing = size - created
+            if missing > 0:
+                self._create_assignments(customer, technicians, missing, rng, options['batch_size'],
+                                         lambda: history_start + timedelta(seconds=rng.randrange(history_seconds)))
+                created = size
+            timings = []
+            for _ in range(options['repeat']):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time_module.perf_counter()
+                    build_availability_matrix(window_start, window_end)
+                    timings.append((time_module.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(f"{created:>10} {statistics.median(timings):>9.2f} {p95:>9.2f} {len(queries):>11}")
+
+    def _create_assignments(self, customer, technicians, count, rng, batch_size, scheduled):
+        while count > 0:
+            batch = min(batch_size, count)
+            Assignment.objects.bulk_create([
+                Assignment(
+                    title='Benchmark', description='', customer=customer,
+                    assigned_to=rng.choice(technicians), assignment_type='service',
+                    status='completed', scheduled_date=scheduled(),
+                )
+                for _ in range(batch)
+            ], batch_size=batch_size)
+            count -= batch
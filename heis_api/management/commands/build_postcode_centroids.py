@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from heis_api import geocoding
+
+
+class Command(BaseCommand):
+    help = "Bygger postnummertabellen for geokoding fra GeoNames' postnummerdump for Norge (NO.txt)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='NO.txt fra https://download.geonames.org/export/zip/NO.zip')
+        parser.add_argument('--output', default=str(settings.POSTCODE_CENTROIDS_FILE),
+                            help='CSV-filen som skrives (standard POSTCODE_CENTROIDS_FILE).')
+        parser.add_argument('--shared-limit', type=int, default=geocoding.SHARED_PLACE_LIMIT,
+                            help='Punkter som deles av flere postnummer enn dette, regnes som bysentrum.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['source'], newline='', encoding='utf-8') as handle:
+                rows = geocoding.build_centroid_rows(geocoding.read_geonames(handle), options['shared_limit'])
+        except OSError as exc:
+            raise CommandError(str(exc))
+        if not rows:
+            raise CommandError('Fant ingen norske postnummer i filen.')
+        with open(options['output'], 'w', newline='', encoding='utf-8') as handle:
+            geocoding.write_centroids(handle, rows)
+        geocoding._tables.pop(options['output'], None)
+
+        postcodes = [row for row in rows if len(row[0]) == 4]
+        places = sum(1 for row in postcodes if row[4] == geocoding.PLACE)
+        self.stdout.write(self.style.SUCCESS(
+            f"Skrev {len(postcodes)} postnummer ({places} bare med bysentrum) og "
+            f"{len(rows) - len(postcodes)} regioner til {options['output']}."
+        ))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from heis_api.dispatch import DEFAULT_CAPACITY, DEFAULT_HORIZON_DAYS, dispatch
+
+
+class Command(BaseCommand):
+    help = "Fordeler ufordelte oppdrag på teknikere etter prioritet, frist, fravær og kapasitet per dag."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Første dag (YYYY-MM-DD), standard i dag.')
+        parser.add_argument('--days', type=int, default=DEFAULT_HORIZON_DAYS, help='Antall dager i perioden.')
+        parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY,
+                            help='Oppdrag per tekniker per dag.')
+        parser.add_argument('--include-weekends', action='store_true', help='Planlegg også lørdag og søndag.')
+        parser.add_argument('--dry-run', action='store_true', help='Vis planen uten å lagre.')
+
+    def handle(self, *args, **options):
+        start = None
+        if options['start']:
+            start = parse_date(options['start'])
+            if start is None:
+                raise CommandError('Ugyldig --start, bruk formatet YYYY-MM-DD.')
+        if options['days'] < 1 or not 1 <= options['capacity'] <= 255:
+            raise CommandError('--days må være minst 1 og --capacity mellom 1 og 255.')
+        plan, applied = dispatch(start, options['days'], options['capacity'],
+                                 weekdays_only=not options['include_weekends'], dry_run=options['dry_run'])
+        if options['verbosity'] > 1:
+            for entry in plan.planned:
+                self.stdout.write(f"  #{entry.assignment_id} -> {plan.technicians[entry.technician_id]} "
+                                  f"{entry.scheduled_date:%Y-%m-%d %H:%M}")
+            for pk, reason in plan.unplanned:
+                self.stdout.write(f"  #{pk}: {reason}")
+        if options['dry_run']:
+            message = f"Ville fordelt {len(plan.planned)} oppdrag"
+        else:
+            message = f"Fordelte {applied} oppdrag"
+        self.stdout.write(self.style.SUCCESS(
+            f"{message} ({plan.start} - {plan.end}); {len(plan.unplanned)} ble ikke planlagt."
+        ))
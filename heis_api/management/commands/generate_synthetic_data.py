@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from heis_api.synthetic import DatasetSize, SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Fyller databasen med syntetiske, realistiske data (kunder, heiser, oppdrag, notater, "
+        "tilbud, ordre, fravær). Størrelsen skaleres ut fra antall kunder."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=100)
+        parser.add_argument('--technicians', type=int, help='Overstyrer antall teknikere.')
+        parser.add_argument('--elevators-per-customer', type=int)
+        parser.add_argument('--assignments-per-elevator', type=int)
+        parser.add_argument('--history-days', type=int)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        size = DatasetSize.for_scale(options['customers'])
+        for field in ('technicians', 'elevators_per_customer', 'assignments_per_elevator', 'history_days'):
+            if options[field] is not None:
+                setattr(size, field, options[field])
+        generator = SyntheticDataGenerator(size, seed=options['seed'], batch_size=options['batch_size'],
+                                           stdout=self.stdout)
+        counts = generator.generate()
+        summary = ', '.join(f'{name}={count}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Ferdig: {summary}'))
@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from heis_api.importer import DEFAULT_CHUNK_SIZE, IMPORTERS, ImportFileError, import_file
+
+
+class Command(BaseCommand):
+    help = "Importerer kunder eller heiser fra CSV/XLSX i bolker, med feilrapport per rad."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Valider og tell uten å lagre.')
+        parser.add_argument('--report', help='Skriv hele resultatet (med radfeil) som JSON til denne filen.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = import_file(options['kind'], stream, options['path'],
+                                     chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        except (OSError, ImportFileError) as exc:
+            raise CommandError(str(exc))
+
+        for error in result.errors[:20]:
+            self.stdout.write(f"  rad {error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}")
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as report:
+                json.dump(result.as_dict(), report, ensure_ascii=False, indent=2)
+        verb = 'Ville importert' if result.dry_run else 'Importerte'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result.rows} rader: {result.created} nye, {result.updated} oppdatert, "
+            f"{result.error_count} med feil."
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from heis_api.inspections import DEFAULT_HORIZON_DAYS, DEFAULT_INTERVAL_DAYS, plan_inspections
+
+
+class Command(BaseCommand):
+    help = "Oppretter kontrolloppdrag for heiser med periodisk kontroll innen horisonten (idempotent)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon-days', type=int, default=DEFAULT_HORIZON_DAYS,
+                            help='Planlegg kontroller som forfaller innen så mange dager.')
+        parser.add_argument('--interval-days', type=int, default=DEFAULT_INTERVAL_DAYS,
+                            help='Dager mellom kontroller.')
+        parser.add_argument('--dry-run', action='store_true', help='Tell uten å lagre.')
+
+    def handle(self, *args, **options):
+        result = plan_inspections(horizon_days=options['horizon_days'], interval_days=options['interval_days'],
+                                  dry_run=options['dry_run'])
+        verb = 'Ville' if options['dry_run'] else 'Har'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} flyttet neste kontroll for {result.advanced} heiser, satt manglende dato for "
+            f"{result.seeded} og opprettet {result.created} kontrolloppdrag."
+        ))
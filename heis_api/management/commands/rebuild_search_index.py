@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from heis_api import search
+from heis_api.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = "Bygger søkedokumentene for fulltekstsøk på nytt (etter masseimport eller endrede search_fields)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help='Modellnavn, f.eks. customer part. Standard: alle indekserte.')
+
+    def handle(self, *args, **options):
+        wanted = {name.lower() for name in options['models']}
+        for model, index in search.registry.indexes.items():
+            if wanted and model._meta.model_name not in wanted:
+                continue
+            count = search.reindex(model)
+            # Dokumenter for objekter som er slettet uten signaler (rå SQL)
+            SearchDocument.objects.filter(model=index.label).exclude(
+                object_id__in=model._default_manager.values('pk')
+            ).delete()
+            self.stdout.write(f'  {model.__name__}: {count}')
+        if not wanted:
+            labels = [index.label for index in search.registry.indexes.values()]
+            SearchDocument.objects.exclude(model__in=labels).delete()
+        self.stdout.write(self.style.SUCCESS('Søkeindeksen er oppdatert.'))
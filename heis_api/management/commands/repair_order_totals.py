@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from heis_api.models import Order, OrderLineItem
+
+
+class Command(BaseCommand):
+    help = "Regner om OrderLineItem.line_total og Order.total_amount for eksisterende ordre, i bolker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Vis antall avvik uten å lagre.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+        money = DecimalField(max_digits=12, decimal_places=2)
+        expected_line_total = ExpressionWrapper(F('quantity') * F('unit_price_at_order'), output_field=money)
+        line_sum = OrderLineItem.objects.filter(
+            order=OuterRef('pk')
+        ).order_by().values('order').annotate(total=Sum(expected_line_total)).values('total')
+
+        last_pk = 0
+        lines_fixed = orders_fixed = 0
+        while True:
+            order_ids = list(
+                Order.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+            )
+            if not order_ids:
+                break
+            last_pk = order_ids[-1]
+
+            stale_lines = OrderLineItem.objects.filter(order_id__in=order_ids).annotate(
+                expected=expected_line_total
+            ).exclude(line_total=F('expected'))
+            stale_orders = Order.objects.filter(pk__in=order_ids).annotate(
+                expected=Coalesce(Subquery(line_sum), Value(0), output_field=money)
+            ).filter(~Q(total_amount=F('expected')))
+            lines_fixed += stale_lines.count()
+            orders_fixed += stale_orders.count()
+            if dry_run:
+                continue
+
+            with transaction.atomic():
+                OrderLineItem.objects.filter(order_id__in=order_ids).update(line_total=expected_line_total)
+                Order.recalculate_totals(order_ids)
+
+        verb = 'Ville rettet' if dry_run else 'Rettet'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {lines_fixed} ordrelinjer og {orders_fixed} ordretotaler."))
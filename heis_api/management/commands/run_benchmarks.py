@@ -0,0 +1,180 @@
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from heis_api.models import User, Customer, Assignment, Quote, Elevator
+from heis_api.query_budget import track_queries
+from heis_api.synthetic import DatasetSize, SyntheticDataGenerator
+
+# Forespørslene frontend faktisk gjør, med omtrentlig relativ hyppighet.
+# (navn, bruker, vekt, url-funksjon som får kontekst med id-er og datoer)
+REQUEST_MIX = [
+    ('assignments-list', 'admin', 10, lambda c: '/api/assignments/'),
+    ('assignments-filtered', 'admin', 5, lambda c: f"/api/assignments/?status=pending&assigned_to={c['tech']}"),
+    ('assignments-search', 'admin', 3, lambda c: '/api/assignments/?search=Service'),
+    ('assignments-detail', 'admin', 6, lambda c: f"/api/assignments/{c['assignment']}/"),
+    ('assignments-mine', 'tekniker', 8, lambda c: '/api/assignments/mine/'),
+    ('assignments-unassigned', 'admin', 3, lambda c: '/api/assignments/unassigned/'),
+    ('assignments-calendar', 'admin', 6, lambda c: f"/api/assignments/calendar/?start={c['week_start']}&end={c['week_end']}"),
+    ('availability', 'admin', 4, lambda c: f"/api/availability/?start={c['week_start']}&end={c['week_end']}"),
+    ('customers-list', 'admin', 6, lambda c: '/api/customers/'),
+    ('customers-detail', 'admin', 3, lambda c: f"/api/customers/{c['customer']}/"),
+    ('elevators-list', 'admin', 4, lambda c: '/api/elevators/'),
+    ('elevator-assignments', 'admin', 2, lambda c: f"/api/elevators/{c['elevator']}/assignments/"),
+    ('elevator-types', 'admin', 2, lambda c: '/api/elevator-types/'),
+    ('users-tekniker', 'admin', 4, lambda c: '/api/users/tekniker/'),
+    ('absences-list', 'admin', 3, lambda c: '/api/absences/'),
+    ('sales-opportunities', 'admin', 3, lambda c: '/api/sales-opportunities/'),
+    ('quotes-list', 'admin', 3, lambda c: '/api/quotes/'),
+    ('quotes-detail', 'admin', 2, lambda c: f"/api/quotes/{c['quote']}/"),
+    ('orders-list', 'admin', 2, lambda c: '/api/orders/'),
+    ('project-summary', 'admin', 2, lambda c: '/api/project-summary/'),
+    ('seller-dashboard', 'admin', 2, lambda c: '/api/dashboard/seller/'),
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Genererer et syntetisk datasett i en midlertidig testdatabase og spiller av frontendens "
+        "forespørselsmiks gjennom Django-testklienten. Rapporterer p50/p95/p99 og spørringer per endepunkt, "
+        "og lagrer resultatet som JSON for sammenligning mellom commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=500, help='Datasettstørrelse (antall kunder).')
+        parser.add_argument('--requests', type=int, default=1000, help='Totalt antall forespørsler i miksen.')
+        parser.add_argument('--warmup', type=int, default=1, help='Oppvarmingskall per endepunkt.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', help='Kommaseparert liste med endepunktnavn.')
+        parser.add_argument('--output', help='JSON-fil (default: benchmarks/<commit>.json).')
+        parser.add_argument('--compare', help='Tidligere JSON-resultat å sammenligne mot.')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(SECURE_SSL_REDIRECT=False, DEBUG=False, ALLOWED_HOSTS=['testserver']):
+                results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = options['output'] or os.path.join(settings.BASE_DIR, 'benchmarks', f"{results['commit'] or 'local'}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as result_file:
+            json.dump(results, result_file, indent=2, sort_keys=True)
+        self.report(results, options['compare'])
+        self.stdout.write(self.style.SUCCESS(f'Resultater lagret i {output}'))
+
+    def run(self, options):
+        self.stdout.write(f"Genererer datasett ({options['customers']} kunder)...")
+        generator = SyntheticDataGenerator(DatasetSize.for_scale(options['customers']), seed=options['seed'])
+        counts = generator.generate()
+
+        admin = User.objects.create_user('bench_admin', 'bench_admin@example.com', role='admin', is_staff=True)
+        tech = Assignment.objects.filter(assigned_to__isnull=False).values_list('assigned_to', flat=True).first()
+        today = timezone.localdate()
+        week_start = today - timedelta(days=today.weekday())
+        context = {
+            'tech': tech,
+            'assignment': Assignment.objects.values_list('pk', flat=True).first(),
+            'customer': Customer.objects.values_list('pk', flat=True).first(),
+            'elevator': Elevator.objects.values_list('pk', flat=True).first(),
+            'quote': Quote.objects.values_list('pk', flat=True).first(),
+            'week_start': week_start.isoformat(),
+            'week_end': (week_start + timedelta(days=6)).isoformat(),
+        }
+        clients = {'admin': APIClient(), 'tekniker': APIClient()}
+        clients['admin'].force_authenticate(admin)
+        clients['tekniker'].force_authenticate(User.objects.get(pk=tech))
+
+        mix = REQUEST_MIX
+        if options['only']:
+            wanted = set(options['only'].split(','))
+            mix = [entry for entry in mix if entry[0] in wanted]
+        total_weight = sum(weight for _, _, weight, _ in mix)
+        schedule = []
+        for entry in mix:
+            schedule += [entry] * max(1, round(options['requests'] * entry[2] / total_weight))
+        random.Random(options['seed']).shuffle(schedule)
+
+        for name, role, _, build_url in mix:
+            for _ in range(options['warmup']):
+                clients[role].get(build_url(context))
+
+        samples = {name: {'latency_ms': [], 'queries': [], 'status': set()} for name, _, _, _ in mix}
+        for name, role, _, build_url in schedule:
+            url = build_url(context)
+            with track_queries() as stats:
+                started = time.perf_counter()
+                response = clients[role].get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = (time.perf_counter() - started) * 1000
+            samples[name]['latency_ms'].append(elapsed)
+            samples[name]['queries'].append(stats.count)
+            samples[name]['status'].add(response.status_code)
+
+        endpoints = {}
+        for name, sample in samples.items():
+            latencies = sorted(sample['latency_ms'])
+            endpoints[name] = {
+                'requests': len(latencies),
+                'p50_ms': round(percentile(latencies, 0.50), 3),
+                'p95_ms': round(percentile(latencies, 0.95), 3),
+                'p99_ms': round(percentile(latencies, 0.99), 3),
+                'mean_ms': round(statistics.fmean(latencies), 3),
+                'queries': max(sample['queries']),
+                'status': sorted(sample['status']),
+            }
+        return {
+            'commit': git_commit(),
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': counts,
+            'endpoints': endpoints,
+        }
+
+    def report(self, results, compare_path):
+        baseline = {}
+        if compare_path:
+            with open(compare_path) as baseline_file:
+                baseline = json.load(baseline_file).get('endpoints', {})
+        header = f"{'endepunkt':<24} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'spørr.':>7}"
+        if baseline:
+            header += f" {'Δp95':>8} {'Δspørr.':>8}"
+        self.stdout.write(header)
+        for name, stats in sorted(results['endpoints'].items()):
+            line = (f"{name:<24} {stats['requests']:>5} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                    f"{stats['p99_ms']:>9.2f} {stats['queries']:>7}")
+            previous = baseline.get(name)
+            if previous:
+                delta = (stats['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100 if previous['p95_ms'] else 0
+                line += f" {delta:>+7.1f}% {stats['queries'] - previous['queries']:>+8}"
+            if any(code >= 400 for code in stats['status']):
+                line += f"  status={stats['status']}"
+            self.stdout.write(line)
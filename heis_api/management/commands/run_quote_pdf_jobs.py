@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from heis_api.models import QuotePDFBatchJob
+from heis_api.quote_pdf_batch import reclaim_stale_jobs, run_batch_job
+
+
+class Command(BaseCommand):
+    help = "Kjører ventende PDF-batchjobber (f.eks. fra cron, eller etter omstart av webserveren)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-minutes', type=int, default=settings.QUOTE_PDF_BATCH_STALE_MINUTES,
+                            help="Kjør jobber som har stått som 'running' lenger enn dette, på nytt.")
+
+    def handle(self, *args, **options):
+        reclaimed = reclaim_stale_jobs(options['stale_minutes'])
+        if reclaimed:
+            self.stdout.write(f"Tok opp igjen {reclaimed} jobber som stod fast.")
+        job_ids = list(QuotePDFBatchJob.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True))
+        for job_id in job_ids:
+            run_batch_job(job_id)
+            job = QuotePDFBatchJob.objects.get(pk=job_id)
+            self.stdout.write(f"{job}")
+        self.stdout.write(self.style.SUCCESS(f"Kjørte {len(job_ids)} jobber."))
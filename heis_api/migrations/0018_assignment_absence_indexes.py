@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0017_absence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='absence',
+            index=models.Index(fields=['end_date', 'start_date'], name='absence_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['scheduled_date', 'assigned_to'], name='assignment_sched_tech_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0018_assignment_absence_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['deadline_date', 'scheduled_date'], name='assignment_deadline_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:52
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_quote_totals(apps, schema_editor):
+    QuoteLineItem = apps.get_model('heis_api', 'QuoteLineItem')
+    Quote = apps.get_model('heis_api', 'Quote')
+    lines = QuoteLineItem.objects.select_related('elevator_type')
+    for line in lines.iterator():
+        price = line.elevator_type.price if line.elevator_type else None
+        line.line_total = line.quantity * price if price is not None else Decimal('0.00')
+        line.save(update_fields=['line_total'])
+    for quote in Quote.objects.iterator():
+        total = quote.line_items.aggregate(total=Sum('line_total'))['total'] or Decimal('0.00')
+        Quote.objects.filter(pk=quote.pk).update(total_amount=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0019_assignment_deadline_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quotelineitem',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12, verbose_name='Linjesum'),
+        ),
+        migrations.RunPython(backfill_quote_totals, migrations.RunPython.noop),
+    ]
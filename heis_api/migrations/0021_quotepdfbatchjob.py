@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0020_quotelineitem_line_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotePDFBatchJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quote_ids', models.JSONField(default=list, verbose_name='Tilbud')),
+                ('status', models.CharField(choices=[('pending', 'Venter'), ('running', 'Pågår'), ('completed', 'Fullført'), ('failed', 'Feilet')], default='pending', max_length=20, verbose_name='Status')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Antall tilbud')),
+                ('completed', models.PositiveIntegerField(default=0, verbose_name='Ferdig rendret')),
+                ('errors', models.JSONField(blank=True, default=dict, verbose_name='Feil per tilbud')),
+                ('archive', models.FileField(blank=True, null=True, upload_to='quote_pdf_batches/', verbose_name='Zip-arkiv')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='quote_pdf_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'PDF-batchjobb',
+                'verbose_name_plural': 'PDF-batchjobber',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
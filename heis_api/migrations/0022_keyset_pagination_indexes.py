@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0021_quotepdfbatchjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['created_at', 'id'], name='assignment_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentnote',
+            index=models.Index(fields=['created_at', 'id'], name='assignmentnote_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['created_at', 'id'], name='report_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:18
+
+from django.db import migrations, models
+
+from heis_api.stemmer import stem_text
+
+FTS_TABLE = 'heis_api_searchdocument_fts'
+
+SQLITE_FORWARD = [
+    # External content: FTS5 leser teksten fra heis_api_searchdocument, triggerne holder indeksen i synk
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        stemmed, content='heis_api_searchdocument', content_rowid='id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER heis_api_searchdocument_ai AFTER INSERT ON heis_api_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, stemmed) VALUES (new.id, new.stemmed);
+    END""",
+    f"""CREATE TRIGGER heis_api_searchdocument_ad AFTER DELETE ON heis_api_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, stemmed) VALUES ('delete', old.id, old.stemmed);
+    END""",
+    f"""CREATE TRIGGER heis_api_searchdocument_au AFTER UPDATE ON heis_api_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, stemmed) VALUES ('delete', old.id, old.stemmed);
+        INSERT INTO {FTS_TABLE}(rowid, stemmed) VALUES (new.id, new.stemmed);
+    END""",
+]
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS heis_api_searchdocument_ai',
+    'DROP TRIGGER IF EXISTS heis_api_searchdocument_ad',
+    'DROP TRIGGER IF EXISTS heis_api_searchdocument_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+POSTGRES_FORWARD = [
+    """ALTER TABLE heis_api_searchdocument ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('norwegian', content)) STORED""",
+    'CREATE INDEX heis_api_searchdocument_vector_idx ON heis_api_searchdocument USING gin (search_vector)',
+]
+POSTGRES_BACKWARD = [
+    'DROP INDEX IF EXISTS heis_api_searchdocument_vector_idx',
+    'ALTER TABLE heis_api_searchdocument DROP COLUMN IF EXISTS search_vector',
+]
+
+# search_fields slik de var da indeksen ble innført (senere endringer bygges med rebuild_search_index)
+INITIAL_DOCUMENTS = {
+    'assignment': ['title', 'description', 'customer__name', 'elevator__serial_number'],
+    'customer': ['name', 'contact_person', 'email', 'phone', 'address', 'city'],
+    'elevator': ['serial_number', 'location_description', 'customer__name'],
+    'part': ['name', 'part_number', 'description'],
+}
+
+
+def run_statements(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        run_statements(schema_editor, SQLITE_FORWARD)
+    elif vendor == 'postgresql':
+        run_statements(schema_editor, POSTGRES_FORWARD)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        run_statements(schema_editor, SQLITE_BACKWARD)
+    elif vendor == 'postgresql':
+        run_statements(schema_editor, POSTGRES_BACKWARD)
+
+
+def build_initial_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('heis_api', 'SearchDocument')
+    for model_name, paths in INITIAL_DOCUMENTS.items():
+        model = apps.get_model('heis_api', model_name)
+        documents = []
+        for row in model.objects.values_list('pk', *paths).iterator(chunk_size=2000):
+            content = ' '.join(str(value) for value in row[1:] if value not in (None, ''))
+            documents.append(SearchDocument(model=f'heis_api.{model_name}', object_id=row[0],
+                                            content=content, stemmed=stem_text(content)))
+        SearchDocument.objects.bulk_create(documents, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0022_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('content', models.TextField(blank=True, default='')),
+                ('stemmed', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('model', 'object_id'), name='searchdocument_unique_object')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(build_initial_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0023_searchdocument'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='elevator',
+            index=models.Index(fields=['next_inspection_date'], name='elevator_next_inspection_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0024_elevator_next_inspection_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=100)),
+                ('worker', models.PositiveIntegerField(default=0)),
+                ('workers', models.PositiveIntegerField(default=1)),
+                ('range_start', models.BigIntegerField(default=0)),
+                ('range_end', models.BigIntegerField(default=0)),
+                ('last_pk', models.BigIntegerField(default=0)),
+                ('rows_updated', models.PositiveBigIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('job', 'worker'), name='backfillcheckpoint_unique_worker')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0025_backfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='priority',
+            field=models.CharField(choices=[('low', 'Lav'), ('medium', 'Medium'), ('high', 'Høy'), ('urgent', 'Kritisk')], default='medium', max_length=20),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0026_assignment_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='geocode_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=320),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='geocode_precision',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+MAX_REPORTED = 20
+
+
+def check_existing_absences(apps, schema_editor):
+    """
+    Overlappkontrollen (Absence.overlapping, absences.IntervalList) forutsetter
+    at en brukers fravær ikke overlapper. Eksisterende data sjekkes derfor før
+    indeksen og constrainten legges til, og migrasjonen stopper med en liste
+    over radene som må rettes.
+    """
+    Absence = apps.get_model('heis_api', 'Absence')
+    problems = [
+        f'#{pk}: sluttdato {end} er før startdato {start}'
+        for pk, start, end in Absence.objects.filter(end_date__lt=models.F('start_date')).values_list(
+            'pk', 'start_date', 'end_date')
+    ]
+    rows = Absence.objects.filter(end_date__gte=models.F('start_date')).order_by('user_id', 'start_date', 'pk')
+    previous = None # (bruker, pk, sluttdato) for fraværet som slutter senest så langt
+    for pk, user_id, start, end in rows.values_list('pk', 'user_id', 'start_date', 'end_date').iterator():
+        if previous and previous[0] == user_id and start <= previous[2]:
+            problems.append(f'#{pk} ({start} - {end}) overlapper #{previous[1]} for bruker {user_id}')
+        if not previous or previous[0] != user_id or end > previous[2]:
+            previous = (user_id, pk, end)
+    if problems:
+        raise RuntimeError(
+            f'{len(problems)} fravær må rettes før migrasjonen kan kjøres:\n' + '\n'.join(problems[:MAX_REPORTED])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0027_customer_coordinates'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_existing_absences, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='absence',
+            index=models.Index(fields=['user', 'start_date', 'end_date'], name='absence_user_period_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='absence',
+            constraint=models.CheckConstraint(condition=models.Q(('end_date__gte', models.F('start_date'))), name='absence_end_date_gte_start_date'),
+        ),
+    ]
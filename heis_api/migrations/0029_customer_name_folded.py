@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:47
+
+from django.db import migrations, models
+
+
+def fill_name_folded(apps, schema_editor):
+    # Samme som models.fold_name; historiske modeller har ikke save()-logikken
+    Customer = apps.get_model('heis_api', 'Customer')
+    batch = []
+    for customer in Customer.objects.only('pk', 'name').iterator(chunk_size=2000):
+        customer.name_folded = str(customer.name).casefold()
+        batch.append(customer)
+        if len(batch) == 2000:
+            Customer.objects.bulk_update(batch, ['name_folded'])
+            batch = []
+    Customer.objects.bulk_update(batch, ['name_folded'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heis_api', '0028_absence_user_period'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='name_folded',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=400),
+        ),
+        migrations.RunPython(fill_name_folded, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,14 @@
-from django.db import models
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import F, Sum, Value, OuterRef, Subquery, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from . import geocoding
 
 def elevator_manual_upload_path(instance, filename):
     # Filen vil lastes opp til MEDIA_ROOT/elevator_manuals/elevator_id_filename
@@ -30,8 +37,14 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+def fold_name(name):
+    """ Navn uten hensyn til store/små bokstaver, også for Æ/Ø/Å (SQLite bretter bare ASCII). """
+    return str(name).casefold()
+
 class Customer(models.Model):
     name = models.CharField(max_length=200)
+    # fold_name(name), indeksert for oppslag på navn uten hensyn til store/små bokstaver (importen)
+    name_folded = models.CharField(max_length=400, blank=True, default='', editable=False, db_index=True)
     contact_person = models.CharField(max_length=100, blank=True, null=True)
     contact_person_user = models.ForeignKey(
         User, 
@@ -45,12 +58,26 @@ class Customer(models.Model):
     address = models.CharField(max_length=200)
     zip_code = models.CharField(max_length=10)
     city = models.CharField(max_length=100)
+    # Geokodet fra postnummer (geocoding.py); geocode_key er postnummeret koordinatene gjelder for
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geocode_precision = models.CharField(max_length=10, blank=True, default='')
+    geocode_key = models.CharField(max_length=320, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        self.name_folded = fold_name(self.name)
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = update_fields = {*update_fields, 'name_folded'}
+        if geocoding.refresh_coordinates(self) and update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *geocoding.COORDINATE_FIELDS}
+        super().save(*args, **kwargs)
+
     @property
     def contact_person_name(self):
         if self.contact_person_user:
@@ -66,6 +93,15 @@ class ElevatorType(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old_price = None
+            if self.pk:
+                old_price = ElevatorType.objects.filter(pk=self.pk).values_list('price', flat=True).first()
+            super().save(*args, **kwargs)
+            if self.pk and old_price != self.price:
+                QuoteLineItem.reprice_for_elevator_type(self)
+
 class Elevator(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='elevators')
     elevator_type = models.ForeignKey(ElevatorType, on_delete=models.SET_NULL, null=True, related_name='elevators')
@@ -78,6 +114,12 @@ class Elevator(models.Model):
     # Nye felt for dokumentopplasting
     service_manual = models.FileField(upload_to=elevator_manual_upload_path, null=True, blank=True)
     certification = models.FileField(upload_to=elevator_cert_upload_path, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Kontrollplanleggeren henter forfalte heiser med et områdesøk (inspections.py)
+            models.Index(fields=['next_inspection_date'], name='elevator_next_inspection_idx'),
+        ]
     
     def __str__(self):
         return f"{self.serial_number} - {self.customer.name}"
@@ -131,7 +173,7 @@ class Quote(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     # TODO: Implement logic for generating quote_number (e.g., in save method)
-    # TODO: Implement logic to auto-update total_amount based on line items
+    # total_amount vedlikeholdes av QuoteLineItem (se recalculate_totals)
 
     class Meta:
         verbose_name = "Tilbud"
@@ -141,6 +183,20 @@ class Quote(models.Model):
     def __str__(self):
         return f"Tilbud {self.quote_number or self.id} til {self.opportunity.customer.name}"
 
+    @classmethod
+    def recalculate_totals(cls, quote_ids):
+        """ Setter total_amount = sum av lagrede linjetotaler, med én UPDATE. """
+        line_sum = QuoteLineItem.objects.filter(
+            quote=OuterRef('pk')
+        ).order_by().values('quote').annotate(total=Sum('line_total')).values('total')
+        cls.objects.filter(pk__in=quote_ids).update(
+            total_amount=Coalesce(
+                Subquery(line_sum),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
     # Eksempel på save-metode for å generere nummer (må tilpasses)
     # def save(self, *args, **kwargs):
     #     if not self.quote_number:
@@ -156,20 +212,69 @@ class QuoteLineItem(models.Model):
     # Erstatter beskrivelse/pris med kobling til ElevatorType
     elevator_type = models.ForeignKey(ElevatorType, on_delete=models.SET_NULL, null=True, verbose_name="Heistype") 
     quantity = models.PositiveIntegerField(default=1, verbose_name="Antall")
-    # Fjerner unit_price og description, hentes fra elevator_type
-    # Fjerner line_total, beregnes dynamisk
+    # Pris hentes fra elevator_type; linjetotal lagres og holdes oppdatert
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, default=0.00, verbose_name="Linjesum")
 
-    # Fjerner save-metoden som beregnet linjetotal basert på unit_price
-    # def save(self, *args, **kwargs): ...
+    def save(self, *args, **kwargs):
+        price = self.elevator_type.price if self.elevator_type else None
+        self.line_total = self.quantity * price if price is not None else Decimal('0.00')
+        with transaction.atomic():
+            old_quote_id = None
+            if self.pk:
+                old_quote_id = QuoteLineItem.objects.filter(pk=self.pk).values_list('quote_id', flat=True).first()
+            super().save(*args, **kwargs)
+            Quote.recalculate_totals({self.quote_id, old_quote_id} - {None})
 
     def __str__(self):
         type_name = self.elevator_type.name if self.elevator_type else "Ukjent Type"
         return f"{self.quantity} x {type_name} for Quote {self.quote.id}"
 
+    @classmethod
+    def reprice_for_elevator_type(cls, elevator_type):
+        """ Oppdaterer linjetotaler og tilbudssummer etter prisendring på en heistype. """
+        lines = cls.objects.filter(elevator_type=elevator_type)
+        quote_ids = set(lines.values_list('quote_id', flat=True))
+        if elevator_type.price is None:
+            lines.update(line_total=Decimal('0.00'))
+        else:
+            lines.update(line_total=ExpressionWrapper(
+                F('quantity') * Value(elevator_type.price),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ))
+        Quote.recalculate_totals(quote_ids)
+
     class Meta:
         verbose_name = "Tilbudslinje"
         verbose_name_plural = "Tilbudslinjer"
 
+class QuotePDFBatchJob(models.Model):
+    """ Bakgrunnsjobb som rendrer mange tilbuds-PDF-er og pakker dem i en zip. """
+    STATUS_CHOICES = (
+        ('pending', 'Venter'),
+        ('running', 'Pågår'),
+        ('completed', 'Fullført'),
+        ('failed', 'Feilet'),
+    )
+
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='quote_pdf_jobs')
+    quote_ids = models.JSONField(default=list, verbose_name="Tilbud")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Status")
+    total = models.PositiveIntegerField(default=0, verbose_name="Antall tilbud")
+    completed = models.PositiveIntegerField(default=0, verbose_name="Ferdig rendret")
+    errors = models.JSONField(default=dict, blank=True, verbose_name="Feil per tilbud")
+    archive = models.FileField(upload_to='quote_pdf_batches/', null=True, blank=True, verbose_name="Zip-arkiv")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "PDF-batchjobb"
+        verbose_name_plural = "PDF-batchjobber"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"PDF-batch {self.id} ({self.get_status_display()}, {self.completed}/{self.total})"
+
 class Order(models.Model):
     """ Representerer en bekreftet ordre, ofte basert på et akseptert tilbud. """
     STATUS_CHOICES = (
@@ -198,6 +303,53 @@ class Order(models.Model):
     def __str__(self):
         return f"Ordre {self.id} for {self.customer.name}"
 
+    @classmethod
+    def recalculate_totals(cls, order_ids):
+        """ Setter total_amount = sum av linjetotaler, med én UPDATE for alle ordrene. """
+        line_sum = OrderLineItem.objects.filter(
+            order=OuterRef('pk')
+        ).order_by().values('order').annotate(total=Sum('line_total')).values('total')
+        cls.objects.filter(pk__in=order_ids).update(
+            total_amount=Coalesce(
+                Subquery(line_sum),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
+
+_order_totals_state = threading.local()
+
+
+@contextmanager
+def order_totals_batch():
+    """
+    Samler endrede ordre i blokken og regner om Order.total_amount én gang
+    ved slutten, i samme transaksjon. Nøstede blokker slås sammen med den ytterste.
+    """
+    pending = getattr(_order_totals_state, 'pending', None)
+    if pending is not None:
+        yield pending
+        return
+    pending = _order_totals_state.pending = set()
+    try:
+        with transaction.atomic():
+            yield pending
+            if pending:
+                Order.recalculate_totals(pending)
+    finally:
+        _order_totals_state.pending = None
+
+
+def mark_order_total_dirty(*order_ids):
+    """ Regner om totalsum nå, eller ved slutten av en aktiv order_totals_batch(). """
+    order_ids = {order_id for order_id in order_ids if order_id is not None}
+    pending = getattr(_order_totals_state, 'pending', None)
+    if pending is not None:
+        pending.update(order_ids)
+    elif order_ids:
+        Order.recalculate_totals(order_ids)
+
 class OrderLineItem(models.Model):
     """ Representerer en linje i en ordre, kopiert fra tilbudslinje. """
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='line_items', verbose_name="Ordre")
@@ -208,8 +360,13 @@ class OrderLineItem(models.Model):
 
     def save(self, *args, **kwargs):
         self.line_total = self.quantity * self.unit_price_at_order
-        super().save(*args, **kwargs)
-        # TODO: Oppdatere Order.total_amount etter lagring/sletting
+        with transaction.atomic():
+            old_order_id = None
+            if self.pk:
+                old_order_id = OrderLineItem.objects.filter(pk=self.pk).values_list('order_id', flat=True).first()
+            super().save(*args, **kwargs)
+            # Sletting håndteres av post_delete-signalet
+            mark_order_total_dirty(self.order_id, old_order_id)
 
     def __str__(self):
         type_name = self.elevator_type.name if self.elevator_type else "Ukjent Type"
@@ -249,6 +406,7 @@ class Assignment(models.Model):
     assigned_to = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='assignments')
     assignment_type = models.CharField(max_length=50, choices=ASSIGNMENT_TYPE_CHOICES)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='pending')
+    priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='medium')
     scheduled_date = models.DateTimeField(null=True, blank=True)
     deadline_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -261,6 +419,16 @@ class Assignment(models.Model):
     procedure_notes = models.TextField(blank=True, null=True, help_text="Notater fra tekniker under prosedyren")
     # -----------------------------------------
 
+    class Meta:
+        indexes = [
+            # Dekker datoavgrensede oppslag per tekniker (tilgjengelighet/kalender)
+            models.Index(fields=['scheduled_date', 'assigned_to'], name='assignment_sched_tech_idx'),
+            # Fanger opp flerdagersoppdrag som startet før kalendervinduet
+            models.Index(fields=['deadline_date', 'scheduled_date'], name='assignment_deadline_idx'),
+            # Keyset-paginering på (created_at, id), se pagination.KeysetPagination
+            models.Index(fields=['created_at', 'id'], name='assignment_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -273,6 +441,9 @@ class AssignmentNote(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='assignmentnote_created_id_idx'),
+        ]
     
     def __str__(self):
         return f"Note for {self.assignment.title} by {self.user.username}"
@@ -341,6 +512,11 @@ class Report(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='report_created_id_idx'),
+        ]
     
     def __str__(self):
         return f"Report for {self.assignment.title} by {self.created_by.username}"
@@ -378,16 +554,94 @@ class Absence(models.Model):
         verbose_name = "Fravær"
         verbose_name_plural = "Fravær"
         ordering = ['-start_date']
-        # Sikrer at en bruker ikke har overlappende fravær (kan justeres/fjernes)
-        # constraints = [
-        #     models.CheckConstraint(
-        #         check=models.Q(end_date__gte=models.F('start_date')),
-        #         name='end_date_gte_start_date'
-        #     ),
-        #     # Mer kompleks sjekk for overlapp trengs hvis det er kritisk
-        # ]
+        indexes = [
+            # Avgrenser overlappsøk (end_date >= fra, start_date <= til)
+            models.Index(fields=['end_date', 'start_date'], name='absence_period_idx'),
+            # Forgjengeroppslag per bruker for overlappkontroll og ledige dager (absences.py)
+            models.Index(fields=['user', 'start_date', 'end_date'], name='absence_user_period_idx'),
+        ]
+        # Overlapp mellom en brukers fravær avvises i save() (se overlapping())
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end_date__gte=models.F('start_date')),
+                name='absence_end_date_gte_start_date',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.get_absence_type_display()} ({self.start_date} - {self.end_date})"
 
+    def overlapping(self):
+        """
+        Et annet fravær for samme bruker som overlapper perioden, eller None.
+        Brukerens fravær overlapper ikke hverandre, så det holder å sjekke det
+        med størst startdato <= end_date (én indekssøking).
+        """
+        candidate = (
+            Absence.objects.filter(user_id=self.user_id, start_date__lte=self.end_date)
+            .exclude(pk=self.pk).order_by('-start_date').only('pk', 'start_date', 'end_date').first()
+        )
+        if candidate is not None and candidate.end_date >= self.start_date:
+            return candidate
+        return None
+
+    def clean(self):
+        if self.start_date and self.end_date:
+            if self.end_date < self.start_date:
+                raise ValidationError({'end_date': 'Sluttdato kan ikke være før startdato.'})
+            other = self.overlapping()
+            if other is not None:
+                raise ValidationError(
+                    f'Overlapper med registrert fravær {other.start_date:%d.%m.%Y}-{other.end_date:%d.%m.%Y}.'
+                )
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            # Låser brukeren, så to samtidige fravær for samme bruker ikke begge passerer kontrollen
+            list(User.objects.select_for_update().filter(pk=self.user_id).values_list('pk'))
+            self.clean()
+            super().save(*args, **kwargs)
+
+class SearchDocument(models.Model):
+    """
+    Denormalisert søketekst for ett objekt, bygget fra viewsetets search_fields
+    (se search.py). Fulltekstindeksen ligger utenfor Django-modellen: FTS5-tabell
+    på SQLite og tsvector-kolonne med GIN-indeks på PostgreSQL (migrasjon 0023).
+    """
+    model = models.CharField(max_length=50) # app_label.modellnavn
+    object_id = models.PositiveBigIntegerField()
+    content = models.TextField(blank=True, default='')
+    stemmed = models.TextField(blank=True, default='') # Norsk-stemmet content (for FTS5)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id'], name='searchdocument_unique_object'),
+        ]
+
+    def __str__(self):
+        return f"{self.model}:{self.object_id}"
+
+class BackfillCheckpoint(models.Model):
+    """ Fremdrift for én arbeider i en datareparasjon (backfills.py), så den kan gjenopptas. """
+    job = models.CharField(max_length=100)
+    worker = models.PositiveIntegerField(default=0)
+    workers = models.PositiveIntegerField(default=1)
+    # pk-området arbeideren eier (fastsatt ved første kjøring) og høyeste pk som er ferdig
+    range_start = models.BigIntegerField(default=0)
+    range_end = models.BigIntegerField(default=0)
+    last_pk = models.BigIntegerField(default=0)
+    rows_updated = models.PositiveBigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'worker'], name='backfillcheckpoint_unique_worker'),
+        ]
+
+    def __str__(self):
+        return f"{self.job} [{self.worker + 1}/{self.workers}] til pk {self.last_pk}"
+
 # Register your models here.
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""
+Keyset-paginering (cursor) for store tabeller som vokser i én ende.
+
+PageNumberPagination kjører COUNT(*) og en stadig dypere OFFSET, så side 500
+koster mye mer enn side 1. KeysetPagination husker i stedet siste rad
+(created_at, id) i en ugjennomsiktig cursor og henter neste side med
+`WHERE (created_at, id) < (:c, :i) ORDER BY created_at DESC, id DESC LIMIT n`,
+som går rett i indeksen på (created_at, id).
+
+Egne actions kan velge annen sortering med @action(keyset_ordering=...);
+siste felt må være unikt (id). Responsen har samme form som før
+(count/next/previous/results). Med ?count=false droppes COUNT(*) for
+uendelig scrolling.
+
+Søk (?search=, se search.py) sorteres på relevans. search_rank er et beregnet
+uttrykk, ikke en kolonne det finnes indeks på, så da bruker cursoren OFFSET i
+stedet og sorteringen fra søket beholdes. Søketreff er få nok til at det går fint.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+FALSE_VALUES = ('0', 'false', 'no', 'off')
+RANK_ALIAS = 'search_rank' # Satt av FullTextSearchFilter
+
+
+class KeysetPagination(BasePagination):
+    # Sorteringsfelt med tie-breaker til slutt; kan overstyres per action med
+    # @action(..., keyset_ordering=(...)). NULL sorteres sist i lesretningen.
+    ordering = ('-created_at', '-id')
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Ugyldig cursor.'
+
+    def get_ordering(self, view):
+        return getattr(view, 'keyset_ordering', None) or self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset) if self.include_count(request) else None
+        self.offset = None
+        if RANK_ALIAS in queryset.query.extra_select:
+            return self.paginate_ranked(queryset, request)
+
+        ordering = self.get_ordering(view)
+        self.keys = parse_ordering(queryset.model, ordering)
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        # Bakover (previous) = motsatt sortering, så snus siden etterpå
+        queryset = with_columns(queryset, [item.lstrip('-') for item in ordering])
+        queryset = queryset.order_by(*ordering_expressions(self.keys, reverse))
+        if position is not None:
+            queryset = queryset.filter(after_position(self.keys, position, reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = rows
+        return rows
+
+    def paginate_ranked(self, queryset, request):
+        """ Søketreff i relevansrekkefølge, side for side med OFFSET. """
+        self.offset = self.decode_offset(request)
+        rows = list(queryset[self.offset:self.offset + self.page_size + 1])
+        self.has_next, self.has_previous = len(rows) > self.page_size, self.offset > 0
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def include_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() not in FALSE_VALUES
+
+    def get_count(self, queryset):
+        return queryset.order_by().count()
+
+    def load_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def decode_offset(self, request):
+        data = self.load_cursor(request)
+        if data is None:
+            return 0
+        offset = data.get('o') if isinstance(data, dict) else None
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return offset
+
+    def decode_cursor(self, request, model):
+        data = self.load_cursor(request)
+        if data is None:
+            return None, False
+        try:
+            if len(data['p']) != len(self.keys):
+                raise ValueError
+            position = []
+            for (name, _, nullable), value in zip(self.keys, data['p']):
+                if value is None and not nullable:
+                    raise ValueError
+                position.append(model._meta.get_field(name).to_python(value))
+            return position, bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        position = []
+        for name, _, _ in self.keys:
+            value = getattr(row, name)
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return self.cursor_link({'p': position, 'r': int(reverse)})
+
+    def cursor_link(self, data):
+        payload = json.dumps(data, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        if self.offset is not None:
+            return self.cursor_link({'o': self.offset + len(self.page)})
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.offset is not None and self.offset > self.page_size:
+            return self.cursor_link({'o': self.offset - self.page_size})
+        if not self.page or self.offset is not None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        fields = [('next', self.get_next_link()), ('previous', self.get_previous_link()), ('results', data)]
+        if self.count is not None:
+            fields.insert(0, ('count', self.count))
+        return Response(OrderedDict(fields))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def parse_ordering(model, ordering):
+    """ ('-created_at', 'id') -> [(felt, synkende, nullable), ...] """
+    keys = []
+    for item in ordering:
+        name = item.lstrip('-')
+        field = model._meta.get_field(name)
+        keys.append((field.attname if field.is_relation else name, item.startswith('-'), field.null))
+    return keys
+
+
+def with_columns(queryset, names):
+    """
+    Sørger for at only() (f.eks. fra ?fields=) også henter sorteringsfeltene,
+    ellers koster encode_cursor en ekstra spørring per lenke for utsatte felt.
+    """
+    fields, is_defer = queryset.query.deferred_loading
+    if is_defer:
+        return queryset.defer(None).defer(*(fields - set(names))) if fields & set(names) else queryset
+    if not fields or set(names) <= fields:
+        return queryset
+    return queryset.only(*fields, *names)
+
+
+def ordering_expressions(keys, reverse=False):
+    """ ORDER BY for lesretningen; NULL sist forover, og dermed først bakover. """
+    expressions = []
+    for name, descending, nullable in keys:
+        if reverse:
+            descending = not descending
+        null_kwargs = {('nulls_first' if reverse else 'nulls_last'): True} if nullable else {}
+        expressions.append(F(name).desc(**null_kwargs) if descending else F(name).asc(**null_kwargs))
+    return expressions
+
+
+def after_position(keys, position, reverse=False):
+    """
+    Rader etter `position` i lesretningen, som OR av prefikser:
+    (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y). Hver gren kan bruke indeksen.
+    """
+    condition = None
+    equal = Q()
+    for (name, descending, nullable), value in zip(keys, position):
+        if reverse:
+            descending = not descending
+        if value is None:
+            # NULL er sist forover: ingenting etter, alle ikke-NULL før
+            after = Q(**{f'{name}__isnull': False}) if reverse else None
+            same = Q(**{f'{name}__isnull': True})
+        else:
+            after = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+            if nullable and not reverse:
+                after |= Q(**{f'{name}__isnull': True})
+            same = Q(**{name: value})
+        if after is not None:
+            condition = equal & after if condition is None else condition | (equal & after)
+        equal &= same
+    return condition if condition is not None else Q(pk__in=[])
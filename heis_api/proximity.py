@@ -0,0 +1,223 @@
+"""
+Nærhetssøk for hasteoppdrag: heiser nær et punkt og teknikere i nærheten i dag.
+
+Heisene ligger med kundens geokodede koordinater (geocoding.py) i et rutenett
+i minnet per prosess. Cellene er CELL_DEGREES x CELL_DEGREES grader og holder
+heis-pk-ene som ligger i dem, gruppert på koordinat. Et radiussøk leser bare
+cellene som dekker sirkelens omsluttende boks og filtrerer med
+storsirkelavstand, så svaret kommer på millisekunder også med 100 000 heiser. Indeksen bygges ved første
+oppslag og oppdateres deretter per heis og kunde fra signalene (etter commit),
+som typeahead.py. Andre prosesser får endringene ved neste fulle oppfrisking,
+som skjer etter REFRESH_SECONDS.
+
+Bare kunder med presise koordinater (geocoding.PRECISE) er med. En heis hos en
+kunde som bare er plassert på region, ville ellers ligge i regionens sentroide
+sammen med alle de andre i regionen.
+
+Nærmeste tekniker regnes ut fra dagens planlagte oppdrag (kundenes
+koordinater) for teknikere uten fravær den dagen. Det er få nok punkter til at
+de leses fra databasen ved hvert oppslag.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.utils import timezone
+
+from . import geocoding
+from .availability import day_bounds
+from .models import Absence, Assignment, Customer, Elevator, User
+
+CELL_DEGREES = 0.05 # Ca. 5,5 km nord-sør
+REFRESH_SECONDS = 300
+KM_PER_DEGREE = math.pi * geocoding.EARTH_RADIUS_KM / 180
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 100
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# Radene i indeksen: (id, serienummer, kunde-id, kundenavn, breddegrad, lengdegrad)
+ROW_FIELDS = ('id', 'serial_number', 'customer', 'customer_name', 'latitude', 'longitude')
+
+
+def cell_for(latitude, longitude):
+    return math.floor(latitude / CELL_DEGREES), math.floor(longitude / CELL_DEGREES)
+
+
+def ensure_geocoded():
+    """ Kunder som ikke er geokodet med gjeldende tabell (f.eks. fra bulk_create) får koordinater. """
+    geocoding.ensure_coordinates(Customer.objects.exclude(geocode_key__endswith=geocoding.key_suffix()))
+
+
+def elevator_rows(queryset):
+    return queryset.filter(customer__latitude__isnull=False,
+                           customer__geocode_precision__in=geocoding.PRECISE).values_list(
+        'id', 'serial_number', 'customer_id', 'customer__name', 'customer__latitude', 'customer__longitude',
+    )
+
+
+class GridIndex:
+    """
+    Heiser per rutenettcelle, gruppert på koordinat (heiser hos samme kunde
+    eller i samme postnummer deler punkt, så avstanden regnes én gang per punkt).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cells = {} # (rad, kolonne) -> {(breddegrad, lengdegrad): {pk}}
+        self.items = {} # pk -> rad
+        self.by_customer = defaultdict(set) # kunde-id -> {pk}
+        self.built_at = None
+
+    def build(self):
+        ensure_geocoded()
+        # Bygges ved siden av og byttes inn, så oppslag ikke venter på databasen
+        fresh = GridIndex()
+        for row in elevator_rows(Elevator.objects.order_by()).iterator(chunk_size=5000):
+            fresh._add(row)
+        with self.lock:
+            self.cells, self.items, self.by_customer = fresh.cells, fresh.items, fresh.by_customer
+            self.built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if self.built_at is None or time.monotonic() - self.built_at > REFRESH_SECONDS:
+            self.build()
+
+    def replace(self, pks, rows):
+        """ Fjerner heisene i pks og legger inn radene (de som fortsatt har koordinater). """
+        with self.lock:
+            for pk in pks:
+                self._remove(pk)
+            for row in rows:
+                self._remove(row[0])
+                self._add(row)
+
+    def _add(self, row):
+        point = (row[4], row[5])
+        self.items[row[0]] = row
+        self.cells.setdefault(cell_for(*point), {}).setdefault(point, set()).add(row[0])
+        self.by_customer[row[2]].add(row[0])
+
+    def _remove(self, pk):
+        row = self.items.pop(pk, None)
+        if row is None:
+            return
+        point, cell = (row[4], row[5]), cell_for(row[4], row[5])
+        points = self.cells[cell]
+        points[point].discard(pk)
+        if not points[point]:
+            del points[point]
+            if not points:
+                del self.cells[cell]
+        self.by_customer[row[2]].discard(pk)
+
+    def within(self, latitude, longitude, radius_km, limit=DEFAULT_LIMIT):
+        """ [(avstand i km, rad)] for heiser innen radius_km, nærmeste først. """
+        lat_span = radius_km / KM_PER_DEGREE
+        # Lengdegradene er kortest ved boksens pol-nærmeste kant
+        widest = min(abs(latitude) + lat_span, 89.9)
+        lon_span = min(lat_span / math.cos(math.radians(widest)), 180)
+        first_row, first_col = cell_for(latitude - lat_span, longitude - lon_span)
+        last_row, last_col = cell_for(latitude + lat_span, longitude + lon_span)
+        origin = (latitude, longitude)
+        hits = []
+        with self.lock:
+            points = []
+            for row_index in range(first_row, last_row + 1):
+                for col_index in range(first_col, last_col + 1):
+                    for point, pks in self.cells.get((row_index, col_index), {}).items():
+                        distance = geocoding.great_circle_km(origin, point)
+                        if distance <= radius_km:
+                            points.append((distance, point, pks))
+            points.sort(key=lambda hit: hit[:2])
+            for distance, _, pks in points:
+                hits += [(distance, self.items[pk]) for pk in sorted(pks)[:limit - len(hits)]]
+                if len(hits) >= limit:
+                    break
+        return hits
+
+
+index = GridIndex()
+
+
+def nearby_elevators(latitude, longitude, radius_km=DEFAULT_RADIUS_KM, limit=DEFAULT_LIMIT):
+    index.ensure_fresh()
+    return [
+        {**dict(zip(ROW_FIELDS, row)), 'distance_km': round(distance, 3)}
+        for distance, row in index.within(latitude, longitude, radius_km, limit)
+    ]
+
+
+def nearest_technicians(latitude, longitude, day=None, limit=10):
+    """
+    Teknikere uten fravær på dagen, sortert på luftlinje fra punktet til
+    nærmeste av dagens oppdrag. Teknikere uten presist plasserte oppdrag den
+    dagen kommer sist, med minst belastning først.
+    """
+    day = day or timezone.localdate()
+    absent = Absence.objects.filter(start_date__lte=day, end_date__gte=day).values('user_id')
+    technicians = {
+        pk: {'id': pk, 'username': username, 'name': f"{first} {last}".strip() or username,
+             'distance_km': None, 'nearest_assignment': None, 'assignments_today': 0}
+        for pk, username, first, last in User.objects.filter(role='tekniker', is_active=True).exclude(
+            pk__in=absent).values_list('pk', 'username', 'first_name', 'last_name')
+    }
+    day_start, day_end = day_bounds(day, day)
+    stops = list(
+        Assignment.objects.filter(assigned_to__in=list(technicians), scheduled_date__gte=day_start,
+                                  scheduled_date__lt=day_end)
+        .exclude(status='cancelled')
+        .values_list('pk', 'assigned_to', 'customer_id', 'customer__latitude', 'customer__longitude',
+                     'customer__geocode_precision', 'customer__geocode_key')
+    )
+    suffix = geocoding.key_suffix()
+    stale = {stop[2] for stop in stops if not stop[6].endswith(suffix)}
+    coordinates = {}
+    if stale:
+        # Kunder som ikke er geokodet ennå, eller er geokodet med en eldre tabell
+        customers = list(Customer.objects.filter(pk__in=stale))
+        geocoding.ensure_coordinates(customers)
+        coordinates = {customer.pk: (customer.latitude, customer.longitude, customer.geocode_precision)
+                       for customer in customers}
+
+    origin = (latitude, longitude)
+    for pk, tech_id, customer_id, stop_lat, stop_lon, precision, _ in stops:
+        if customer_id in coordinates:
+            stop_lat, stop_lon, precision = coordinates[customer_id]
+        entry = technicians[tech_id]
+        entry['assignments_today'] += 1
+        if stop_lat is None or not geocoding.is_precise(precision):
+            continue
+        distance = geocoding.great_circle_km(origin, (stop_lat, stop_lon))
+        if entry['distance_km'] is None or distance < entry['distance_km']:
+            entry['distance_km'], entry['nearest_assignment'] = distance, pk
+    ranked = sorted(technicians.values(), key=lambda entry: (
+        entry['distance_km'] is None, entry['distance_km'] or 0, entry['assignments_today'], entry['id']))
+    for entry in ranked:
+        if entry['distance_km'] is not None:
+            entry['distance_km'] = round(entry['distance_km'], 3)
+    return ranked[:limit]
+
+
+def handle_elevator_saved(pk):
+    # Ikke bygget ennå i denne prosessen: bygges fullt ved første oppslag uansett
+    if index.built_at is not None:
+        index.replace([pk], elevator_rows(Elevator.objects.filter(pk=pk)))
+
+
+def handle_elevator_deleted(pk):
+    if index.built_at is not None:
+        index.replace([pk], [])
+
+
+def handle_customer_saved(pk):
+    """ Ny adresse flytter alle kundens heiser. """
+    if index.built_at is not None:
+        index.replace(list(index.by_customer.get(pk, ())), elevator_rows(Elevator.objects.filter(customer_id=pk)))
+
+
+def invalidate(model):
+    """ Etter masseskriving uten signaler: indeksen bygges på nytt ved neste oppslag. """
+    if model in (Customer, Elevator):
+        index.built_at = None
@@ -0,0 +1,116 @@
+"""
+Måling av SQL-spørringer per forespørsel.
+
+- track_queries(): kontekstbehandler som teller spørringer, SQL-tid og
+  dupliserte spørringsfingeravtrykk (typisk tegn på N+1) på alle tilkoblinger.
+- QueryBudgetMiddleware: legger tallene i responsheadere i debug-modus.
+- QueryBudgetTestMixin: assertQueryBudget() for testene.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('heis_api.queries')
+
+_IN_LIST_RE = re.compile(r'\((?:%s|\?)(?:\s*,\s*(?:%s|\?))+\)')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """ Normaliserer SQL slik at samme spørring med ulike parametre gir samme nøkkel. """
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class QueryStats:
+    """ execute_wrapper som samler antall, tid og fingeravtrykk. """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - started
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def time_ms(self):
+        return self.time * 1000
+
+    @property
+    def duplicates(self):
+        """ Fingeravtrykk som er kjørt mer enn én gang, med antall. """
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    @property
+    def max_repeats(self):
+        return max(self.fingerprints.values(), default=0)
+
+
+@contextmanager
+def track_queries():
+    stats = QueryStats()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        yield stats
+
+
+class QueryBudgetMiddleware:
+    """
+    Rapporterer spørringer per forespørsel i headerne X-Query-Count,
+    X-Query-Time-Ms og X-Query-Duplicates. Aktiv når QUERY_BUDGET_HEADERS
+    er satt (default: DEBUG), ellers fjernes den helt fra middleware-kjeden.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_HEADERS', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.duplicate_warning = getattr(settings, 'QUERY_BUDGET_DUPLICATE_WARNING', 5)
+
+    def __call__(self, request):
+        with track_queries() as stats:
+            response = self.get_response(request)
+        response['X-Query-Count'] = str(stats.count)
+        response['X-Query-Time-Ms'] = f'{stats.time_ms:.1f}'
+        response['X-Query-Duplicates'] = str(sum(count - 1 for count in stats.duplicates.values()))
+        if stats.max_repeats >= self.duplicate_warning:
+            view_name = request.resolver_match.view_name if request.resolver_match else request.path
+            worst_sql, repeats = stats.fingerprints.most_common(1)[0]
+            logger.warning("Mulig N+1 i %s: %d spørringer, samme spørring %d ganger: %s",
+                           view_name, stats.count, repeats, worst_sql)
+        return response
+
+
+class QueryBudgetTestMixin:
+    """ Mixin for TestCase: with self.assertQueryBudget(5): ... """
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_repeats=None):
+        with track_queries() as stats:
+            yield stats
+        details = '\n'.join(f'  {count}x {sql}' for sql, count in stats.fingerprints.most_common(5))
+        self.assertLessEqual(
+            stats.count, max_queries,
+            f"{stats.count} spørringer, budsjett {max_queries}. Hyppigste:\n{details}"
+        )
+        if max_repeats is not None:
+            self.assertLessEqual(
+                stats.max_repeats, max_repeats,
+                f"Samme spørring kjørt {stats.max_repeats} ganger (N+1?). Hyppigste:\n{details}"
+            )
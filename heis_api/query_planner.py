@@ -0,0 +1,227 @@
+"""
+Automatisk select_related/prefetch_related/only() ut fra serializeren.
+
+Planleggeren går gjennom feltene til serializeren som brukes i en
+forespørsel og følger `source=`-stiene, nestede serializere og avhengigheter
+deklarert på SerializerMethodField-metoder med @depends_on. Resultatet er en
+QueryPlan som gir et konstant antall spørringer uansett sidestørrelse:
+
+- enkeltrelasjoner (FK/OneToOne) blir select_related (JOIN),
+- mange-relasjoner (omvendt FK/M2M) blir Prefetch med egen planlagt queryset,
+- kolonnene som faktisk leses blir only() (bare for lesende forespørsler).
+
+Ukjente attributter (metoder/properties på modellen, metodefelt uten
+@depends_on) gjør at alle kolonnene på den modellen hentes, så planen er
+alltid trygg – i verste fall henter den litt mer enn nødvendig.
+"""
+import re
+import threading
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import permissions, serializers
+
+ALL_COLUMNS = '__all__'
+_DISPLAY_RE = re.compile(r'^get_(\w+)_display$')
+
+PLAN_CACHE_SIZE = 512
+_plan_cache = {}
+_plan_cache_lock = threading.Lock()
+
+
+def depends_on(*paths):
+    """
+    Deklarerer hvilke modellstier en get_<felt>-metode leser, f.eks.
+    @depends_on('customer__name'). Brukes av planleggeren for metodefelt.
+    """
+    def decorator(method):
+        method.query_dependencies = paths
+        return method
+    return decorator
+
+
+def _join(*parts):
+    return '__'.join(part for part in parts if part)
+
+
+def _get_model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+class QueryPlan:
+    """ Hva som må hentes for én modell: JOIN-er, prefetch-er og kolonner per sti. """
+
+    def __init__(self, model, annotations=()):
+        self.model = model
+        self.annotations = frozenset(annotations)
+        self.select_related = set()
+        self.prefetches = {} # oppslag -> QueryPlan for relatert modell
+        self.columns = {'': set()} # sti ('' = rotmodellen) -> kolonnenavn eller ALL_COLUMNS
+        self.models = {'': model}
+
+    def add_column(self, prefix, name):
+        if self.columns.setdefault(prefix, set()) != ALL_COLUMNS:
+            self.columns[prefix].add(name)
+
+    def add_all_columns(self, prefix):
+        self.columns[prefix] = ALL_COLUMNS
+
+    def add_select(self, prefix, name, related_model):
+        path = _join(prefix, name)
+        self.select_related.add(path)
+        self.models[path] = related_model
+        self.columns.setdefault(path, set())
+        return path
+
+    def add_prefetch(self, prefix, name, model_field):
+        lookup = _join(prefix, name)
+        if lookup not in self.prefetches:
+            child = QueryPlan(model_field.related_model)
+            if model_field.one_to_many:
+                # Omvendt FK: Django trenger FK-kolonnen for å koble radene til foreldrene
+                child.add_column('', model_field.field.name)
+            self.prefetches[lookup] = child
+        return self.prefetches[lookup]
+
+    def only_fields(self):
+        fields = []
+        for prefix, names in self.columns.items():
+            model = self.models[prefix]
+            if names == ALL_COLUMNS:
+                names = [field.name for field in model._meta.concrete_fields]
+            fields += [_join(prefix, name) for name in sorted(names)]
+        return fields
+
+    def apply(self, queryset, restrict_columns=True):
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        if self.prefetches:
+            queryset = queryset.prefetch_related(*[
+                Prefetch(lookup, queryset=child.apply(child.model._default_manager.all(), restrict_columns))
+                for lookup, child in sorted(self.prefetches.items())
+            ])
+        if restrict_columns and self.columns[''] != ALL_COLUMNS:
+            queryset = queryset.only(*self.only_fields())
+        return queryset
+
+
+def _plan_path(plan, model, prefix, attrs, field=None):
+    """
+    Følger attrs (source-stien til et felt) fra `model` på stien `prefix`.
+    `field` er serializer-feltet stien hører til, eller None for @depends_on-stier.
+    """
+    if not attrs:
+        _plan_field_value(plan, model, prefix, field)
+        return
+    name, rest = attrs[0], attrs[1:]
+    model_field = _get_model_field(model, name)
+
+    if model_field is None:
+        display = _DISPLAY_RE.match(name)
+        display_field = display and _get_model_field(model, display.group(1))
+        if display_field is not None and not display_field.is_relation:
+            plan.add_column(prefix, display_field.name)
+        elif not prefix and name in plan.annotations:
+            pass
+        else:
+            # Metode eller property: vet ikke hva den leser
+            plan.add_all_columns(prefix)
+        return
+
+    if not model_field.is_relation:
+        plan.add_column(prefix, model_field.name)
+        return
+
+    related_model = model_field.related_model
+    if model_field.many_to_many or model_field.one_to_many:
+        child = plan.add_prefetch(prefix, name, model_field)
+        _plan_field_value(child, related_model, '', field, many=True)
+        return
+
+    if model_field.concrete:
+        plan.add_column(prefix, model_field.name)
+        # PrimaryKeyRelatedField leser FK-kolonnen uten JOIN
+        if not rest and _is_pk_only(field):
+            return
+    path = plan.add_select(prefix, name, related_model)
+    if not rest and _is_pk_only(field):
+        plan.add_column(path, related_model._meta.pk.name)
+        return
+    _plan_path(plan, related_model, path, rest, field)
+
+
+def _is_pk_only(field):
+    return isinstance(field, serializers.PrimaryKeyRelatedField) or (
+        isinstance(field, serializers.ManyRelatedField)
+        and isinstance(field.child_relation, serializers.PrimaryKeyRelatedField)
+    )
+
+
+def _plan_field_value(plan, model, prefix, field, many=False):
+    """ Stien er fulgt helt ut; `field` leser hele objektet på `prefix`. """
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    if isinstance(field, serializers.BaseSerializer):
+        _plan_serializer_fields(plan, model, prefix, field)
+    elif many and _is_pk_only(field):
+        plan.add_column(prefix, model._meta.pk.name)
+    else:
+        plan.add_all_columns(prefix)
+
+
+def _plan_serializer_fields(plan, model, prefix, serializer):
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            method = getattr(serializer, field.method_name)
+            dependencies = getattr(method, 'query_dependencies', None)
+            if dependencies is None:
+                plan.add_all_columns(prefix)
+            for dependency in dependencies or ():
+                _plan_path(plan, model, prefix, dependency.split('__'))
+        elif field.source == '*':
+            _plan_field_value(plan, model, prefix, field)
+        else:
+            _plan_path(plan, model, prefix, field.source_attrs, field)
+
+
+def plan_for_serializer(serializer, model, annotations=()):
+    """
+    Bygger (og cacher) planen for en serializer-instans mot model. Nøkkelen tar
+    med feltutvalget (DynamicFieldsMixin.selection_key), så ?fields=/?expand= gir egne planer.
+    """
+    key = (type(serializer), getattr(serializer, 'selection_key', None), model, frozenset(annotations))
+    plan = _plan_cache.get(key)
+    if plan is None:
+        plan = QueryPlan(model, annotations)
+        _plan_serializer_fields(plan, model, '', serializer)
+        with _plan_cache_lock:
+            if len(_plan_cache) >= PLAN_CACHE_SIZE:
+                _plan_cache.pop(next(iter(_plan_cache))) # Eldste ut, feltutvalg kommer fra klienten
+            _plan_cache[key] = plan
+    return plan
+
+
+class QueryPlannerMixin:
+    """
+    Mixin for viewsets: get_queryset() får select_related/prefetch_related/only()
+    utledet fra serializeren til gjeldende action. Egne actions som bygger
+    querysets selv kan bruke self.plan_queryset(queryset, SerializerClass).
+    """
+
+    def get_queryset(self):
+        return self.plan_queryset(super().get_queryset())
+
+    def plan_queryset(self, queryset, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        meta = getattr(serializer_class, 'Meta', None)
+        if getattr(meta, 'model', None) is not queryset.model:
+            return queryset
+        serializer = serializer_class(context=self.get_serializer_context())
+        plan = plan_for_serializer(serializer, queryset.model, queryset.query.annotations)
+        # only() bare ved lesing: lagring av delvis lastede objekter gir ekstra spørringer
+        return plan.apply(queryset, restrict_columns=self.request.method in permissions.SAFE_METHODS)
@@ -0,0 +1,154 @@
+""" Rendering og disk-cache for tilbuds-PDF-er. """
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.template.loader import get_template
+from xhtml2pdf import pisa
+
+from .models import Quote
+from .serializers import QuoteSerializer
+
+TEMPLATE_NAME = 'quote_pdf_template.html'
+LOGO_RELATIVE_PATH = 'images/logo.png'
+CACHE_SUBDIR = 'quote_pdf_cache'
+DEFAULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+
+class QuotePDFError(Exception):
+    pass
+
+
+def quote_pdf_queryset():
+    return Quote.objects.select_related('opportunity__customer').prefetch_related('line_items__elevator_type')
+
+
+@lru_cache(maxsize=1)
+def find_logo_path():
+    """ Finner logoen én gang per prosess (STATICFILES_DIRS, deretter appens static-mappe). """
+    for static_dir in getattr(settings, 'STATICFILES_DIRS', []):
+        potential_path = os.path.join(static_dir, LOGO_RELATIVE_PATH)
+        if os.path.isfile(potential_path):
+            return potential_path
+    potential_path = os.path.join(settings.BASE_DIR, 'heis_api', 'static', LOGO_RELATIVE_PATH)
+    if os.path.isfile(potential_path):
+        return potential_path
+    print(f"Warning: Could not find logo at '{LOGO_RELATIVE_PATH}' in STATICFILES_DIRS or common locations.")
+    return None
+
+
+def template_version():
+    """ Hash av malens innhold og logoen, slik at endringer gir nye cache-nøkler. """
+    template = get_template(TEMPLATE_NAME)
+    origin = template.origin.name
+    logo = find_logo_path()
+    stamp = [origin, os.path.getmtime(origin)]
+    if logo:
+        stamp += [logo, os.path.getmtime(logo)]
+    return _template_version(tuple(stamp))
+
+
+@lru_cache(maxsize=8)
+def _template_version(stamp):
+    digest = hashlib.sha256()
+    with open(stamp[0], 'rb') as template_file:
+        digest.update(template_file.read())
+    digest.update(repr(stamp).encode())
+    return digest.hexdigest()
+
+
+def quote_fingerprint(quote):
+    """ Fingeravtrykk av alt som påvirker PDF-en: tilbud, kunde, linjer og mal. """
+    customer = quote.opportunity.customer
+    parts = [
+        template_version(),
+        quote.pk, quote.quote_number, quote.issue_date, quote.expiry_date, quote.status,
+        quote.customer_notes, quote.total_amount, quote.updated_at,
+        customer.pk, customer.name, customer.contact_person, customer.email, customer.phone,
+        customer.address, customer.zip_code, customer.city, customer.updated_at,
+    ]
+    for line in sorted(quote.line_items.all(), key=lambda item: item.pk):
+        elevator_type = line.elevator_type
+        parts += [
+            line.pk, line.quantity, line.line_total,
+            elevator_type and (elevator_type.pk, elevator_type.name, elevator_type.description, elevator_type.price),
+        ]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def link_callback(uri, rel):
+    # Logoen sendes som absolutt sti; andre URI-er brukes som de er
+    return uri
+
+
+def render_quote_pdf(quote, request=None):
+    """ Kjører xhtml2pdf for ett tilbud og returnerer PDF-bytes. """
+    quote_data = QuoteSerializer(quote, context={'request': request}).data
+    context = {
+        'quote': quote,
+        'line_items': quote_data['line_items'],
+        'total_amount': quote_data['total_amount'],
+        'logo_path': find_logo_path(),
+    }
+    html = get_template(TEMPLATE_NAME).render(context)
+    result = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result, link_callback=link_callback)
+    if pdf.err:
+        raise QuotePDFError(f"Error generating PDF for quote {quote.pk}: {pdf.err}")
+    return result.getvalue()
+
+
+def pdf_filename(quote):
+    return f"Tilbud_{quote.quote_number or quote.id}.pdf"
+
+
+def cache_dir():
+    path = os.path.join(settings.MEDIA_ROOT, CACHE_SUBDIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_cached_quote_pdf(quote, request=None):
+    """
+    Returnerer sti til en cachet PDF for tilbudet, og rendrer bare ved cache-miss.
+    Filnavnet er fingeravtrykket, så endrede tilbud får automatisk ny fil.
+    """
+    path = os.path.join(cache_dir(), f"{quote_fingerprint(quote)}.pdf")
+    if os.path.isfile(path):
+        os.utime(path) # Oppdaterer mtime for LRU-utkasting
+        return path
+    content = render_quote_pdf(quote, request=request)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir(), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp_file:
+        tmp_file.write(content)
+    os.replace(tmp_path, path)
+    evict_cache(keep=path)
+    return path
+
+
+def evict_cache(keep=None):
+    """ Sletter eldste filer (etter mtime) til cachen er under QUOTE_PDF_CACHE_MAX_BYTES. """
+    max_bytes = getattr(settings, 'QUOTE_PDF_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)
+    entries = []
+    total = 0
+    with os.scandir(cache_dir()) as scan:
+        for entry in scan:
+            if not entry.name.endswith('.pdf'):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
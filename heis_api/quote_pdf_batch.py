@@ -0,0 +1,189 @@
+"""
+Bakgrunnsrendering av mange tilbuds-PDF-er.
+
+xhtml2pdf er CPU-bundet, så selve renderingen kjøres i en prosesspool
+(én prosess per kjerne som standard) i stedet for i WSGI-arbeideren.
+En koordinator-tråd fordeler tilbudene, oppdaterer fremdrift på jobben og
+pakker resultatet i en zip under MEDIA_ROOT. Ferdige PDF-er havner også i
+disk-cachen fra quote_pdf, så senere enkeltnedlastinger blir cache-treff.
+
+Cachen er begrenset i størrelse og kan kaste ut jobbens egne PDF-er før
+jobben er ferdig. Hver PDF leses derfor straks den er rendret og skrives
+rett inn i zip-filen, i stedet for å hentes fra cachen til slutt.
+
+Jobben kjøres i webprosessen. Dør prosessen midt i en batch, blir jobben
+stående som 'running'; reclaim_stale_jobs() setter slike jobber tilbake til
+'pending' etter QUOTE_PDF_BATCH_STALE_MINUTES, så run_quote_pdf_jobs kjører dem
+på nytt.
+"""
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Quote, QuotePDFBatchJob
+from .quote_pdf import QuotePDFError, get_cached_quote_pdf, pdf_filename, quote_pdf_queryset, render_quote_pdf
+
+ARCHIVE_SUBDIR = 'quote_pdf_batches'
+
+_executor_lock = threading.Lock()
+_process_pool = None
+_coordinator_pool = None
+
+
+def worker_count():
+    workers = getattr(settings, 'QUOTE_PDF_BATCH_WORKERS', None)
+    if workers is None:
+        return os.cpu_count() or 1
+    return workers
+
+
+def _init_worker(settings_module):
+    # Nye prosesser (spawn) må sette opp Django selv
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def render_quote(quote_id):
+    """ Rendrer (eller finner i cache) ett tilbud. Returnerer (id, PDF-bytes, filnavn, feil). """
+    try:
+        quote = quote_pdf_queryset().get(pk=quote_id)
+        path = get_cached_quote_pdf(quote)
+        try:
+            with open(path, 'rb') as handle:
+                content = handle.read()
+        except FileNotFoundError:
+            # Kastet ut av en samtidig rendering før vi rakk å lese den
+            content = render_quote_pdf(quote)
+        return quote_id, content, pdf_filename(quote), None
+    except Quote.DoesNotExist:
+        return quote_id, None, None, 'Tilbudet finnes ikke.'
+    except QuotePDFError as exc:
+        return quote_id, None, None, str(exc)
+
+
+def _render_in_worker(quote_id):
+    # Kjøres i arbeiderprosessen, som har egne (langlevde) DB-tilkoblinger
+    close_old_connections()
+    return render_quote(quote_id)
+
+
+def _get_pools():
+    global _process_pool, _coordinator_pool
+    with _executor_lock:
+        if _coordinator_pool is None:
+            _coordinator_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='quote-pdf-batch')
+        if _process_pool is None and worker_count() > 0:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=worker_count(),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'heis_backend.settings'),),
+            )
+    return _process_pool, _coordinator_pool
+
+
+def enqueue_batch_job(job):
+    """ Starter jobben i bakgrunnen når transaksjonen som opprettet den er committet. """
+    def submit():
+        _, coordinator_pool = _get_pools()
+        coordinator_pool.submit(_run_in_background, job.pk)
+    transaction.on_commit(submit)
+
+
+def _run_in_background(job_id):
+    close_old_connections()
+    try:
+        run_batch_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def run_batch_job(job_id):
+    """ Rendrer alle tilbudene i jobben og bygger zip-arkivet. """
+    try:
+        claimed = QuotePDFBatchJob.objects.filter(pk=job_id, status='pending').update(
+            status='running', started_at=timezone.now()
+        )
+        if not claimed:
+            return
+        job = QuotePDFBatchJob.objects.get(pk=job_id)
+        process_pool, _ = _get_pools()
+        if process_pool is None:
+            results = (render_quote(quote_id) for quote_id in job.quote_ids)
+        else:
+            futures = [process_pool.submit(_render_in_worker, quote_id) for quote_id in job.quote_ids]
+            results = (future.result() for future in as_completed(futures))
+
+        errors = {}
+        with BatchArchive(job_id) as archive:
+            for quote_id, content, filename, error in results:
+                if error:
+                    errors[str(quote_id)] = error
+                else:
+                    archive.add(filename, content)
+                QuotePDFBatchJob.objects.filter(pk=job_id).update(completed=F('completed') + 1)
+
+        QuotePDFBatchJob.objects.filter(pk=job_id).update(
+            status='completed' if archive.count or not errors else 'failed',
+            errors=errors,
+            archive=archive.relative_name,
+            finished_at=timezone.now(),
+        )
+    except Exception as exc:
+        QuotePDFBatchJob.objects.filter(pk=job_id).update(
+            status='failed', errors={'job': str(exc)}, finished_at=timezone.now()
+        )
+        raise
+
+
+def reclaim_stale_jobs(stale_minutes=None):
+    """
+    Setter jobber som har stått som 'running' lenger enn stale_minutes tilbake
+    til 'pending' (med nullstilt fremdrift). Returnerer antallet.
+    """
+    if stale_minutes is None:
+        stale_minutes = settings.QUOTE_PDF_BATCH_STALE_MINUTES
+    cutoff = timezone.now() - timedelta(minutes=stale_minutes)
+    return QuotePDFBatchJob.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='pending', completed=0, errors={}, started_at=None
+    )
+
+
+class BatchArchive:
+    """ Zip-arkivet MEDIA_ROOT/quote_pdf_batches/quote_pdfs_<job_id>.zip, fylt én PDF om gangen. """
+
+    def __init__(self, job_id):
+        directory = os.path.join(settings.MEDIA_ROOT, ARCHIVE_SUBDIR)
+        os.makedirs(directory, exist_ok=True)
+        self.relative_name = f'{ARCHIVE_SUBDIR}/quote_pdfs_{job_id}.zip'
+        self.used_names = set()
+        self.count = 0
+        self.zip_file = None
+
+    def __enter__(self):
+        # PDF er allerede komprimert, så ZIP_STORED sparer CPU uten å koste plass
+        self.zip_file = zipfile.ZipFile(os.path.join(settings.MEDIA_ROOT, self.relative_name), 'w',
+                                        zipfile.ZIP_STORED)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.zip_file.close()
+
+    def add(self, filename, content):
+        name = filename
+        counter = 1
+        while name in self.used_names:
+            counter += 1
+            name = filename.replace('.pdf', f'_{counter}.pdf')
+        self.used_names.add(name)
+        self.zip_file.writestr(name, content)
+        self.count += 1
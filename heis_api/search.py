@@ -0,0 +1,235 @@
+"""
+Fulltekstsøk for ?search= basert på indekserte søkedokumenter.
+
+DRF sin SearchFilter lager OR-ede `LIKE '%ord%'` over flere JOIN-er, som
+alltid blir full skann. FullTextSearchFilter bruker i stedet viewsetets
+search_fields til å bygge ett denormalisert SearchDocument per objekt, og
+søker i en fulltekstindeks:
+
+- SQLite: FTS5-tabell over norsk-stemmet tekst (stemmer.py), rangert med bm25.
+- PostgreSQL: tsvector med 'norwegian'-konfigurasjonen og GIN-indeks, rangert med ts_rank.
+- Andre databaser: faller tilbake til vanlig SearchFilter.
+
+Dokumentene holdes i synk av signalene (lagring av objektet selv eller av
+relaterte objekter som inngår i search_fields, f.eks. customer__name). Bare
+de indekserte modellene og relasjonene deres har mottakere, og dokumentene
+til relaterte objekter bygges først etter commit, utenfor transaksjonen.
+Masseoperasjoner uten signaler (bulk_create/update) må kalle reindex() eller
+kjøre `manage.py rebuild_search_index`.
+"""
+import threading
+
+from django.db import connection, transaction
+from rest_framework import filters
+
+from .models import SearchDocument
+from .stemmer import stem, stem_text, tokenize
+
+REINDEX_CHUNK_SIZE = 1000
+MAX_QUERY_TERMS = 10
+LOOKUP_PREFIXES = '^=@$'
+
+
+class SearchIndex:
+    """ Hvilke felt som inngår i dokumentet for én modell, og hvilke relasjoner som påvirker det. """
+
+    def __init__(self, model, search_fields):
+        self.model = model
+        self.label = model._meta.label_lower
+        self.paths = [field.lstrip(LOOKUP_PREFIXES) for field in search_fields]
+        # relatert modell -> oppslag fra self.model (customer__name gir Customer -> 'customer')
+        self.dependencies = {}
+        for path in self.paths:
+            parts = path.split('__')
+            current = model
+            for depth, part in enumerate(parts[:-1], start=1):
+                current = current._meta.get_field(part).related_model
+                self.dependencies.setdefault(current, set()).add('__'.join(parts[:depth]))
+
+    def build_documents(self, pks):
+        rows = {}
+        for row in self.model._default_manager.filter(pk__in=pks).values_list('pk', *self.paths):
+            rows.setdefault(row[0], []).extend(value for value in row[1:] if value not in (None, ''))
+        documents = []
+        for pk, values in rows.items():
+            # Mange-relasjoner gir flere rader per objekt; fjerner duplikater, beholder rekkefølgen
+            content = ' '.join(str(value) for value in dict.fromkeys(values))
+            documents.append(SearchDocument(model=self.label, object_id=pk, content=content,
+                                            stemmed=stem_text(content)))
+        return documents
+
+
+class SearchRegistry:
+    """ Indeksene bygges fra routerens viewsets første gang de trengs. """
+
+    def __init__(self):
+        self._indexes = None
+        self._lock = threading.Lock()
+
+    def _discover(self):
+        from .urls import router
+        indexes = {}
+        for _, viewset, _ in router.registry:
+            queryset = getattr(viewset, 'queryset', None)
+            search_fields = getattr(viewset, 'search_fields', None)
+            if queryset is None or not search_fields:
+                continue
+            if FullTextSearchFilter in getattr(viewset, 'filter_backends', ()):
+                indexes[queryset.model] = SearchIndex(queryset.model, search_fields)
+        return indexes
+
+    @property
+    def indexes(self):
+        if self._indexes is None:
+            with self._lock:
+                if self._indexes is None:
+                    self._indexes = self._discover()
+        return self._indexes
+
+    def get(self, model):
+        return self.indexes.get(model)
+
+    def signal_models(self):
+        """ Modellene der lagring kan endre et dokument: de indekserte og relasjonene i search_fields. """
+        models = set(self.indexes)
+        for index in self.indexes.values():
+            models.update(index.dependencies)
+        return models
+
+    def dependents(self, model):
+        """ (indeks, oppslag) for indekser som inneholder felt fra `model` via en relasjon. """
+        for index in self.indexes.values():
+            for lookup in index.dependencies.get(model, ()):
+                yield index, lookup
+
+
+registry = SearchRegistry()
+
+
+def reindex(model, pks=None):
+    """ Bygger dokumentene for `pks` (alle hvis None) på nytt, set-basert i bolker. """
+    index = registry.get(model)
+    if index is None:
+        return 0
+    if pks is None:
+        pks = model._default_manager.values_list('pk', flat=True).order_by('pk').iterator(chunk_size=REINDEX_CHUNK_SIZE)
+    total = 0
+    chunk = []
+    for pk in pks:
+        chunk.append(pk)
+        if len(chunk) >= REINDEX_CHUNK_SIZE:
+            total += _write_documents(index, chunk)
+            chunk = []
+    if chunk:
+        total += _write_documents(index, chunk)
+    return total
+
+
+def _write_documents(index, pks):
+    documents = index.build_documents(pks)
+    SearchDocument.objects.bulk_create(
+        documents, update_conflicts=True, unique_fields=['model', 'object_id'],
+        update_fields=['content', 'stemmed', 'updated_at'],
+    )
+    # Objekter som ikke finnes lenger
+    found = {document.object_id for document in documents}
+    missing = [pk for pk in pks if pk not in found]
+    if missing:
+        SearchDocument.objects.filter(model=index.label, object_id__in=missing).delete()
+    return len(documents)
+
+
+def reindex_dependents(model, pks):
+    """ reindex() for objekter i andre indekser som viser felt fra `pks` (customer__name). """
+    for index, lookup in registry.dependents(model):
+        dependents = index.model._default_manager.filter(**{f'{lookup}__in': pks}).values_list('pk', flat=True)
+        reindex(index.model, dependents.iterator(chunk_size=REINDEX_CHUNK_SIZE))
+
+
+def reindex_with_dependents(model, pks):
+    """ reindex() for `pks` og for objekter i andre indekser som viser felt fra dem. """
+    pks = list(pks)
+    reindex(model, pks)
+    reindex_dependents(model, pks)
+
+
+def handle_saved(instance):
+    model, pk = type(instance), instance.pk
+    reindex(model, [pk])
+    if any(registry.dependents(model)):
+        # Kan treffe mange rader (alle heiser og oppdrag for en kunde); holdes utenfor lagringens transaksjon
+        transaction.on_commit(lambda: reindex_dependents(model, [pk]))
+
+
+def handle_deleted(instance):
+    index = registry.get(type(instance))
+    if index is not None:
+        SearchDocument.objects.filter(model=index.label, object_id=instance.pk).delete()
+
+
+class SQLiteBackend:
+    table = 'heis_api_searchdocument_fts'
+
+    def search(self, queryset, label, terms):
+        # Prefikssøk på stemmede ord, alle ord må finnes (implisitt AND)
+        match = ' '.join(f'"{stem(term)}"*' for term in terms)
+        table = queryset.model._meta.db_table
+        pk = queryset.model._meta.pk.column
+        return queryset.extra(
+            tables=['heis_api_searchdocument', self.table],
+            where=[
+                'heis_api_searchdocument.model = %s',
+                f'heis_api_searchdocument.object_id = "{table}"."{pk}"',
+                f'{self.table}.rowid = heis_api_searchdocument.id',
+                f'{self.table} MATCH %s',
+            ],
+            params=[label, match],
+            # bm25 er lavere for bedre treff; snur fortegnet så høyere rank = bedre i begge backends
+            select={'search_rank': f'-bm25({self.table})'},
+        )
+
+
+class PostgresBackend:
+    def search(self, queryset, label, terms):
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        table = queryset.model._meta.db_table
+        pk = queryset.model._meta.pk.column
+        return queryset.extra(
+            tables=['heis_api_searchdocument'],
+            where=[
+                'heis_api_searchdocument.model = %s',
+                f'heis_api_searchdocument.object_id = "{table}"."{pk}"',
+                "heis_api_searchdocument.search_vector @@ to_tsquery('norwegian', %s)",
+            ],
+            params=[label, tsquery],
+            select={'search_rank': "ts_rank(heis_api_searchdocument.search_vector, to_tsquery('norwegian', %s))"},
+            select_params=[tsquery],
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend(),
+    'postgresql': PostgresBackend(),
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Drop-in for SearchFilter: samme ?search= og search_fields, men slår opp i
+    fulltekstindeksen og sorterer etter relevans (search_rank) når ingen annen
+    sortering er valgt.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        backend = get_backend()
+        index = registry.get(queryset.model)
+        if backend is None or index is None or not getattr(view, 'search_fields', None):
+            return super().filter_queryset(request, queryset, view)
+        terms = tokenize(request.query_params.get(self.search_param, ''))[:MAX_QUERY_TERMS]
+        if not terms:
+            return queryset
+        return backend.search(queryset, index.label, terms).order_by('-search_rank', '-pk')
@@ -1,12 +1,139 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import User, Customer, ElevatorType, Elevator, Assignment, AssignmentNote, Part, AssignmentPart, AssignmentChecklist, Report, Service, SalesOpportunity, QuoteLineItem, Quote, OrderLineItem, Order, Absence
+from .models import User, Customer, ElevatorType, Elevator, Assignment, AssignmentNote, Part, AssignmentPart, AssignmentChecklist, Report, Service, SalesOpportunity, QuoteLineItem, Quote, QuotePDFBatchJob, OrderLineItem, Order, Absence
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
 from django.db.models import OuterRef, Subquery, F, CharField, Value
 from django.db.models.functions import Coalesce
+from .query_planner import depends_on
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _split_param(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    return [item.strip() for item in value if item and item.strip()]
+
+
+class DynamicFieldsMixin:
+    """
+    Sparsomme feltsett og valgfri utvidelse av relasjoner.
+
+    - fields: bare disse feltene, punktum for nestede felt (`id,title,customer.name`)
+    - expand: bytter ID-felt (eller legger til felt) med serializer fra expandable_fields
+
+    Begge kan gis som kwargs eller som ?fields=/?expand= på GET-forespørsler
+    (query-parametrene gjelder bare toppnivå-serializeren). QueryPlannerMixin
+    planlegger etter feltene som står igjen, så SQL-kolonner og JOIN-er snevres inn.
+    """
+    # navn -> (serializer-klasse, kwargs). read_only settes automatisk.
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._requested_fields = _split_param(fields)
+        self._requested_expand = _split_param(expand)
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_selection(self):
+        """ (felt eller None, utvidelser) for denne serializeren, kwargs først, så query. """
+        fields, expand = self._requested_fields, self._requested_expand
+        request = self.context.get('request')
+        # Bare DRF-forespørsler (QuotePDFView sender en vanlig HttpRequest)
+        params = getattr(request, 'query_params', None)
+        if params is not None and request.method in SAFE_METHODS and self._is_root():
+            if fields is None:
+                fields = _split_param(params.get('fields'))
+            if expand is None:
+                expand = _split_param(params.get('expand'))
+        return fields, expand or []
+
+    @property
+    def selection_key(self):
+        fields, expand = self.get_selection()
+        return (tuple(sorted(fields)) if fields is not None else None, tuple(sorted(expand)))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expand = self.get_selection()
+        nested_fields, nested_expand = {}, {}
+        for path in requested or ():
+            name, _, rest = path.partition('.')
+            if rest:
+                nested_fields.setdefault(name, []).append(rest)
+        for path in expand:
+            name, _, rest = path.partition('.')
+            nested_expand.setdefault(name, [])
+            if rest:
+                nested_expand[name].append(rest)
+        # `customer.name` i fields betyr at customer må utvides
+        for name in nested_fields:
+            if name in self.expandable_fields:
+                nested_expand.setdefault(name, [])
+
+        for name in nested_expand:
+            if isinstance(fields.get(name), serializers.BaseSerializer):
+                continue # Allerede nestet (detaljserializere)
+            if name not in self.expandable_fields:
+                raise serializers.ValidationError({'expand': f"Kan ikke utvide: {name}."})
+            serializer_class, field_kwargs = self.expandable_fields[name]
+            fields[name] = serializer_class(**{'read_only': True, **field_kwargs})
+
+        if requested is not None:
+            wanted = {path.partition('.')[0] for path in requested}
+            unknown = wanted - set(fields)
+            if unknown:
+                raise serializers.ValidationError({'fields': f"Ukjente felt: {', '.join(sorted(unknown))}."})
+            fields = {name: field for name, field in fields.items() if name in wanted}
+
+        # Sender resten av stien videre til nestede serializere
+        for name, field in fields.items():
+            child = field.child if isinstance(field, serializers.ListSerializer) else field
+            if not isinstance(child, DynamicFieldsMixin):
+                continue
+            if nested_fields.get(name):
+                child._requested_fields = nested_fields[name]
+            if nested_expand.get(name):
+                child._requested_expand = nested_expand[name]
+        return fields
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField som kan få objektene ferdig hentet (prefetched = {pk: objekt}),
+    slik at validering av mange elementer ikke gjør ett oppslag per ID. Se bulk.py.
+    """
+    prefetched = None
+
+    def to_internal_value(self, data):
+        if self.prefetched is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = self.prefetched.get(pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
+class DynamicFieldsModelSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+
+class UserSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = User
         fields = [
@@ -42,14 +169,17 @@ class UserSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class ElevatorTypeSerializer(serializers.ModelSerializer):
+class ElevatorTypeSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = ElevatorType
         fields = ('id', 'name', 'description', 'price')
 
-class ElevatorSerializer(serializers.ModelSerializer):
+class ElevatorSerializer(DynamicFieldsModelSerializer):
     customer_name = serializers.SerializerMethodField()
     elevator_type_name = serializers.SerializerMethodField()
+    expandable_fields = {
+        'elevator_type': (ElevatorTypeSerializer, {}),
+    }
     
     class Meta:
         model = Elevator
@@ -60,32 +190,42 @@ class ElevatorSerializer(serializers.ModelSerializer):
             'service_manual', 'certification'  # Legger til de nye felten
         ]
     
+    @depends_on('customer__name')
     def get_customer_name(self, obj):
         return obj.customer.name if obj.customer else None
     
+    @depends_on('elevator_type__name')
     def get_elevator_type_name(self, obj):
         return obj.elevator_type.name if obj.elevator_type else None
 
-class ElevatorDetailSerializer(serializers.ModelSerializer):
+class ElevatorDetailSerializer(DynamicFieldsModelSerializer):
     elevator_type = ElevatorTypeSerializer(read_only=True)
     
     class Meta:
         model = Elevator
         fields = '__all__'
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(DynamicFieldsModelSerializer):
     contact_person_name = serializers.SerializerMethodField()
+    expandable_fields = {
+        'contact_person_user': (UserSerializer, {}),
+        'elevators': (ElevatorSerializer, {'many': True}),
+    }
     
     class Meta:
         model = Customer
-        fields = ['id', 'name', 'contact_person', 'contact_person_user', 'contact_person_name', 'email', 'phone', 'address', 'zip_code', 'city', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'contact_person', 'contact_person_user', 'contact_person_name', 'email', 'phone', 'address', 'zip_code', 'city', 'latitude', 'longitude', 'geocode_precision', 'created_at', 'updated_at']
+        # Settes av Customer.save() fra postnummeret
+        read_only_fields = ['latitude', 'longitude', 'geocode_precision']
     
+    @depends_on('contact_person', 'contact_person_user__first_name', 'contact_person_user__last_name',
+                'contact_person_user__username')
     def get_contact_person_name(self, obj):
         if obj.contact_person_user:
             return f"{obj.contact_person_user.first_name} {obj.contact_person_user.last_name}" if obj.contact_person_user.first_name else obj.contact_person_user.username
         return obj.contact_person or ""
 
-class CustomerDetailSerializer(serializers.ModelSerializer):
+class CustomerDetailSerializer(DynamicFieldsModelSerializer):
     elevators = ElevatorSerializer(many=True, read_only=True)
     contact_person_user = UserSerializer(read_only=True)
     
@@ -93,23 +233,27 @@ class CustomerDetailSerializer(serializers.ModelSerializer):
         model = Customer
         fields = '__all__'
 
-class PartSerializer(serializers.ModelSerializer):
+class PartSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Part
         fields = ['id', 'name', 'description', 'price']
 
-class AssignmentNoteSerializer(serializers.ModelSerializer):
+class AssignmentNoteSerializer(DynamicFieldsModelSerializer):
     user_name = serializers.SerializerMethodField()
+    expandable_fields = {
+        'user': (UserSerializer, {}),
+    }
 
     class Meta:
         model = AssignmentNote
         fields = ['id', 'assignment', 'user', 'user_name', 'content', 'created_at']
         read_only_fields = ['user', 'created_at']
 
+    @depends_on('user__first_name', 'user__last_name', 'user__username')
     def get_user_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}".strip() or obj.user.username
 
-class AssignmentPartSerializer(serializers.ModelSerializer):
+class AssignmentPartSerializer(DynamicFieldsModelSerializer):
     part_name = serializers.CharField(source='part.name', read_only=True)
     part_price = serializers.DecimalField(source='part.price', max_digits=10, decimal_places=2, read_only=True)
 
@@ -117,7 +261,7 @@ class AssignmentPartSerializer(serializers.ModelSerializer):
         model = AssignmentPart
         fields = ['id', 'assignment', 'part', 'part_name', 'part_price', 'quantity']
 
-class AssignmentSerializer(serializers.ModelSerializer):
+class AssignmentSerializer(DynamicFieldsModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
     elevator_serial = serializers.CharField(source='elevator.serial_number', read_only=True, allow_null=True)
     assigned_to_name = serializers.CharField(source='assigned_to.get_full_name', read_only=True, allow_null=True)
@@ -125,12 +269,19 @@ class AssignmentSerializer(serializers.ModelSerializer):
     type_display = serializers.CharField(source='get_assignment_type_display', read_only=True)
     # Inkluderer relatert ordre-ID
     order_id = serializers.IntegerField(source='order.id', read_only=True, allow_null=True)
+    expandable_fields = {
+        'customer': (CustomerSerializer, {}),
+        'elevator': (ElevatorSerializer, {}),
+        'assigned_to': (UserSerializer, {}),
+        'notes': (AssignmentNoteSerializer, {'many': True}),
+        'parts_used': (AssignmentPartSerializer, {'many': True}),
+    }
     
     class Meta:
         model = Assignment
         fields = (
             'id', 'title', 'customer', 'customer_name', 'elevator', 'elevator_serial',
-            'assigned_to', 'assigned_to_name', 'status', 'status_display', 
+            'assigned_to', 'assigned_to_name', 'status', 'status_display', 'priority',
             'scheduled_date', 'created_at', 'assignment_type', 'type_display',
             'order', 'order_id',
             # Legger til manglende felt for listevisning
@@ -153,7 +304,14 @@ class AssignmentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Ugyldig oppdragstype.")
         return value
 
-class AssignmentChecklistSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        # Settes også når skjemaet setter status direkte, ikke bare via /complete/ (brukes av inspections.py)
+        if attrs.get('status') == 'completed' and (self.instance is None or self.instance.status != 'completed'):
+            attrs['completed_at'] = timezone.now()
+        return attrs
+
+class AssignmentChecklistSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = AssignmentChecklist
         # Inkluderer alle felt som frontend trenger å lese/skrive
@@ -172,7 +330,7 @@ class AssignmentChecklistSerializer(serializers.ModelSerializer):
     #     # ... annen validering ...
     #     return value
 
-class ReportSerializer(serializers.ModelSerializer):
+class ReportSerializer(DynamicFieldsModelSerializer):
     # Henter brukernavn for read-only visning
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
     
@@ -205,12 +363,12 @@ class AssignmentDetailSerializer(AssignmentSerializer):
         )
         read_only_fields = AssignmentSerializer.Meta.read_only_fields + ('updated_at', 'completed_at', 'notes', 'parts_used')
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Service
         fields = '__all__'
 
-class SalesOpportunitySerializer(serializers.ModelSerializer):
+class SalesOpportunitySerializer(DynamicFieldsModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
 
@@ -223,30 +381,20 @@ class SalesOpportunitySerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('created_at', 'updated_at', 'customer_name', 'status_display')
 
-class QuoteLineItemSerializer(serializers.ModelSerializer):
+class QuoteLineItemSerializer(DynamicFieldsModelSerializer):
     # Viser detaljer om heistypen ved lesing
     elevator_type_details = ElevatorTypeSerializer(source='elevator_type', read_only=True)
-    # Beregner linjetotal dynamisk
-    line_total = serializers.SerializerMethodField()
 
     class Meta:
         model = QuoteLineItem
         # Tar nå imot elevator_type ID, ikke description/unit_price
         fields = ('id', 'quote', 'elevator_type', 'elevator_type_details', 'quantity', 'line_total')
-        # read_only_fields fjernes da vi ikke har unit_price/line_total direkte i modellen
-
-    def get_line_total(self, obj):
-        # Beregner total: antall * pris fra heistype
-        if obj.elevator_type and obj.elevator_type.price is not None:
-            return obj.quantity * obj.elevator_type.price
-        return 0 # Eller annen håndtering hvis pris mangler
+        read_only_fields = ('line_total',) # Lagres av modellen (antall * pris fra heistype)
 
-class QuoteSerializer(serializers.ModelSerializer):
+class QuoteSerializer(DynamicFieldsModelSerializer):
     line_items = QuoteLineItemSerializer(many=True, read_only=True) 
     opportunity_details = SalesOpportunitySerializer(source='opportunity', read_only=True) 
     status_display = serializers.CharField(source='get_status_display', read_only=True)
-    # Beregner totalsum dynamisk
-    total_amount = serializers.SerializerMethodField()
 
     class Meta:
         model = Quote
@@ -262,28 +410,39 @@ class QuoteSerializer(serializers.ModelSerializer):
             'status_display',
             'line_items', 
             'opportunity_details',
-            'total_amount', 
+            'total_amount', # Vedlikeholdes av QuoteLineItem.save og signaler
             'order', # Ordre-ID er også read-only her
             'created_at', 
             'updated_at'
         )
 
-    def get_total_amount(self, obj):
-        # Gjenbruker line_total beregningen fra QuoteLineItemSerializer
-        total = 0
-        # Må hente line_items direkte fra databasen her, da read_only=True 
-        # betyr at de ikke er tilgjengelig i validated_data under create/update.
-        # For GET-requests vil obj.line_items.all() fungere hvis prefetch_related brukes i viewet.
-        # For enkelhets skyld her, antar vi at vi henter data (GET)
-        for item in obj.line_items.all(): 
-             if item.elevator_type and item.elevator_type.price is not None:
-                 total += item.quantity * item.elevator_type.price
-        return total
-
-    # Fjerner TODO om å oppdatere total_amount i modellen
-    # Nå skjer beregningen i serializeren.
-
-class OrderLineItemSerializer(serializers.ModelSerializer):
+class QuotePDFBatchJobSerializer(DynamicFieldsModelSerializer):
+    """ Status for en bakgrunnsjobb som rendrer mange tilbuds-PDF-er. """
+    quote_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=5000)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = QuotePDFBatchJob
+        fields = (
+            'id', 'quote_ids', 'status', 'status_display', 'total', 'completed', 'errors',
+            'download_url', 'created_at', 'started_at', 'finished_at'
+        )
+        read_only_fields = ('status', 'total', 'completed', 'errors', 'created_at', 'started_at', 'finished_at')
+
+    def validate_quote_ids(self, value):
+        # Fjerner duplikater, men beholder rekkefølgen
+        return list(dict.fromkeys(value))
+
+    @depends_on('status', 'archive')
+    def get_download_url(self, obj):
+        if obj.status != 'completed' or not obj.archive:
+            return None
+        url = f'/api/quotes/pdf-batch/{obj.id}/download/'
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+class OrderLineItemSerializer(DynamicFieldsModelSerializer):
     # Viser detaljer om heistypen ved lesing
     elevator_type_details = ElevatorTypeSerializer(source='elevator_type', read_only=True)
     
@@ -295,7 +454,7 @@ class OrderLineItemSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('line_total',) # Beregnes i modellen nå
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsModelSerializer):
     line_items = OrderLineItemSerializer(many=True, read_only=True)
     # Henter kundenavn direkte for enklere visning
     customer_name = serializers.CharField(source='customer.name', read_only=True)
@@ -321,14 +480,15 @@ class OrderSerializer(serializers.ModelSerializer):
             'line_items', 
             'quote_number', 
             'assignment_ids', # Assignments er read-only her
+            'total_amount', # Summen av ordrelinjene, vedlikeholdes av modellen
             'created_at', 
             'updated_at'
         )
-        # Merk: total_amount og customer bør settes ved opprettelse,
+        # Merk: customer bør settes ved opprettelse,
         # ikke direkte redigeres etterpå (hentes fra tilbud).
 
 # Serializer for Fravær
-class AbsenceSerializer(serializers.ModelSerializer):
+class AbsenceSerializer(DynamicFieldsModelSerializer):
     user_details = UserSerializer(source='user', read_only=True) # Viser brukerinfo
     absence_type_display = serializers.CharField(source='get_absence_type_display', read_only=True)
 
@@ -340,8 +500,23 @@ class AbsenceSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('user_details', 'absence_type_display', 'created_at')
 
+    def validate(self, attrs):
+        # Samme kontroll som Absence.save(), men som 400 med feltfeil
+        instance = self.instance
+        candidate = Absence(
+            pk=instance.pk if instance else None,
+            user_id=attrs['user'].pk if 'user' in attrs else instance.user_id,
+            start_date=attrs.get('start_date', instance and instance.start_date),
+            end_date=attrs.get('end_date', instance and instance.end_date),
+        )
+        try:
+            candidate.clean()
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(serializers.as_serializer_error(exc))
+        return attrs
+
 # Serializer for prosjektsammendrag
-class ProjectSummarySerializer(serializers.ModelSerializer):
+class ProjectSummarySerializer(DynamicFieldsModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     # Henter annoterte felt fra queryset
@@ -350,12 +525,14 @@ class ProjectSummarySerializer(serializers.ModelSerializer):
     order_status = serializers.CharField(read_only=True)
     order_status_display = serializers.CharField(read_only=True)
     order_id = serializers.IntegerField(read_only=True)
+    last_quote_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    order_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True, allow_null=True)
 
     class Meta:
         model = SalesOpportunity
         fields = (
             'id', 'name', 'customer', 'customer_name', 'status', 'status_display',
             'estimated_value', 'created_at',
-            'last_quote_status', 'last_quote_status_display', # Nye felt
-            'order_id', 'order_status', 'order_status_display' # Nye felt
+            'last_quote_status', 'last_quote_status_display', 'last_quote_total', # Nye felt
+            'order_id', 'order_status', 'order_status_display', 'order_total' # Nye felt
         )
\ No newline at end of file
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import proximity, search, typeahead
+from .models import Customer, Elevator, ElevatorType, Quote, QuoteLineItem, OrderLineItem, mark_order_total_dirty
+
+
+@receiver(post_delete, sender=QuoteLineItem)
+def quote_line_deleted(sender, instance, **kwargs):
+    # Dekker også kaskadesletting og queryset.delete()
+    Quote.recalculate_totals([instance.quote_id])
+
+
+@receiver(pre_delete, sender=ElevatorType)
+def elevator_type_deleted(sender, instance, **kwargs):
+    # Linjene får elevator_type=NULL (SET_NULL uten save), så nullstill prisen her
+    instance.price = None
+    QuoteLineItem.reprice_for_elevator_type(instance)
+
+
+@receiver(post_delete, sender=OrderLineItem)
+def order_line_deleted(sender, instance, **kwargs):
+    mark_order_total_dirty(instance.order_id)
+
+
+def search_document_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.handle_saved(instance)
+
+
+def search_document_deleted(sender, instance, **kwargs):
+    search.handle_deleted(instance)
+
+
+# Indekserte modeller og modellene deres search_fields leser fra (customer__name gir Customer)
+for model in search.registry.signal_models():
+    post_save.connect(search_document_saved, sender=model)
+for model in search.registry.indexes:
+    post_delete.connect(search_document_deleted, sender=model)
+
+
+def typeahead_saved(sender, instance, raw=False, **kwargs):
+    # Minneindeksen kan ikke rulles tilbake, så den oppdateres først etter commit
+    if not raw:
+        transaction.on_commit(lambda: typeahead.handle_saved(instance))
+
+
+def typeahead_deleted(sender, instance, **kwargs):
+    pk = instance.pk # Nullstilles av delete() før commit
+    transaction.on_commit(lambda: typeahead.handle_deleted(sender, pk))
+
+
+for model in typeahead.SOURCES_BY_MODEL:
+    post_save.connect(typeahead_saved, sender=model)
+    post_delete.connect(typeahead_deleted, sender=model)
+
+
+@receiver(post_save, sender=Elevator)
+def proximity_elevator_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        pk = instance.pk
+        transaction.on_commit(lambda: proximity.handle_elevator_saved(pk))
+
+
+@receiver(post_delete, sender=Elevator)
+def proximity_elevator_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: proximity.handle_elevator_deleted(pk))
+
+
+@receiver(post_save, sender=Customer)
+def proximity_customer_saved(sender, instance, raw=False, **kwargs):
+    # Kundens sletting kaskaderer til heisene, som fjernes via post_delete over
+    if not raw:
+        pk = instance.pk
+        transaction.on_commit(lambda: proximity.handle_customer_saved(pk))
@@ -0,0 +1,69 @@
+"""
+Norsk (bokmål) stemming etter Snowball-algoritmen for norsk.
+
+Brukes av søkeindeksen på SQLite, der FTS5 bare har engelsk stemming.
+PostgreSQL bruker sin innebygde 'norwegian'-konfigurasjon i stedet.
+"""
+import re
+
+VOWELS = 'aeiouyæåø'
+S_ENDING = 'bcdfghjlmnoprtvyz'
+
+# Steg 1: (suffiks, handling). Lengste treff i R1 avgjør handlingen.
+STEP1_SUFFIXES = sorted(
+    [(suffix, 'delete') for suffix in (
+        'a', 'e', 'ede', 'ande', 'ende', 'ane', 'ene', 'hetene', 'en', 'heten', 'ar', 'er', 'heter', 'as', 'es',
+        'edes', 'endes', 'enes', 'hetenes', 'ens', 'hetens', 'ers', 'ets', 'et', 'het', 'ast',
+    )] + [('s', 's-ending'), ('erte', 'er'), ('ert', 'er')],
+    key=lambda item: len(item[0]), reverse=True,
+)
+STEP3_SUFFIXES = sorted(['leg', 'eleg', 'ig', 'eig', 'lig', 'elig', 'els', 'lov', 'elov', 'slov', 'hetslov'],
+                        key=len, reverse=True)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _r1(word):
+    """ R1 starter etter første konsonant som følger en vokal, men tidligst i posisjon 3. """
+    for index in range(1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return max(index + 1, 3)
+    return len(word)
+
+
+def stem(word):
+    word = word.lower()
+    if len(word) < 3 or not word.isalpha():
+        return word
+    r1 = _r1(word)
+
+    # Steg 1
+    for suffix, action in STEP1_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= r1:
+            if action == 'delete':
+                word = word[:-len(suffix)]
+            elif action == 'er':
+                word = word[:-len(suffix)] + 'er'
+            elif len(word) >= 2 and (word[-2] in S_ENDING
+                                     or (word[-2] == 'k' and len(word) >= 3 and word[-3] not in VOWELS)):
+                word = word[:-1]
+            break
+
+    # Steg 2: dt/vt i R1 -> fjern t
+    if (word.endswith('dt') or word.endswith('vt')) and len(word) - 2 >= r1:
+        word = word[:-1]
+
+    # Steg 3
+    for suffix in STEP3_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= r1:
+            word = word[:-len(suffix)]
+            break
+    return word
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+def stem_text(text):
+    return ' '.join(stem(token) for token in tokenize(text))
@@ -0,0 +1,74 @@
+"""
+Strømming av store lister uten å holde hele resultatet i minnet.
+
+Radene hentes med QuerySet.iterator(chunk_size) (prefetch kjøres per bolk),
+serialiseres bolkvis og skrives ut fortløpende som én JSON-liste.
+"""
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .pagination import KeysetPagination, ordering_expressions, parse_ordering
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+DEFAULT_CHUNK_SIZE = 500
+
+
+def iter_chunks(queryset, chunk_size):
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_json_array(queryset, serializer_class, context, chunk_size=DEFAULT_CHUNK_SIZE):
+    encoder = JSONEncoder(ensure_ascii=False)
+    yield '['
+    first = True
+    for chunk in iter_chunks(queryset, chunk_size):
+        for item in serializer_class(chunk, many=True, context=context).data:
+            yield ('' if first else ',') + encoder.encode(item)
+            first = False
+    yield ']'
+
+
+def streaming_json_response(queryset, serializer_class, context, chunk_size=DEFAULT_CHUNK_SIZE):
+    return StreamingHttpResponse(
+        (part.encode('utf-8') for part in iter_json_array(queryset, serializer_class, context, chunk_size)),
+        content_type='application/json',
+    )
+
+
+class ListActionMixin:
+    """
+    list_response() for egne list-actions: samme filtre, paginering og
+    serializer-kontekst som list(). Med ?stream=true strømmes hele resultatet
+    som en JSON-liste i bolker i stedet for å pagineres.
+    """
+    stream_query_param = 'stream'
+    stream_chunk_size = DEFAULT_CHUNK_SIZE
+    keyset_ordering = None # Settes per action med @action(keyset_ordering=...)
+
+    def wants_stream(self):
+        return self.request.query_params.get(self.stream_query_param, '').lower() in TRUE_VALUES
+
+    def list_response(self, queryset, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        context = self.get_serializer_context()
+        queryset = self.filter_queryset(queryset)
+
+        if self.wants_stream():
+            serializer_class(context=context).fields # Ugyldige ?fields= gir 400 før strømmen starter
+            if isinstance(self.paginator, KeysetPagination):
+                keys = parse_ordering(queryset.model, self.paginator.get_ordering(self))
+                queryset = queryset.order_by(*ordering_expressions(keys))
+            return streaming_json_response(queryset, serializer_class, context, self.stream_chunk_size)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer_class(page, many=True, context=context).data)
+        return Response(serializer_class(queryset, many=True, context=context).data)
@@ -0,0 +1,230 @@
+"""
+Syntetiske, realistiske testdata for alle modellene.
+
+Størrelsene styres av antall kunder; øvrige tabeller skaleres ut fra det
+(heiser per kunde, oppdrag per heis osv.). Alt skrives med bulk_create i
+bolker, og lagrede summer (tilbud/ordre) regnes om set-basert til slutt.
+"""
+import random
+import secrets
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import search
+from .models import (
+    User, Customer, ElevatorType, Elevator, SalesOpportunity, Quote, QuoteLineItem, Order, OrderLineItem,
+    Assignment, AssignmentNote, Part, AssignmentPart, Report, Service, Absence, fold_name,
+)
+
+CITIES = [
+    ('0150', 'Oslo'), ('5003', 'Bergen'), ('7010', 'Trondheim'), ('4006', 'Stavanger'), ('9008', 'Tromsø'),
+    ('3015', 'Drammen'), ('4611', 'Kristiansand'), ('1606', 'Fredrikstad'), ('2317', 'Hamar'), ('6002', 'Ålesund'),
+]
+STREETS = ['Storgata', 'Kirkegata', 'Parkveien', 'Industriveien', 'Strandgata', 'Skolegata', 'Fjordveien']
+COMPANY_SUFFIXES = ['Eiendom AS', 'Borettslag', 'Sameie', 'Næringsbygg AS', 'Kommune', 'Hotell AS']
+ELEVATOR_TYPES = [
+    ('Personheis', Decimal('450000.00')), ('Vareheis', Decimal('380000.00')), ('Plattformheis', Decimal('150000.00')),
+    ('Sykeheis', Decimal('620000.00')), ('Rulletrapp', Decimal('900000.00')),
+]
+FIRST_NAMES = ['Ola', 'Kari', 'Per', 'Ingrid', 'Lars', 'Nora', 'Jonas', 'Emma', 'Erik', 'Sofie']
+LAST_NAMES = ['Hansen', 'Johansen', 'Olsen', 'Larsen', 'Andersen', 'Pedersen', 'Nilsen', 'Berg']
+
+
+@dataclass
+class DatasetSize:
+    customers: int = 100
+    technicians: int = 20
+    sellers: int = 5
+    elevators_per_customer: int = 2
+    assignments_per_elevator: int = 5
+    notes_per_assignment: int = 1
+    quotes_per_customer: int = 1
+    lines_per_quote: int = 2
+    parts: int = 200
+    history_days: int = 3 * 365
+
+    @classmethod
+    def for_scale(cls, customers):
+        return cls(customers=customers, technicians=max(5, customers // 50), sellers=max(2, customers // 200))
+
+
+class SyntheticDataGenerator:
+    def __init__(self, size, seed=42, batch_size=2000, stdout=None):
+        self.size = size
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.today = timezone.localdate()
+        self.tz = timezone.get_current_timezone()
+        # Unikt prefiks (utenfor seed) slik at generatoren kan kjøres flere ganger mot samme database
+        self.tag = f'{seed}-{secrets.token_hex(3)}'
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def bulk(self, model, objects):
+        created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        search.reindex(model, [obj.pk for obj in created]) # bulk_create sender ingen signaler
+        self.log(f'  {model.__name__}: {len(created)}')
+        return created
+
+    def random_day(self, start_offset, end_offset):
+        return self.today + timedelta(days=self.rng.randint(start_offset, end_offset))
+
+    def random_datetime(self, start_offset, end_offset):
+        day = self.random_day(start_offset, end_offset)
+        return timezone.make_aware(datetime.combine(day, time(self.rng.randint(7, 15), self.rng.choice([0, 30]))), self.tz)
+
+    def person_name(self):
+        return self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+
+    @transaction.atomic
+    def generate(self):
+        size = self.size
+        rng = self.rng
+        password = make_password(None)
+
+        users = []
+        for role, count in (('tekniker', size.technicians), ('selger', size.sellers)):
+            for index in range(count):
+                first, last = self.person_name()
+                username = f'{role}_{self.tag}_{index}'
+                users.append(User(username=username, email=f'{username}@example.com', role=role,
+                                  first_name=first, last_name=last, password=password))
+        users = self.bulk(User, users)
+        technicians = [user for user in users if user.role == 'tekniker']
+
+        elevator_types = self.bulk(ElevatorType, [
+            ElevatorType(name=name, price=price, description=f'{name} (syntetisk)') for name, price in ELEVATOR_TYPES
+        ])
+        parts = self.bulk(Part, [
+            Part(name=f'Reservedel {index}', part_number=f'P-{self.tag}-{index:05d}',
+                 price=Decimal(rng.randint(100, 20000)), stock_quantity=rng.randint(0, 50))
+            for index in range(size.parts)
+        ])
+
+        customers = []
+        for index in range(size.customers):
+            zip_code, city = rng.choice(CITIES)
+            first, last = self.person_name()
+            name = f'{rng.choice(STREETS)} {index} {rng.choice(COMPANY_SUFFIXES)}'
+            customers.append(Customer(
+                name=name, name_folded=fold_name(name),
+                contact_person=f'{first} {last}', email=f'kunde{index}.{self.tag}@example.com',
+                phone=f'9{rng.randint(1000000, 9999999)}',
+                address=f'{rng.choice(STREETS)} {rng.randint(1, 150)}', zip_code=zip_code, city=city,
+            ))
+        customers = self.bulk(Customer, customers)
+
+        elevators = []
+        for customer in customers:
+            for _ in range(size.elevators_per_customer):
+                last_inspection = self.random_day(-365, -1)
+                elevators.append(Elevator(
+                    customer=customer, elevator_type=rng.choice(elevator_types),
+                    serial_number=f'SN-{self.tag}-{len(elevators):07d}',
+                    installation_date=self.random_day(-20 * 365, -365),
+                    last_inspection_date=last_inspection,
+                    next_inspection_date=last_inspection + timedelta(days=365),
+                ))
+        elevators = self.bulk(Elevator, elevators)
+
+        self.bulk(Service, [
+            Service(elevator=elevator, service_date=elevator.last_inspection_date,
+                    description='Årlig kontroll', completed=True)
+            for elevator in elevators
+        ])
+
+        opportunities, quotes, quote_lines, orders, order_lines = [], [], [], [], []
+        for customer in customers:
+            for _ in range(size.quotes_per_customer):
+                opportunities.append(SalesOpportunity(
+                    name=f'Modernisering {customer.name}', customer=customer,
+                    status=rng.choice([choice for choice, _ in SalesOpportunity.STATUS_CHOICES]),
+                    estimated_value=Decimal(rng.randint(100, 2000) * 1000),
+                ))
+        opportunities = self.bulk(SalesOpportunity, opportunities)
+        for index, opportunity in enumerate(opportunities):
+            quotes.append(Quote(opportunity=opportunity, quote_number=f'QT-{self.tag}-{index:06d}',
+                                issue_date=self.random_day(-size.history_days, 0),
+                                status=rng.choice([choice for choice, _ in Quote.STATUS_CHOICES])))
+        quotes = self.bulk(Quote, quotes)
+        for quote in quotes:
+            for _ in range(size.lines_per_quote):
+                elevator_type = rng.choice(elevator_types)
+                quantity = rng.randint(1, 3)
+                quote_lines.append(QuoteLineItem(quote=quote, elevator_type=elevator_type, quantity=quantity,
+                                                 line_total=quantity * elevator_type.price))
+            if quote.status == 'accepted':
+                orders.append(Order(quote=quote, customer=quote.opportunity.customer, order_date=quote.issue_date,
+                                    status=rng.choice([choice for choice, _ in Order.STATUS_CHOICES])))
+        self.bulk(QuoteLineItem, quote_lines)
+        orders = self.bulk(Order, orders)
+        lines_by_quote = {}
+        for line in quote_lines:
+            lines_by_quote.setdefault(line.quote_id, []).append(line)
+        for order in orders:
+            for line in lines_by_quote.get(order.quote_id, []):
+                order_lines.append(OrderLineItem(order=order, elevator_type=line.elevator_type, quantity=line.quantity,
+                                                 unit_price_at_order=line.elevator_type.price,
+                                                 line_total=line.line_total))
+        self.bulk(OrderLineItem, order_lines)
+        Quote.recalculate_totals([quote.pk for quote in quotes])
+        Order.recalculate_totals([order.pk for order in orders])
+        orders_by_customer = {order.customer_id: order for order in orders}
+
+        assignments = []
+        type_choices = [choice for choice, _ in Assignment.ASSIGNMENT_TYPE_CHOICES]
+        for elevator in elevators:
+            for _ in range(size.assignments_per_elevator):
+                scheduled = self.random_datetime(-size.history_days, 60)
+                is_past = scheduled.date() < self.today
+                status = rng.choice(['completed', 'completed', 'cancelled']) if is_past else rng.choice(['pending', 'in_progress'])
+                assigned_to = rng.choice(technicians) if (is_past or rng.random() < 0.8) else None
+                assignments.append(Assignment(
+                    title=f'{rng.choice(["Service", "Kontroll", "Feilretting", "Oppgradering"])} {elevator.serial_number}',
+                    description='Syntetisk oppdrag generert for ytelsestesting.',
+                    customer_id=elevator.customer_id, elevator=elevator, assigned_to=assigned_to,
+                    order=orders_by_customer.get(elevator.customer_id) if rng.random() < 0.1 else None,
+                    assignment_type=rng.choice(type_choices), status=status, scheduled_date=scheduled,
+                    deadline_date=scheduled.date() + timedelta(days=14),
+                    completed_at=scheduled + timedelta(hours=3) if status == 'completed' else None,
+                ))
+        assignments = self.bulk(Assignment, assignments)
+
+        notes, used_parts, reports = [], [], []
+        for assignment in assignments:
+            author = assignment.assigned_to or rng.choice(technicians)
+            for _ in range(size.notes_per_assignment):
+                notes.append(AssignmentNote(assignment=assignment, user=author, content='Arbeid utført etter plan.'))
+            if assignment.status == 'completed':
+                used_parts.append(AssignmentPart(assignment=assignment, part=rng.choice(parts),
+                                                 quantity=rng.randint(1, 4)))
+                reports.append(Report(assignment=assignment, created_by=author, content='Servicerapport.'))
+        self.bulk(AssignmentNote, notes)
+        self.bulk(AssignmentPart, used_parts)
+        self.bulk(Report, reports)
+
+        absences = []
+        absence_types = [choice for choice, _ in Absence.ABSENCE_TYPE_CHOICES]
+        for technician in technicians:
+            cursor = self.today - timedelta(days=size.history_days)
+            while cursor < self.today + timedelta(days=90):
+                cursor += timedelta(days=rng.randint(20, 90))
+                length = rng.randint(1, 14)
+                absences.append(Absence(user=technician, start_date=cursor, end_date=cursor + timedelta(days=length - 1),
+                                        absence_type=rng.choice(absence_types)))
+                cursor += timedelta(days=length)
+        self.bulk(Absence, absences)
+
+        return {
+            'users': len(users), 'customers': len(customers), 'elevators': len(elevators),
+            'assignments': len(assignments), 'notes': len(notes), 'quotes': len(quotes),
+            'orders': len(orders), 'absences': len(absences),
+        }
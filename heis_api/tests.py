@@ -1,3 +1,1738 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import absences, backfills, conflicts, dispatch, geocoding, importer, inspections, proximity, quote_pdf, quote_pdf_batch, search, typeahead
+from .models import (
+    User, Customer, Assignment, Absence, SalesOpportunity, Quote, QuoteLineItem, ElevatorType,
+    Order, OrderLineItem, Elevator, Part, AssignmentNote, AssignmentPart, Report, SearchDocument, Service,
+    BackfillCheckpoint, QuotePDFBatchJob,
+)
+from .query_budget import QueryBudgetTestMixin, track_queries
+from .stemmer import stem, stem_text
+from .synthetic import DatasetSize, SyntheticDataGenerator
+from .urls import router
+from .views import AssignmentViewSet
+
+
+def aware(day, hour=9):
+    return timezone.make_aware(datetime.combine(day, time(hour)))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ApiTestCase(TestCase):
+    """ Felles oppsett: en admin, to teknikere og en kunde. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', role='admin', is_staff=True)
+        cls.tech1 = User.objects.create_user('tech1', 'tech1@example.com', 'pw', role='tekniker')
+        cls.tech2 = User.objects.create_user('tech2', 'tech2@example.com', 'pw', role='tekniker')
+        cls.customer = Customer.objects.create(name='Kunde AS', address='Gate 1', zip_code='0150', city='Oslo')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def make_assignment(self, **kwargs):
+        defaults = {'title': 'Service', 'description': '', 'customer': self.customer, 'assignment_type': 'service'}
+        defaults.update(kwargs)
+        return Assignment.objects.create(**defaults)
+
+
+class AvailabilityTests(ApiTestCase):
+    def test_matrix_counts_assignments_and_absences(self):
+        self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(date(2025, 3, 3)))
+        self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(date(2025, 3, 3), 13))
+        self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(date(2025, 3, 4)), status='cancelled')
+        self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(date(2025, 2, 1)))
+        Absence.objects.create(user=self.tech2, start_date=date(2025, 3, 1), end_date=date(2025, 3, 4),
+                               absence_type='vacation')
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/availability/', {'start': '2025-03-03', 'end': '2025-03-05'})
+        self.assertEqual(response.status_code, 200)
+        rows = {row['id']: row for row in response.data['technicians']}
+        self.assertEqual(rows[self.tech1.id]['assignments'], [2, 0, 0])
+        self.assertEqual(rows[self.tech1.id]['free'], [False, True, True])
+        self.assertEqual(rows[self.tech2.id]['absence'], ['vacation', 'vacation', None])
+        self.assertEqual(rows[self.tech2.id]['free'], [False, False, True])
+        self.assertNotIn(self.admin.id, rows)
+
+    def test_default_window_is_seven_days(self):
+        response = self.client.get('/api/availability/', {'start': '2025-03-03'})
+        self.assertEqual(response.data['days'], [date(2025, 3, 3) + timedelta(days=offset) for offset in range(7)])
+
+    def test_invalid_range_is_rejected(self):
+        response = self.client.get('/api/availability/', {'start': '2025-03-05', 'end': '2025-03-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/availability/', {'start': 'i morgen'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AssignmentCalendarTests(ApiTestCase):
+    def test_feed_returns_window_and_supports_conditional_get(self):
+        inside = self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(date(2025, 3, 4)))
+        spanning = self.make_assignment(assigned_to=self.tech2, scheduled_date=aware(date(2025, 2, 20)),
+                                        deadline_date=date(2025, 3, 3))
+        self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(date(2025, 4, 1)))
+        self.make_assignment(scheduled_date=aware(date(2025, 3, 4)))  # ikke tildelt
+
+        params = {'start': '2025-03-03', 'end': '2025-03-09'}
+        response = self.client.get('/api/assignments/calendar/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({event['id'] for event in response.data}, {inside.id, spanning.id})
+        self.assertEqual(response.data[0]['customer_name'], 'Kunde AS')
+        etag = response['ETag']
+
+        response = self.client.get('/api/assignments/calendar/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        inside.title = 'Endret'
+        inside.save()
+        response = self.client.get('/api/assignments/calendar/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_today_filters_on_local_date(self):
+        todays = self.make_assignment(scheduled_date=aware(timezone.localdate(), 10))
+        response = self.client.get('/api/assignments/today/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data], [todays.id])
+
+
+class SellerDashboardTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_kpis_are_aggregated_and_cached(self):
+        won = SalesOpportunity.objects.create(name='A', customer=self.customer, status='won', estimated_value=100)
+        SalesOpportunity.objects.create(name='B', customer=self.customer, status='new', estimated_value=50)
+        SalesOpportunity.objects.create(name='C', customer=self.customer, status='lost', estimated_value=999)
+        Quote.objects.create(opportunity=won, status='sent')
+        Quote.objects.create(opportunity=won, status='accepted')
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/dashboard/seller/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_opportunities'], 3)
+        self.assertEqual(response.data['won_this_month'], 1)
+        self.assertEqual(response.data['pipeline_value'], Decimal('150'))
+        self.assertEqual(response.data['active_quotes'], 1)
+        self.assertEqual(response.data['recent_customers'][0]['name'], 'Kunde AS')
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/dashboard/seller/')
+
+
+class QuoteTotalsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.elevator_type = ElevatorType.objects.create(name='Type A', price=Decimal('100.00'))
+        opportunity = SalesOpportunity.objects.create(name='Prosjekt', customer=self.customer)
+        self.quote = Quote.objects.create(opportunity=opportunity)
+
+    def test_totals_follow_line_and_price_changes(self):
+        line = QuoteLineItem.objects.create(quote=self.quote, elevator_type=self.elevator_type, quantity=2)
+        QuoteLineItem.objects.create(quote=self.quote, elevator_type=self.elevator_type, quantity=1)
+        self.quote.refresh_from_db()
+        self.assertEqual(line.line_total, Decimal('200.00'))
+        self.assertEqual(self.quote.total_amount, Decimal('300.00'))
+
+        self.elevator_type.price = Decimal('150.00')
+        self.elevator_type.save()
+        self.quote.refresh_from_db()
+        self.assertEqual(self.quote.total_amount, Decimal('450.00'))
+
+        line.delete()
+        self.quote.refresh_from_db()
+        self.assertEqual(self.quote.total_amount, Decimal('150.00'))
+
+        self.elevator_type.delete()
+        self.quote.refresh_from_db()
+        self.assertEqual(self.quote.total_amount, Decimal('0.00'))
+
+    def test_quote_list_can_filter_and_order_on_total(self):
+        QuoteLineItem.objects.create(quote=self.quote, elevator_type=self.elevator_type, quantity=5)
+        response = self.client.get('/api/quotes/', {'total_amount__gte': '400', 'ordering': '-total_amount'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.quote.id])
+        self.assertEqual(response.data['results'][0]['total_amount'], '500.00')
+
+
+class OrderTotalsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.elevator_type = ElevatorType.objects.create(name='Type A', price=Decimal('100.00'))
+        self.order = Order.objects.create(customer=self.customer)
+
+    def make_line(self, quantity=1, price='100.00'):
+        return OrderLineItem.objects.create(order=self.order, elevator_type=self.elevator_type,
+                                            quantity=quantity, unit_price_at_order=Decimal(price))
+
+    def test_total_follows_line_edits_and_deletes(self):
+        line = self.make_line(quantity=2)
+        self.make_line(quantity=1, price='50.00')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('250.00'))
+
+        response = self.client.patch(f'/api/order-line-items/{line.id}/', {'quantity': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('350.00'))
+
+        response = self.client.delete(f'/api/order-line-items/{line.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('50.00'))
+
+    def test_bulk_create_recalculates_once(self):
+        payload = [
+            {'order': self.order.id, 'elevator_type': self.elevator_type.id, 'quantity': 1, 'unit_price_at_order': '10.00'}
+            for _ in range(5)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/order-line-items/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "heis_api_order"')]
+        self.assertEqual(len(updates), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('50.00'))
+
+    def test_repair_command_fixes_drift(self):
+        self.make_line(quantity=2)
+        Order.objects.filter(pk=self.order.pk).update(total_amount=Decimal('1.00'))
+        call_command('repair_order_totals', stdout=StringIO())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('200.00'))
+
+    def test_create_order_from_quote_copies_totals(self):
+        opportunity = SalesOpportunity.objects.create(name='Prosjekt', customer=self.customer)
+        quote = Quote.objects.create(opportunity=opportunity, status='accepted')
+        QuoteLineItem.objects.create(quote=quote, elevator_type=self.elevator_type, quantity=3)
+        response = self.client.post(f'/api/quotes/{quote.id}/create-order/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_amount'], '300.00')
+        self.assertEqual(response.data['line_items'][0]['line_total'], '300.00')
+
+
+class QuotePDFTestCase(ApiTestCase):
+    """ Tilbud med egen midlertidig MEDIA_ROOT. """
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        opportunity = SalesOpportunity.objects.create(name='Prosjekt', customer=self.customer)
+        self.quote = Quote.objects.create(opportunity=opportunity, quote_number='QT-00001')
+
+
+class QuotePDFCacheTests(QuotePDFTestCase):
+    def download(self):
+        response = self.client.get(f'/api/quotes/{self.quote.id}/pdf/')
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'%PDF'))
+        return response
+
+    def test_repeat_downloads_are_served_from_cache(self):
+        with mock.patch('heis_api.quote_pdf.render_quote_pdf', wraps=quote_pdf.render_quote_pdf) as render:
+            self.download()
+            response = self.download()
+            self.assertEqual(render.call_count, 1)
+            self.assertIn('Tilbud_QT-00001.pdf', response['Content-Disposition'])
+
+            self.quote.customer_notes = 'Ny tekst'
+            self.quote.save()
+            self.download()
+            self.assertEqual(render.call_count, 2)
+
+    def test_cache_is_size_bounded(self):
+        directory = quote_pdf.cache_dir()
+        for index in range(3):
+            path = os.path.join(directory, f'{index}.pdf')
+            with open(path, 'wb') as pdf_file:
+                pdf_file.write(b'x' * 100)
+            os.utime(path, (index, index))
+        with override_settings(QUOTE_PDF_CACHE_MAX_BYTES=250):
+            quote_pdf.evict_cache()
+        self.assertEqual(sorted(os.listdir(directory)), ['1.pdf', '2.pdf'])
+
+
+@override_settings(QUOTE_PDF_BATCH_WORKERS=0)
+class QuotePDFBatchTests(QuotePDFTestCase):
+    def test_batch_job_renders_zip(self):
+        other = Quote.objects.create(opportunity=self.quote.opportunity, quote_number='QT-00002')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post('/api/quotes/pdf-batch/', {'quote_ids': [self.quote.id, other.id]}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(callbacks), 1)
+        job_id = response.data['id']
+        self.assertEqual(self.client.get(f'/api/quotes/pdf-batch/{job_id}/download/').status_code, 409)
+
+        quote_pdf_batch.run_batch_job(job_id)
+        response = self.client.get(f'/api/quotes/pdf-batch/{job_id}/')
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['completed'], 2)
+
+        response = self.client.get(f'/api/quotes/pdf-batch/{job_id}/download/')
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), ['Tilbud_QT-00001.pdf', 'Tilbud_QT-00002.pdf'])
+
+    def test_batch_larger_than_cache_keeps_every_pdf(self):
+        others = [Quote.objects.create(opportunity=self.quote.opportunity, quote_number=f'QT-1{index}')
+                  for index in range(2)]
+        job = QuotePDFBatchJob.objects.create(quote_ids=[self.quote.id] + [quote.id for quote in others])
+        # Cachen har bare plass til én PDF, så de første kastes ut mens jobben går
+        with override_settings(QUOTE_PDF_CACHE_MAX_BYTES=1):
+            quote_pdf_batch.run_batch_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.errors), ('completed', {}))
+        with zipfile.ZipFile(os.path.join(self.media_root, job.archive.name)) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+            self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in archive.namelist()))
+
+    def test_command_reclaims_jobs_stuck_in_running(self):
+        # Webprosessen døde midt i jobben
+        stuck = QuotePDFBatchJob.objects.create(quote_ids=[self.quote.id], status='running', completed=1,
+                                                started_at=timezone.now() - timedelta(hours=2))
+        recent = QuotePDFBatchJob.objects.create(quote_ids=[self.quote.id], status='running',
+                                                 started_at=timezone.now() - timedelta(minutes=5))
+        out = StringIO()
+        call_command('run_quote_pdf_jobs', stdout=out)
+        self.assertIn('Tok opp igjen 1 jobber', out.getvalue())
+        stuck.refresh_from_db()
+        self.assertEqual((stuck.status, stuck.completed), ('completed', 1))
+        self.assertEqual(QuotePDFBatchJob.objects.get(pk=recent.pk).status, 'running')
+
+    def test_unknown_quotes_are_rejected(self):
+        response = self.client.post('/api/quotes/pdf-batch/', {'quote_ids': [999999]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+def seed_sample_data(count, admin):
+    """ Lager `count` rader av hver modell, koblet sammen slik frontend ser dem. """
+    elevator_type = ElevatorType.objects.create(name='Type', price=Decimal('10.00'))
+    part = Part.objects.create(name='Del', part_number=f'P-{Part.objects.count()}')
+    for index in range(count):
+        tech = User.objects.create_user(f'seed_tech_{index}_{User.objects.count()}',
+                                        f'seed{User.objects.count()}@example.com', 'pw', role='tekniker',
+                                        first_name='Tekniker', last_name=str(index))
+        customer = Customer.objects.create(name=f'Kunde {index}', address='Gate 1', zip_code='0150', city='Oslo',
+                                           contact_person_user=tech)
+        elevator = Elevator.objects.create(customer=customer, elevator_type=elevator_type,
+                                           serial_number=f'SN-{Elevator.objects.count()}')
+        opportunity = SalesOpportunity.objects.create(name=f'Mulighet {index}', customer=customer)
+        quote = Quote.objects.create(opportunity=opportunity, status='accepted')
+        QuoteLineItem.objects.create(quote=quote, elevator_type=elevator_type, quantity=2)
+        order = Order.objects.create(quote=quote, customer=customer)
+        OrderLineItem.objects.create(order=order, elevator_type=elevator_type, quantity=1,
+                                     unit_price_at_order=Decimal('10.00'))
+        assignment = Assignment.objects.create(title=f'Oppdrag {index}', description='', customer=customer,
+                                               elevator=elevator, assigned_to=tech, order=order,
+                                               assignment_type='service',
+                                               scheduled_date=aware(timezone.localdate()))
+        AssignmentNote.objects.create(assignment=assignment, user=admin, content='Notat')
+        AssignmentPart.objects.create(assignment=assignment, part=part)
+        Report.objects.create(assignment=assignment, created_by=admin, content='Rapport')
+        Service.objects.create(elevator=elevator, service_date=date(2025, 1, 1), description='Service')
+        Absence.objects.create(user=tech, start_date=date(2025, 1, 1), end_date=date(2025, 1, 2),
+                               absence_type='vacation')
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, ApiTestCase):
+    """
+    Spørringsbudsjett for list- og detaljvisning av alle viewsets i routeren.
+    Nye viewsets må få et budsjett her. Budsjettet gjelder med 10 rader per
+    modell, og `max_repeats` fanger N+1 (samme spørring per rad).
+    """
+    ROWS = 10
+    # basename: (list, detalj). Relasjoner hentes av QueryPlannerMixin, så tallene
+    # er konstante uansett sidestørrelse (listen: COUNT + rader + én per prefetch).
+    BUDGETS = {
+        'user': (2, 1),
+        'customer': (2, 2),
+        'elevatortype': (2, 1),
+        'elevator': (2, 1),
+        'assignment': (2, 3),
+        'part': (2, 1),
+        'assignmentpart': (2, 1),
+        'assignmentnote': (2, 1),
+        'report': (2, 1),
+        'salesopportunity': (2, 1),
+        'quote': (3, 2),
+        'quotelineitem': (2, 1),
+        'order': (4, 3),
+        'orderlineitem': (2, 1),
+        'absence': (2, 1),
+        'service': (2, 1),
+        'availability': (3, None),
+        'project-summary': (2, 1),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        seed_sample_data(cls.ROWS, cls.admin)
+
+    def test_every_router_viewset_has_budget(self):
+        registered = {basename for _, _, basename in router.registry}
+        self.assertEqual(registered - set(self.BUDGETS), set(), 'Mangler spørringsbudsjett')
+
+    def test_endpoint_budgets(self):
+        for prefix, viewset, basename in router.registry:
+            list_budget, detail_budget = self.BUDGETS[basename]
+            with self.subTest(endpoint=basename, action='list'):
+                with self.assertQueryBudget(list_budget, max_repeats=1):
+                    response = self.client.get(reverse(f'{basename}-list'))
+                self.assertEqual(response.status_code, 200)
+            if detail_budget is None:
+                continue
+            results = response.data.get('results', response.data) if isinstance(response.data, dict) else response.data
+            with self.subTest(endpoint=basename, action='retrieve'):
+                with self.assertQueryBudget(detail_budget, max_repeats=1):
+                    response = self.client.get(reverse(f'{basename}-detail', args=[results[0]['id']]))
+                self.assertEqual(response.status_code, 200)
+
+    def test_custom_list_actions_are_planned(self):
+        Assignment.objects.filter(pk__in=Assignment.objects.values('pk')[:3]).update(assigned_to=None, status='pending')
+        tech = Assignment.objects.exclude(assigned_to=None).first().assigned_to
+        elevator = Elevator.objects.first()
+        client = APIClient()
+        client.force_authenticate(tech)
+        for client, url, budget in [
+            (client, '/api/assignments/mine/', 2),
+            (self.client, '/api/assignments/unassigned/', 2),
+            (self.client, '/api/users/tekniker/', 2),
+            (self.client, f'/api/elevators/{elevator.pk}/assignments/', 3),
+        ]:
+            with self.subTest(url=url):
+                with self.assertQueryBudget(budget, max_repeats=1):
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.data['results'])
+
+    def test_planned_detail_matches_serializer_output(self):
+        assignment = Assignment.objects.first()
+        response = self.client.get(reverse('assignment-detail', args=[assignment.pk]))
+        self.assertEqual(response.data['customer']['name'], assignment.customer.name)
+        self.assertEqual(response.data['assigned_to_name'], assignment.assigned_to.get_full_name())
+        self.assertEqual(response.data['order_id'], assignment.order_id)
+        self.assertEqual([note['user_name'] for note in response.data['notes']], ['admin'])
+
+    def test_middleware_reports_query_headers(self):
+        with override_settings(QUERY_BUDGET_HEADERS=True, QUERY_BUDGET_DUPLICATE_WARNING=1000):
+            client = APIClient()
+            client.force_authenticate(self.admin)
+            response = client.get('/api/assignments/')
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertIn('X-Query-Duplicates', response)
+
+
+class SyntheticDataTests(TestCase):
+    def test_generator_creates_consistent_dataset(self):
+        size = DatasetSize(customers=5, technicians=2, sellers=1, parts=3)
+        counts = SyntheticDataGenerator(size, seed=1).generate()
+        self.assertEqual(counts['customers'], 5)
+        self.assertEqual(Elevator.objects.count(), 10)
+        self.assertEqual(Assignment.objects.count(), 50)
+        for quote in Quote.objects.prefetch_related('line_items'):
+            self.assertEqual(quote.total_amount, sum(line.line_total for line in quote.line_items.all()))
+        # Kan kjøres flere ganger mot samme database
+        SyntheticDataGenerator(size, seed=1).generate()
+        self.assertEqual(Customer.objects.count(), 10)
+
+
+class SparseFieldsetTests(QueryBudgetTestMixin, ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        seed_sample_data(3, cls.admin)
+
+    def test_fields_narrow_response_and_columns(self):
+        with track_queries() as stats:
+            response = self.client.get('/api/assignments/?fields=id,title,status')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'status'})
+        select = next(sql for sql in stats.fingerprints if sql.startswith('SELECT "heis_api_assignment"."id"'))
+        self.assertNotIn('JOIN', select)
+        self.assertNotIn('"description"', select)
+
+    def test_fields_without_ordering_columns_keep_cursor_free(self):
+        # created_at er ikke valgt, men trengs i cursoren til neste side
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/assignments/?fields=id,title&page_size=2')
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+
+    def test_dotted_fields_expand_and_narrow_nested(self):
+        with self.assertQueryBudget(2, max_repeats=1):
+            response = self.client.get('/api/assignments/?fields=id,customer.name')
+        self.assertEqual(response.data['results'][0]['customer'], {'name': 'Kunde 2'})
+
+    def test_expand_embeds_related_objects_without_n_plus_one(self):
+        with self.assertQueryBudget(4, max_repeats=1):
+            response = self.client.get('/api/assignments/?expand=customer,notes')
+        first = response.data['results'][0]
+        self.assertEqual(first['customer']['name'], 'Kunde 2')
+        self.assertEqual(first['notes'][0]['content'], 'Notat')
+
+    def test_detail_fields_skip_nested_prefetches(self):
+        assignment = Assignment.objects.first()
+        with self.assertQueryBudget(1):
+            response = self.client.get(f'/api/assignments/{assignment.pk}/?fields=id,title,customer.name')
+        self.assertEqual(response.data, {'id': assignment.pk, 'title': assignment.title,
+                                         'customer': {'name': assignment.customer.name}})
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get('/api/assignments/?fields=id,nope').status_code, 400)
+        self.assertEqual(self.client.get('/api/assignments/?expand=nope').status_code, 400)
+
+    def test_update_procedure_uses_fields_kwarg(self):
+        assignment = Assignment.objects.first()
+        response = self.client.patch(f'/api/assignments/{assignment.pk}/update-procedure/',
+                                     {'procedure_step': 2, 'procedure_notes': 'OK'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'procedure_step', 'checklist_status', 'procedure_notes'})
+        assignment.refresh_from_db()
+        self.assertEqual(assignment.procedure_notes, 'OK')
+
+
+class KeysetPaginationTests(QueryBudgetTestMixin, ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(7):
+            cls.make_assignment(cls, title=f'Oppdrag {index}')
+        # Like created_at for flere rader: id skal bryte uavgjort
+        Assignment.objects.filter(title__in=['Oppdrag 2', 'Oppdrag 3', 'Oppdrag 4']).update(created_at=aware(date(2025, 1, 1)))
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_all_rows_in_order_without_duplicates(self):
+        ids = self.walk('/api/assignments/?page_size=2&fields=id')
+        expected = list(Assignment.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get('/api/assignments/?page_size=3').data
+        second = self.client.get(first['next']).data
+        self.assertIsNone(first['previous'])
+        back = self.client.get(second['previous']).data
+        self.assertEqual([row['id'] for row in back['results']], [row['id'] for row in first['results']])
+        self.assertIsNone(back['previous'])
+
+    def test_no_count_mode_skips_count_query(self):
+        first = self.client.get('/api/assignments/?page_size=2&count=false').data
+        self.assertNotIn('count', first)
+        with track_queries() as stats:
+            response = self.client.get(first['next'])
+        self.assertEqual(stats.count, 1)
+        self.assertFalse(any('COUNT' in sql for sql in stats.fingerprints))
+        self.assertNotIn('OFFSET', ' '.join(stats.fingerprints))
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_count_is_included_by_default(self):
+        self.assertEqual(self.client.get('/api/assignments/').data['count'], 7)
+
+    def test_invalid_cursor_returns_404(self):
+        self.assertEqual(self.client.get('/api/assignments/?cursor=ikke-gyldig').status_code, 404)
+
+    def test_notes_and_reports_use_keyset_pagination(self):
+        assignment = Assignment.objects.first()
+        for index in range(3):
+            AssignmentNote.objects.create(assignment=assignment, user=self.admin, content=f'Notat {index}')
+            Report.objects.create(assignment=assignment, created_by=self.admin, content=f'Rapport {index}')
+        for url in ('/api/assignment-notes/?page_size=2', '/api/reports/?page_size=2'):
+            with self.subTest(url=url):
+                self.assertEqual(len(self.walk(url)), 3)
+
+
+class ListActionTests(QueryBudgetTestMixin, ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.elevator = Elevator.objects.create(customer=cls.customer, serial_number='SN-LIST')
+        days = [None, date(2025, 3, 5), date(2025, 3, 1), None, date(2025, 3, 1), date(2025, 3, 9)]
+        for index, day in enumerate(days):
+            cls.make_assignment(cls, title=f'Mitt {index}', assigned_to=cls.tech1, elevator=cls.elevator,
+                                status='completed' if index % 3 == 0 else 'pending',
+                                scheduled_date=aware(day) if day else None)
+        cls.make_assignment(cls, title='Ledig', status='pending', scheduled_date=aware(date(2025, 3, 2)))
+
+    def setUp(self):
+        super().setUp()
+        self.tech_client = APIClient()
+        self.tech_client.force_authenticate(self.tech1)
+
+    def expected_mine(self):
+        rows = Assignment.objects.filter(assigned_to=self.tech1)
+        # status, scheduled_date (NULL sist), id
+        return [row.id for row in sorted(rows, key=lambda row: (
+            row.status, row.scheduled_date is None, row.scheduled_date or aware(date(2000, 1, 1)), row.id))]
+
+    def walk(self, client, url, link='next'):
+        ids = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data[link]
+        return ids
+
+    def test_mine_is_keyset_paginated_with_nulls_last(self):
+        self.assertEqual(self.walk(self.tech_client, '/api/assignments/mine/?page_size=2'), self.expected_mine())
+
+    def test_mine_previous_links_walk_back_to_start(self):
+        url = '/api/assignments/mine/?page_size=2'
+        while True:
+            data = self.tech_client.get(url).data
+            if not data['next']:
+                break
+            url = data['next']
+        back = []
+        while data['previous']:
+            data = self.tech_client.get(data['previous']).data
+            back = [row['id'] for row in data['results']] + back
+        self.assertEqual(back, self.expected_mine()[:len(back)])
+        self.assertEqual(len(back), 4)
+
+    def test_mine_applies_list_filters(self):
+        response = self.tech_client.get('/api/assignments/mine/?status=pending')
+        self.assertEqual(response.data['count'], 4)
+        self.assertTrue(all(row['status'] == 'pending' for row in response.data['results']))
+
+    def test_unassigned_and_elevator_assignments_are_paginated(self):
+        self.assertEqual(self.walk(self.client, '/api/assignments/unassigned/'),
+                         [Assignment.objects.get(title='Ledig').id])
+        response = self.client.get(f'/api/elevators/{self.elevator.pk}/assignments/?status=completed')
+        self.assertEqual(response.data['count'], 2)
+
+    def test_tekniker_is_paginated(self):
+        response = self.client.get('/api/users/tekniker/')
+        self.assertEqual([row['username'] for row in response.data['results']], ['tech1', 'tech2'])
+
+    def test_stream_returns_everything_in_chunks(self):
+        with mock.patch.object(AssignmentViewSet, 'stream_chunk_size', 2):
+            response = self.tech_client.get('/api/assignments/mine/?stream=true&fields=id,status')
+            self.assertTrue(response.streaming)
+            with track_queries() as stats:
+                rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['id'] for row in rows], self.expected_mine())
+        self.assertEqual(set(rows[0]), {'id', 'status'})
+        self.assertEqual(stats.count, 1) # Én markør, hentet i bolker
+
+    def test_stream_rejects_unknown_fields_before_streaming(self):
+        response = self.tech_client.get('/api/assignments/mine/?stream=true&fields=nope')
+        self.assertEqual(response.status_code, 400)
+
+
+class StemmerTests(TestCase):
+    def test_norwegian_inflections_share_stem(self):
+        for words in (['heis', 'heisen', 'heiser', 'heisene'], ['kontroll', 'kontrollen', 'kontrollene'],
+                      ['tilbud', 'tilbudet', 'tilbudene']):
+            self.assertEqual({stem(word) for word in words}, {stem(words[0])}, words)
+
+    def test_short_words_and_numbers_are_kept(self):
+        self.assertEqual(stem_text('AS 0150 Bærum'), 'as 0150 bærum')
+
+
+class FullTextSearchTests(QueryBudgetTestMixin, ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = Customer.objects.create(name='Fjordheiser AS', city='Bergen', contact_person='Kari Nordmann')
+        cls.elevator = Elevator.objects.create(customer=cls.customer, serial_number='SN-4711',
+                                               location_description='Bakgården')
+        cls.motor = Part.objects.create(name='Motor', part_number='M-1', description='Motor for heiser, motor')
+        cls.door = Part.objects.create(name='Dørlås', part_number='D-1', description='Lås til heisdøren, reserve motor')
+        cls.assignment = cls.make_assignment(cls, title='Kontroll av heisene', elevator=cls.elevator)
+
+    def search(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_matches_inflected_forms(self):
+        self.assertEqual(self.search('/api/assignments/?search=heisen'), [self.assignment.id])
+        self.assertEqual(self.search('/api/assignments/?search=kontrollene'), [self.assignment.id])
+
+    def test_prefix_and_related_fields(self):
+        self.assertEqual(self.search('/api/customers/?search=fjord'), [self.other.id])
+        self.assertEqual(self.search('/api/elevators/?search=kunde'), [self.elevator.id])
+        self.assertEqual(self.search('/api/assignments/?search=SN-4711'), [self.assignment.id])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.search('/api/customers/?search=kari bergen'), [self.other.id])
+        self.assertEqual(self.search('/api/customers/?search=kari oslo'), [])
+
+    def test_results_are_ranked(self):
+        self.assertEqual(self.search('/api/parts/?search=motor'), [self.motor.id, self.door.id])
+
+    def test_assignment_search_is_ranked_across_pages(self):
+        best = self.make_assignment(title='Bytte motor', description='Motor og motorbrems, ny motor')
+        weak = self.make_assignment(title='Service', description='Sjekk motor')
+        self.assertGreater(weak.created_at, best.created_at)
+        self.assertEqual(self.search('/api/assignments/?search=motor'), [best.id, weak.id])
+
+        first = self.client.get('/api/assignments/', {'search': 'motor', 'page_size': 1}).data
+        self.assertEqual(([row['id'] for row in first['results']], first['count'], first['previous']),
+                         ([best.id], 2, None))
+        second = self.client.get(first['next']).data
+        self.assertEqual([row['id'] for row in second['results']], [weak.id])
+        self.assertIsNone(second['next'])
+        self.assertEqual([row['id'] for row in self.client.get(second['previous']).data['results']], [best.id])
+
+    def test_search_is_a_single_query(self):
+        with self.assertQueryBudget(3, max_repeats=1):
+            self.client.get('/api/customers/?search=kunde')
+
+    def test_documents_follow_saves_of_related_objects(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.name = 'Løftekompaniet'
+            self.customer.save()
+            # Relaterte dokumenter bygges først etter commit
+            self.assertEqual(self.search('/api/elevators/?search=løftekompani'), [])
+        self.assertEqual(self.search('/api/elevators/?search=løftekompani'), [self.elevator.id])
+        self.assertEqual(self.search('/api/assignments/?search=løftekompani'), [self.assignment.id])
+        self.assertEqual(self.search('/api/customers/?search=kunde'), [])
+
+    def test_only_indexed_and_related_models_have_receivers(self):
+        models = search.registry.signal_models()
+        self.assertTrue({Customer, Elevator, Assignment, Part} <= models)
+        self.assertNotIn(Absence, models)
+        with CaptureQueriesContext(connection) as queries:
+            Absence.objects.create(user=self.tech1, start_date=date(2025, 1, 6), end_date=date(2025, 1, 7),
+                                   absence_type='vacation')
+        self.assertFalse([q for q in queries.captured_queries if 'heis_api_searchdocument' in q['sql']])
+
+    def test_deleted_objects_lose_their_document(self):
+        self.door.delete()
+        self.assertFalse(SearchDocument.objects.filter(model='heis_api.part', object_id=self.door.id).exists())
+        self.assertEqual(self.search('/api/parts/?search=motor'), [self.motor.id])
+
+    def test_rebuild_command_restores_documents(self):
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('/api/parts/?search=dørlås'), [self.door.id])
+        self.assertEqual(SearchDocument.objects.filter(model='heis_api.customer').count(), 2)
+
+
+class TypeaheadTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.fjord = Customer.objects.create(name='Fjordheiser AS', city='Bergen')
+        cls.elevator = Elevator.objects.create(customer=cls.customer, serial_number='SN-4711')
+        cls.motor = Part.objects.create(name='Motor stor', part_number='M-100', price=Decimal('999.00'))
+
+    def setUp(self):
+        super().setUp()
+        # Indeksen lever i prosessen; bygg på nytt fra testens database
+        for source in typeahead.SOURCES.values():
+            source.index.built_at = None
+
+    def names(self, kind, q):
+        response = self.client.get(f'/api/typeahead/{kind}/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_prefix_matches_any_word(self):
+        self.assertEqual([row['name'] for row in self.names('customers', 'fjo')], ['Fjordheiser AS'])
+        self.assertEqual({row['name'] for row in self.names('customers', 'as')}, {'Kunde AS', 'Fjordheiser AS'})
+        self.assertEqual(self.names('customers', ''), [])
+
+    def test_parts_match_number_and_name(self):
+        by_number = self.names('parts', 'm-1')
+        self.assertEqual(by_number, self.names('parts', 'stor'))
+        self.assertEqual(by_number[0]['price'], Decimal('999.00'))
+        self.assertEqual(self.names('elevators', 'sn 47')[0]['id'], self.elevator.id)
+
+    def test_lookups_after_first_do_not_query(self):
+        self.names('customers', 'k')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('customers', 'ku')[0]['id'], self.customer.id)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.names('customers', 'x')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fjord.name = 'Løfteteknikk AS'
+            self.fjord.save()
+        self.assertEqual(self.names('customers', 'fjo'), [])
+        self.assertEqual(self.names('customers', 'løft')[0]['id'], self.fjord.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fjord.delete()
+        self.assertEqual(self.names('customers', 'løft'), [])
+
+    def test_unknown_kind_is_404(self):
+        self.assertEqual(self.client.get('/api/typeahead/ordre/?q=a').status_code, 404)
+
+
+class AssignmentBulkTests(QueryBudgetTestMixin, ApiTestCase):
+    url = '/api/assignments/bulk/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.elevator = Elevator.objects.create(customer=cls.customer, serial_number='SN-BULK')
+
+    def new_item(self, index, **kwargs):
+        item = {'title': f'Bulk {index}', 'description': 'Årlig service', 'customer': self.customer.pk,
+                'elevator': self.elevator.pk, 'assigned_to': self.tech1.pk, 'assignment_type': 'service'}
+        item.update(kwargs)
+        return item
+
+    def test_create_many_in_constant_queries(self):
+        items = [self.new_item(index) for index in range(50)]
+        with self.assertQueryBudget(8, max_repeats=1): # Ett oppslag per relasjon, én INSERT
+            response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row['index'] for row in response.data], list(range(50)))
+        self.assertEqual(response.data[0]['data']['customer_name'], 'Kunde AS')
+        self.assertEqual(Assignment.objects.filter(title__startswith='Bulk').count(), 50)
+        self.assertTrue(SearchDocument.objects.filter(object_id=response.data[0]['id'],
+                                                      model='heis_api.assignment').exists())
+
+    def test_invalid_item_rejects_whole_batch(self):
+        items = [self.new_item(0), self.new_item(1, customer=999999), self.new_item(2, assignment_type='x')]
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([row['index'] for row in response.data], [1, 2])
+        self.assertIn('customer', response.data[0]['errors'])
+        self.assertFalse(Assignment.objects.filter(title__startswith='Bulk').exists())
+
+    def test_update_many(self):
+        first, second = self.make_assignment(title='A'), self.make_assignment(title='B')
+        before = Assignment.objects.get(pk=first.pk).updated_at
+        items = [{'id': first.pk, 'assigned_to': self.tech2.pk, 'scheduled_date': '2025-05-01T08:00:00Z'},
+                 {'id': second.pk, 'status': 'cancelled'}]
+        # + lås på teknikerne og konfliktkontrollen (oppdrag og fravær), uansett antall elementer
+        with self.assertQueryBudget(10, max_repeats=1):
+            response = self.client.patch(self.url, items, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['data']['assigned_to'], self.tech2.pk)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.assigned_to, first.title), (self.tech2, 'A'))
+        self.assertEqual(second.status, 'cancelled')
+        self.assertGreater(first.updated_at, before)
+
+    def test_update_rejects_missing_and_duplicate_ids(self):
+        assignment = self.make_assignment()
+        response = self.client.patch(self.url, [{'id': assignment.pk}, {'id': assignment.pk}], format='json')
+        self.assertEqual(response.data[0]['index'], 1)
+        response = self.client.patch(self.url, [{'id': 999999, 'status': 'completed'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0]['errors'], {'id': ['Finnes ikke.']})
+
+    def test_rejects_non_list_and_too_many_items(self):
+        self.assertEqual(self.client.post(self.url, {'title': 'x'}, format='json').status_code, 400)
+        with mock.patch.object(AssignmentViewSet, 'bulk_max_items', 2):
+            response = self.client.post(self.url, [self.new_item(i) for i in range(3)], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.elevator_type = ElevatorType.objects.create(name='Personheis')
+        Elevator.objects.create(customer=cls.customer, serial_number='SN-OLD', location_description='Gammel')
+
+    def csv_file(self, text, name='import.csv'):
+        return SimpleUploadedFile(name, text.encode('utf-8'), content_type='text/csv')
+
+    def test_customers_are_upserted_on_name_and_zip(self):
+        upload = self.csv_file('navn;adresse;postnummer;poststed;e-post\n'
+                               'kunde as;Ny gate 2;0150;Oslo;post@kunde.no\n'
+                               'Ny Kunde;Vei 3;5003;Bergen;\n'
+                               'Feil;Vei 4;5003;Bergen;ikke-epost\n')
+        response = self.client.post('/api/imports/customers/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['error_count']), (1, 1, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 4)
+        self.assertIn('email', response.data['errors'][0]['errors'])
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.name, self.customer.address), ('kunde as', 'Ny gate 2'))
+        self.assertEqual(self.client.get('/api/customers/?search=bergen').data['count'], 1)
+
+    def test_elevators_dedupe_on_serial_number_in_chunks(self):
+        rows = ['serial_number,customer,elevator_type,installation_date']
+        rows += [f'SN-{index},Kunde AS,personheis,2020-01-0{index % 9 + 1}' for index in range(7)]
+        rows += ['SN-OLD,Kunde AS,,2019-05-05', 'SN-0,Kunde AS,Personheis,2021-02-02',
+                 'SN-X,Ukjent AS,Personheis,', 'SN-Y,Kunde AS,Lasteheis,', 'SN-Z,Kunde AS,,ikke-dato']
+        path = os.path.join(tempfile.mkdtemp(), 'heiser.csv')
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write('\n'.join(rows))
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_data', 'elevators', path, '--chunk-size', '3', stdout=out)
+        # Heistypene leses én gang per import, ikke per bolk eller rad
+        self.assertEqual(len([q for q in queries.captured_queries if 'FROM "heis_api_elevatortype"' in q['sql']]), 1)
+        self.assertIn('12 rader: 7 nye, 2 oppdatert, 3 med feil', out.getvalue())
+        self.assertEqual(Elevator.objects.get(serial_number='SN-0').installation_date, date(2021, 2, 2))
+        old = Elevator.objects.get(serial_number='SN-OLD')
+        self.assertEqual((old.installation_date, old.location_description), (date(2019, 5, 5), 'Gammel'))
+        self.assertEqual(Elevator.objects.filter(elevator_type=self.elevator_type).count(), 7)
+
+    def test_norwegian_names_match_regardless_of_case(self):
+        ElevatorType.objects.create(name='Løfteplattform')
+        for name in ('Østfold Heis AS', 'Østfold Heis AS', 'ØSTFOLD HEIS AS'):
+            upload = self.csv_file(f'navn;adresse;postnummer;poststed\n{name};Storgata 1;1607;Fredrikstad\n')
+            response = self.client.post('/api/imports/customers/', {'file': upload}, format='multipart')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated']), (0, 1))
+        self.assertEqual(Customer.objects.get(zip_code='1607').name, 'ØSTFOLD HEIS AS')
+
+        upload = self.csv_file('serial_number,customer,elevator_type\nSN-ØST,østfold heis as,LØFTEPLATTFORM\n')
+        response = self.client.post('/api/imports/elevators/', {'file': upload}, format='multipart')
+        self.assertEqual((response.data['created'], response.data['error_count']), (1, 0), response.data)
+        elevator = Elevator.objects.get(serial_number='SN-ØST')
+        self.assertEqual((elevator.customer.zip_code, elevator.elevator_type.name), ('1607', 'Løfteplattform'))
+
+    def test_customer_names_are_looked_up_per_chunk(self):
+        Customer.objects.bulk_create([
+            Customer(name=f'Annen {index}', name_folded=f'annen {index}', address='Vei', zip_code='0150', city='Oslo')
+            for index in range(50)
+        ])
+        renamed = Customer.objects.create(name='Gammelt Navn', address='Vei 1', zip_code='5003', city='Bergen')
+        renamed.name = 'Åsen Heis'
+        renamed.save(update_fields=['name'])
+        rows = ['serial_number,customer'] + [f'SN-C{index},{name}' for index, name in
+                                             enumerate(['kunde as', 'ÅSEN HEIS', 'Kunde AS', 'Gammelt Navn'])]
+        with CaptureQueriesContext(connection) as queries:
+            result = importer.ElevatorImporter(chunk_size=2).run(importer.read_csv(StringIO('\n'.join(rows))))
+        self.assertEqual((result.created, result.error_count), (3, 1))
+        self.assertEqual(Elevator.objects.get(serial_number='SN-C1').customer, renamed)
+        # Én navneoppslag per bolk, begrenset til navnene i bolken
+        lookups = [q['sql'] for q in queries.captured_queries
+                   if 'FROM "heis_api_customer"' in q['sql'] and 'name_folded' in q['sql']]
+        self.assertEqual(len(lookups), 2)
+        self.assertTrue(all('"heis_api_customer"."name_folded" IN' in sql for sql in lookups))
+
+        upload = self.csv_file('navn;adresse;postnummer;poststed\nåsen heis;Vei 2;5003;Bergen\n')
+        response = self.client.post('/api/imports/customers/', {'file': upload}, format='multipart')
+        self.assertEqual((response.data['created'], response.data['updated']), (0, 1))
+        renamed.refresh_from_db()
+        self.assertEqual((renamed.name, renamed.name_folded), ('åsen heis', 'åsen heis'))
+
+    def test_dry_run_writes_nothing(self):
+        upload = self.csv_file('serial_number,customer_id\nSN-NEW,%d\n' % self.customer.pk)
+        response = self.client.post('/api/imports/elevators/?dry_run=true', {'file': upload}, format='multipart')
+        self.assertEqual((response.data['dry_run'], response.data['created']), (True, 1))
+        self.assertFalse(Elevator.objects.filter(serial_number='SN-NEW').exists())
+
+    def test_bad_files_are_rejected(self):
+        response = self.client.post('/api/imports/elevators/', {'file': self.csv_file('navn\nx\n')},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/imports/customers/', {'file': self.csv_file('x', 'data.pdf')},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(self.tech1)
+        response = self.client.post('/api/imports/customers/', {'file': self.csv_file('navn\n')}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+
+
+class ExportTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.elevator = Elevator.objects.create(customer=cls.customer, serial_number='SN-EXP')
+        for index in range(5):
+            cls.make_assignment(cls, title=f'Eksport {index}', elevator=cls.elevator,
+                                status='completed' if index % 2 else 'pending')
+        order = Order.objects.create(customer=cls.customer, order_date=date(2024, 6, 1))
+        OrderLineItem.objects.create(order=order, quantity=2, unit_price_at_order=Decimal('150.50'))
+        Order.objects.create(customer=cls.customer, order_date=date(2023, 6, 1))
+        Service.objects.create(elevator=cls.elevator, service_date=date(2024, 3, 3), description='Årskontroll, «OK»')
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_export_streams_filtered_rows_in_chunks(self):
+        with mock.patch.object(AssignmentViewSet, 'export_chunk_size', 2):
+            response, body = self.download('/api/assignments/export/?status=pending')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="assignment-', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(body.lstrip('﻿'))))
+        self.assertEqual(rows[0][:3], ['id', 'title', 'status'])
+        self.assertEqual([row[1] for row in rows[1:]], ['Eksport 0', 'Eksport 2', 'Eksport 4'])
+        self.assertEqual(rows[1][6], 'SN-EXP')
+
+    def test_ndjson_export_uses_one_query(self):
+        response = self.client.get('/api/order-line-items/export/?output=ndjson&order__order_date__gte=2024-01-01')
+        with CaptureQueriesContext(connection) as queries:
+            lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(json.loads(lines[0])['line_total'], '301.00')
+        self.assertEqual(json.loads(lines[0])['customer_name'], 'Kunde AS')
+
+    def test_orders_and_services(self):
+        _, body = self.download('/api/orders/export/?output=ndjson&order_date__gte=2024-01-01')
+        self.assertEqual([json.loads(line)['order_date'] for line in body.splitlines()], ['2024-06-01'])
+        _, body = self.download('/api/services/export/?service_date__gte=2024-01-01')
+        self.assertIn('"Årskontroll, «OK»"', body)
+
+    def test_empty_export_has_header_and_bad_format_is_400(self):
+        _, body = self.download('/api/services/export/?service_date__gte=2030-01-01')
+        self.assertEqual(body.strip('﻿\r\n').split(','), ['id', 'service_date', 'elevator_id', 'elevator_serial',
+                                                               'customer_name', 'completed', 'description'])
+        self.assertEqual(self.client.get('/api/services/export/?output=xml').status_code, 400)
+
+
+class InspectionPlannerTests(ApiTestCase):
+    today = date(2025, 6, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.due = Elevator.objects.create(customer=cls.customer, serial_number='SN-DUE',
+                                          next_inspection_date=date(2025, 6, 20))
+        cls.overdue = Elevator.objects.create(customer=cls.customer, serial_number='SN-LATE',
+                                              next_inspection_date=date(2025, 4, 1))
+        cls.later = Elevator.objects.create(customer=cls.customer, serial_number='SN-LATER',
+                                            next_inspection_date=date(2025, 9, 1))
+        cls.unseeded = Elevator.objects.create(customer=cls.customer, serial_number='SN-SEED',
+                                               last_inspection_date=date(2024, 6, 10))
+
+    def plan(self, **kwargs):
+        return inspections.plan_inspections(today=self.today, **kwargs)
+
+    def inspection_elevators(self):
+        return sorted(Assignment.objects.filter(assignment_type='inspection').values_list('elevator__serial_number',
+                                                                                         flat=True))
+
+    def test_creates_one_inspection_per_due_elevator_idempotently(self):
+        result = self.plan()
+        self.assertEqual((result.seeded, result.created), (1, 3))
+        self.assertEqual(self.inspection_elevators(), ['SN-DUE', 'SN-LATE', 'SN-SEED'])
+        seeded = Assignment.objects.get(elevator=self.unseeded)
+        self.assertEqual((seeded.deadline_date, seeded.customer_id, seeded.status),
+                         (date(2025, 6, 10), self.customer.pk, 'pending'))
+        self.assertEqual(self.plan().created, 0)
+        self.assertEqual(Assignment.objects.count(), 3)
+
+    def test_completed_inspection_advances_dates_and_next_round_is_planned(self):
+        self.plan()
+        inspection = Assignment.objects.get(elevator=self.overdue)
+        inspection.status = 'completed'
+        inspection.completed_at = aware(date(2025, 5, 20))
+        inspection.save()
+
+        result = self.plan(horizon_days=400)
+        self.overdue.refresh_from_db()
+        self.assertEqual(result.advanced, 1)
+        self.assertEqual((self.overdue.last_inspection_date, self.overdue.next_inspection_date),
+                         (date(2025, 5, 20), date(2026, 5, 20)))
+        self.assertEqual(Assignment.objects.filter(elevator=self.overdue).count(), 2)
+        self.assertEqual(self.plan(horizon_days=400).advanced, 0)
+
+    def test_inspection_completed_through_edit_form_advances_dates(self):
+        self.plan()
+        inspection = Assignment.objects.get(elevator=self.due)
+        response = self.client.patch(reverse('assignment-detail', args=[inspection.pk]), {'status': 'completed'},
+                                     format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        inspection.refresh_from_db()
+        self.assertIsNotNone(inspection.completed_at)
+        # Eldre oppdrag fullført uten completed_at bruker updated_at
+        legacy = Assignment.objects.get(elevator=self.overdue)
+        Assignment.objects.filter(pk=legacy.pk).update(status='completed', updated_at=aware(date(2025, 5, 2)))
+
+        self.assertEqual(self.plan(horizon_days=400).advanced, 2)
+        self.due.refresh_from_db()
+        self.overdue.refresh_from_db()
+        self.assertEqual(self.due.last_inspection_date, timezone.localdate(inspection.completed_at))
+        self.assertEqual(self.overdue.next_inspection_date, date(2026, 5, 2))
+
+    def test_dry_run_and_command(self):
+        self.assertEqual(self.plan(dry_run=True).created, 2)
+        self.assertFalse(Assignment.objects.exists())
+        out = StringIO()
+        call_command('plan_inspections', stdout=out)
+        self.assertIn('kontrolloppdrag', out.getvalue())
+
+    def test_due_query_uses_index(self):
+        self.assertIn('elevator_next_inspection_idx', inspections.due_elevators(self.today).explain())
+
+
+class BackfillTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.job = backfills.BACKFILLS['assignment-deadlines']()
+        cls.assignments = [
+            Assignment(title=f'Oppdrag {index}', description='', customer=cls.customer, assignment_type='service',
+                       scheduled_date=aware(date(2025, 3, 1 + index % 28), hour=23))
+            for index in range(25)
+        ]
+        Assignment.objects.bulk_create(cls.assignments)
+        cls.correct = cls.assignments[0]
+        Assignment.objects.filter(pk=cls.correct.pk).update(deadline_date=date(2025, 3, 15))
+        cls.unscheduled = Assignment.objects.create(title='Uten dato', description='', customer=cls.customer,
+                                                    assignment_type='repair')
+
+    def deadlines(self):
+        return {pk: (scheduled, deadline) for pk, scheduled, deadline in
+                Assignment.objects.values_list('pk', 'scheduled_date', 'deadline_date')}
+
+    def assertDeadlinesFixed(self):
+        for pk, (scheduled, deadline) in self.deadlines().items():
+            if pk == self.unscheduled.pk:
+                self.assertIsNone(deadline)
+            else:
+                # 23:00 lokal tid er 22:00 UTC: fristen regnes fra den lokale datoen
+                self.assertEqual(deadline, timezone.localdate(scheduled) + timedelta(days=14))
+
+    def test_dry_run_counts_without_writing(self):
+        checkpoint = backfills.get_checkpoints(self.job, 1, dry_run=True)[0]
+        result = backfills.run_worker(self.job, checkpoint, chunk_size=10, dry_run=True)
+        self.assertEqual((result.rows, result.chunks), (24, 3))
+        self.assertFalse(BackfillCheckpoint.objects.exists())
+        self.assertEqual(Assignment.objects.filter(deadline_date__isnull=False).count(), 1)
+
+    def test_updates_in_chunks_with_checkpoint(self):
+        checkpoint = backfills.get_checkpoints(self.job, 1)[0]
+        result = backfills.run_worker(self.job, checkpoint, chunk_size=10)
+        self.assertEqual((result.rows, result.chunks, result.finished), (24, 3, True))
+        self.assertDeadlinesFixed()
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.rows_updated, checkpoint.last_pk), (24, self.assignments[-1].pk))
+        self.assertIsNotNone(checkpoint.finished_at)
+        # Ferdig sjekkpunkt: ny kjøring gjør ingenting, --restart finner ingen rader som må endres
+        self.assertEqual(backfills.run_worker(self.job, checkpoint).chunks, 0)
+        restarted = backfills.get_checkpoints(self.job, 1, restart=True)[0]
+        self.assertEqual(backfills.run_worker(self.job, restarted).rows, 0)
+
+    def test_resumes_from_checkpoint(self):
+        checkpoint = backfills.get_checkpoints(self.job, 1)[0]
+        checkpoint.last_pk = self.assignments[9].pk # Avbrutt etter første bolk
+        checkpoint.save()
+        result = backfills.run_worker(self.job, BackfillCheckpoint.objects.get(pk=checkpoint.pk), chunk_size=10)
+        self.assertEqual(result.rows, 15)
+        self.assertIsNone(Assignment.objects.get(pk=self.assignments[5].pk).deadline_date)
+
+    def test_workers_partition_pk_range(self):
+        checkpoints = backfills.get_checkpoints(self.job, 3)
+        self.assertEqual(checkpoints[0].range_start, self.assignments[0].pk)
+        self.assertEqual(checkpoints[-1].range_end, self.assignments[-1].pk)
+        for previous, current in zip(checkpoints, checkpoints[1:]):
+            self.assertEqual(current.range_start, previous.range_end + 1)
+        rows = [backfills.run_worker(self.job, checkpoint, chunk_size=4).rows for checkpoint in checkpoints]
+        self.assertEqual(sum(rows), 24)
+        self.assertDeadlinesFixed()
+        with self.assertRaises(ValueError):
+            backfills.get_checkpoints(self.job, 2)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('backfill', 'assignment-deadlines', '--dry-run', stdout=out)
+        self.assertIn('Ville oppdatert 24 rader', out.getvalue())
+        call_command('backfill', 'assignment-deadlines', '--chunk-size', '7', stdout=out)
+        self.assertIn('Oppdaterte 24 rader', out.getvalue())
+        self.assertDeadlinesFixed()
+        call_command('backfill', 'assignment-deadlines', '--workers', '2', '--worker', '1', '--restart', stdout=out)
+        self.assertIn('Oppdaterte 0 rader', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('backfill', 'assignment-deadlines', '--workers', '2', stdout=out)
+
+    def test_existing_and_inspection_deadlines_survive(self):
+        custom = self.make_assignment(scheduled_date=aware(date(2025, 3, 3)), deadline_date=date(2025, 3, 7))
+        inspection = self.make_assignment(assignment_type='inspection', scheduled_date=aware(date(2025, 3, 3)),
+                                          deadline_date=date(2025, 3, 28))
+        out = StringIO()
+        call_command('backfill', 'assignment-deadlines', stdout=out)
+        self.assertIn('Oppdaterte 24 rader', out.getvalue())
+        self.assertEqual(Assignment.objects.get(pk=custom.pk).deadline_date, date(2025, 3, 7))
+        # Kontrollfristen kobler oppdraget til kontrollrunden og skal aldri flyttes
+        call_command('backfill', 'assignment-deadlines', '--overwrite', '--restart', stdout=out)
+        self.assertIn('Oppdaterte 1 rader', out.getvalue())
+        self.assertEqual(Assignment.objects.get(pk=custom.pk).deadline_date, date(2025, 3, 17))
+        self.assertEqual(Assignment.objects.get(pk=inspection.pk).deadline_date, date(2025, 3, 28))
+
+
+class DispatchTests(ApiTestCase):
+    monday = date(2025, 6, 2)
+
+    def job(self, title, **kwargs):
+        return self.make_assignment(title=title, **kwargs)
+
+    def plan(self, days=5, capacity=1, **kwargs):
+        return dispatch.build_plan(self.monday, days, capacity, **kwargs)
+
+    def planned(self, plan):
+        return {entry.assignment_id: (entry.technician_id, timezone.localtime(entry.scheduled_date))
+                for entry in plan.planned}
+
+    def test_priority_and_deadline_get_earliest_slots(self):
+        low = self.job('Lav', priority='low')
+        urgent = self.job('Kritisk', priority='urgent')
+        early = self.job('Tidlig frist', deadline_date=self.monday)
+        late = self.job('Sen frist', deadline_date=self.monday + timedelta(days=3))
+        with self.assertNumQueries(4):
+            plan = self.plan()
+        planned = self.planned(plan)
+        # To teknikere med én plass per dag: kritisk og tidligste frist mandag, så tirsdag
+        self.assertEqual({planned[urgent.pk][1].date(), planned[early.pk][1].date()}, {self.monday})
+        self.assertEqual({planned[late.pk][1].date(), planned[low.pk][1].date()}, {self.monday + timedelta(days=1)})
+        self.assertNotEqual(planned[urgent.pk][0], planned[early.pk][0])
+        self.assertEqual(planned[urgent.pk][1].time(), dispatch.WORKDAY_START)
+
+    def test_respects_absence_existing_load_weekends_and_deadlines(self):
+        Absence.objects.create(user=self.tech1, start_date=self.monday, end_date=self.monday + timedelta(days=6),
+                               absence_type='vacation')
+        self.make_assignment(title='Opptatt', assigned_to=self.tech2, scheduled_date=aware(self.monday))
+        impossible = self.job('Umulig', deadline_date=self.monday)
+        rest = [self.job(f'Oppdrag {index}') for index in range(5)]
+        plan = self.plan(days=7, capacity=1)
+        planned = self.planned(plan)
+        self.assertEqual(plan.unplanned, [(impossible.pk, dispatch.REASON_NO_CAPACITY)] + [
+            (rest[-1].pk, dispatch.REASON_NO_CAPACITY)])
+        self.assertEqual({tech for tech, _ in planned.values()}, {self.tech2.pk})
+        # Tirsdag-fredag; lørdag og søndag er stengt
+        self.assertEqual(sorted(when.date() for _, when in planned.values()),
+                         [self.monday + timedelta(days=offset) for offset in range(1, 5)])
+        with_weekend = self.plan(days=7, capacity=1, weekdays_only=False)
+        self.assertEqual((len(with_weekend.planned), with_weekend.unplanned),
+                         (5, [(impossible.pk, dispatch.REASON_NO_CAPACITY)]))
+
+    def test_capacity_slots_and_fixed_dates(self):
+        scheduled = self.job('Fast dag', scheduled_date=aware(self.monday + timedelta(days=2), hour=13))
+        others = [self.job(f'Oppdrag {index}') for index in range(4)]
+        planned = self.planned(self.plan(days=1, capacity=2))
+        self.assertNotIn(scheduled.pk, planned)
+        self.assertEqual(sorted(when.hour for _, when in planned.values()), [8, 8, 12, 12])
+        planned = self.planned(self.plan(days=3, capacity=2))
+        self.assertEqual(planned[scheduled.pk][1], aware(self.monday + timedelta(days=2), hour=13))
+        self.assertEqual(len(planned), 5)
+        self.assertTrue(all(pk in planned for pk in (job.pk for job in others)))
+
+    def test_new_jobs_avoid_booked_times(self):
+        self.make_assignment(title='Kl. 10', assigned_to=self.tech1, scheduled_date=aware(self.monday, 10))
+        self.make_assignment(title='Kl. 8', assigned_to=self.tech2, scheduled_date=aware(self.monday, 8))
+        fixed = self.job('Fast kl. 8', scheduled_date=aware(self.monday, 8))
+        jobs = [self.job(f'Oppdrag {index}') for index in range(4)]
+        plan, applied = dispatch.dispatch(self.monday, days=1, capacity=4)
+        planned = self.planned(plan)
+        self.assertEqual((applied, plan.unplanned), (5, []))
+        # tech1 har 10-12 opptatt, tech2 8-10; det faste oppdraget går til den som er ledig kl. 8
+        self.assertEqual(planned[fixed.pk], (self.tech1.pk, aware(self.monday, 8)))
+        self.assertEqual(sorted((planned[job.pk][0], planned[job.pk][1].hour) for job in jobs),
+                         [(self.tech1.pk, 12), (self.tech1.pk, 14), (self.tech2.pk, 10), (self.tech2.pk, 12)])
+        self.assertEqual(conflicts.find_conflicts(self.monday, self.monday), [])
+
+    def test_short_slots_block_neighbours_and_apply_rejects_conflicts(self):
+        # Kapasitet 8 gir timesluker, men et oppdrag varer to timer
+        for index in range(3):
+            self.job(f'Oppdrag {index}')
+        plan = dispatch.build_plan(self.monday, 1, 8)
+        self.assertEqual(sorted(timezone.localtime(entry.scheduled_date).hour for entry in plan.planned
+                                if entry.technician_id == self.tech1.pk), [8, 10])
+        # Noen booker teknikeren mellom planlegging og lagring
+        clash = next(entry for entry in plan.planned if entry.technician_id == self.tech2.pk)
+        self.make_assignment(title='Ny', assigned_to=self.tech2, scheduled_date=clash.scheduled_date)
+        self.assertEqual(dispatch.apply_plan(plan), 2)
+        self.assertEqual(plan.unplanned, [(clash.assignment_id, dispatch.REASON_CONFLICT)])
+        self.assertIsNone(Assignment.objects.get(pk=clash.assignment_id).assigned_to_id)
+        self.assertEqual(conflicts.find_conflicts(self.monday, self.monday), [])
+
+    def test_endpoint_dry_run_and_apply(self):
+        jobs = [self.job(f'Oppdrag {index}') for index in range(3)]
+        url = reverse('assignment-auto-dispatch')
+        body = {'start': str(self.monday), 'end': str(self.monday + timedelta(days=4)), 'capacity': 2}
+        response = self.client.post(url, {**body, 'dry_run': True}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((len(response.data['planned']), response.data['applied']), (3, 0))
+        self.assertEqual(response.data['planned'][0]['assigned_to_username'], 'tech1')
+        self.assertEqual(Assignment.objects.filter(assigned_to__isnull=True).count(), 3)
+
+        response = self.client.post(url, body, format='json')
+        self.assertEqual(response.data['applied'], 3)
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertIsNotNone(job.assigned_to_id)
+            self.assertEqual(timezone.localtime(job.scheduled_date).date(), self.monday)
+        self.assertEqual(self.client.post(url, body, format='json').data['planned'], [])
+
+        self.assertEqual(self.client.post(url, {**body, 'capacity': 0}, format='json').status_code, 400)
+        self.client.force_authenticate(self.tech1)
+        self.assertEqual(self.client.post(url, body, format='json').status_code, 403)
+
+    def test_command(self):
+        self.job('Oppdrag')
+        out = StringIO()
+        call_command('dispatch_assignments', '--start', str(self.monday), '--dry-run', stdout=out)
+        self.assertIn('Ville fordelt 1 oppdrag', out.getvalue())
+        call_command('dispatch_assignments', '--start', str(self.monday), stdout=out)
+        self.assertIn('Fordelte 1 oppdrag', out.getvalue())
+        self.assertFalse(dispatch.backlog().exists())
+
+
+class CentroidTestCase(ApiTestCase):
+    """ Egen sentroidetabell for postnummer 1000-1004 og regionene 10 og 50. """
+
+    @classmethod
+    def setUpClass(cls):
+        # Punktene ligger på en linje nordover fra Oslo (0,1 grad breddegrad er ca. 11 km)
+        cls.centroid_dir = tempfile.mkdtemp()
+        cls.centroid_file = os.path.join(cls.centroid_dir, 'postnummer.csv')
+        with open(cls.centroid_file, 'w', encoding='utf-8') as handle:
+            handle.write('postnummer;sted;breddegrad;lengdegrad\n')
+            for offset in range(5):
+                handle.write(f'100{offset};Sted {offset};{60 + offset / 10};10.75\n')
+            handle.write('10;Region Oslo;60.0;10.75\n')
+            handle.write('50;Bergen;60.39;5.32\n')
+        cls.addClassCleanup(shutil.rmtree, cls.centroid_dir)
+        # Som klassekontekst, så den avsluttes etter ApiTestCase sin @override_settings
+        cls.enterClassContext(override_settings(POSTCODE_CENTROIDS_FILE=cls.centroid_file))
+        super().setUpClass()
+
+    def make_customer(self, zip_code, name='Kunde'):
+        return Customer.objects.create(name=name, address='Gate 1', zip_code=zip_code, city='By')
+
+
+class GeocodingTests(CentroidTestCase):
+
+    def test_lookup_uses_longest_prefix(self):
+        self.assertEqual(geocoding.lookup('1003'), geocoding.Location(60.3, 10.75, 'postcode'))
+        self.assertEqual(geocoding.lookup('5020').precision, 'region')
+        self.assertIsNone(geocoding.lookup('9999'))
+        self.assertIsNone(geocoding.lookup('12'))
+
+    def test_coordinates_cached_and_invalidated_on_address_change(self):
+        customer = self.make_customer('1001')
+        self.assertEqual((customer.latitude, customer.geocode_precision), (60.1, 'postcode'))
+        with mock.patch.object(geocoding, 'lookup', wraps=geocoding.lookup) as lookup:
+            customer.name = 'Nytt navn'
+            customer.save()
+            lookup.assert_not_called()
+            customer.zip_code = '5003'
+            customer.save(update_fields=['zip_code'])
+            lookup.assert_called_once_with('5003')
+        customer.refresh_from_db()
+        self.assertEqual((customer.latitude, customer.longitude, customer.geocode_precision), (60.39, 5.32, 'region'))
+
+        # bulk_update går utenom save(): nøkkelen er utdatert og oppdateres ved neste oppslag
+        Customer.objects.filter(pk=customer.pk).update(zip_code='1004')
+        customer.refresh_from_db()
+        self.assertEqual(geocoding.ensure_coordinates([customer]), [customer])
+        self.assertEqual(Customer.objects.get(pk=customer.pk).latitude, 60.4)
+        self.assertEqual(geocoding.ensure_coordinates([customer]), [])
+
+    def test_order_route_nearest_neighbour_and_two_opt(self):
+        points = [(60.2, 10.75), (60.0, 10.75), (60.4, 10.75), (60.1, 10.75), (60.3, 10.75)]
+        order, distance = geocoding.order_route(points)
+        self.assertIn([points[index][0] for index in order], ([60.0, 60.1, 60.2, 60.3, 60.4],
+                                                             [60.4, 60.3, 60.2, 60.1, 60.0]))
+        self.assertAlmostEqual(distance, geocoding.distance_km(points[1], points[2]), places=6)
+        # Fast startpunkt i sør: ruten går nordover
+        order, _ = geocoding.order_route(points, start=(59.9, 10.75))
+        self.assertEqual(order, [1, 3, 0, 4, 2])
+        # 2-opt fjerner kryssende strekninger i et kvadrat
+        square = [(0.0, 0.0), (0.0, 1.0), (1.0, 1.0), (1.0, 0.0)]
+        crossed = geocoding._two_opt(square, [0, 2, 1, 3], fixed_start=True)
+        self.assertAlmostEqual(geocoding.route_length(square, crossed),
+                               3 * geocoding.distance_km(square[0], square[1]), delta=1)
+        self.assertEqual(geocoding.order_route([]), ([], 0.0))
+
+    def test_route_endpoint(self):
+        day = date(2025, 6, 2)
+        stops = {}
+        for hour, zip_code in zip((8, 9, 10, 11), ('1004', '1000', '1002', '1001')):
+            customer = self.make_customer(zip_code, name=f'Kunde {zip_code}')
+            stops[zip_code] = self.make_assignment(customer=customer, assigned_to=self.tech1,
+                                                   scheduled_date=aware(day, hour))
+        unknown = self.make_assignment(customer=self.make_customer('9999'), assigned_to=self.tech1,
+                                       scheduled_date=aware(day, 12))
+        self.make_assignment(assigned_to=self.tech2, scheduled_date=aware(day, 8))
+
+        response = self.client.get(reverse('assignment-route'), {'date': '2025-06-02', 'assigned_to': self.tech1.pk,
+                                                                  'start_zip': '1000'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([stop['assignment'] for stop in response.data['stops']],
+                         [stops[code].pk for code in ('1000', '1001', '1002', '1004')] + [unknown.pk])
+        self.assertAlmostEqual(response.data['distance_km'],
+                               round(geocoding.distance_km((60.0, 10.75), (60.4, 10.75)), 1))
+
+        self.assertEqual(response.data['unrouted'], 1)
+
+        self.client.force_authenticate(self.tech2)
+        response = self.client.get(reverse('assignment-route'), {'date': '2025-06-02'})
+        self.assertEqual((len(response.data['stops']), response.data['distance_km']), (1, 0))
+        self.assertEqual(self.client.get(reverse('assignment-route'), {'start_zip': '9999'}).status_code, 400)
+
+    def test_route_does_not_order_region_centroids(self):
+        # Alle kundene i region 50 deler sentroide: ingen rekkefølge å foreslå
+        day = date(2025, 6, 2)
+        jobs = [self.make_assignment(customer=self.make_customer(zip_code), assigned_to=self.tech1,
+                                     scheduled_date=aware(day, hour))
+                for hour, zip_code in ((8, '5099'), (10, '5003'), (12, '1000'))]
+        response = self.client.get(reverse('assignment-route'), {'date': '2025-06-02', 'assigned_to': self.tech1.pk})
+        self.assertEqual([stop['assignment'] for stop in response.data['stops']], [jobs[2].pk, jobs[0].pk, jobs[1].pk])
+        self.assertEqual(response.data['unrouted'], 2)
+        self.assertEqual([stop['geocode_precision'] for stop in response.data['stops']],
+                         ['postcode', 'region', 'region'])
+        response = self.client.get(reverse('assignment-route'), {'start_zip': '5000'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProximityTests(CentroidTestCase):
+    def setUp(self):
+        super().setUp()
+        proximity.index.built_at = None
+
+    def make_elevator(self, customer, serial_number):
+        return Elevator.objects.create(customer=customer, serial_number=serial_number)
+
+    def nearby(self, **params):
+        response = self.client.get(reverse('elevator-nearby'), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['serial_number'] for row in response.data['results']]
+
+    def test_radius_search_and_incremental_updates(self):
+        south, middle = self.make_customer('1000', 'Sør'), self.make_customer('1001', 'Midt')
+        self.make_elevator(south, 'SN-SOR')
+        self.make_elevator(middle, 'SN-MIDT')
+        self.make_elevator(self.make_customer('5000', 'Bergen'), 'SN-BERGEN')
+        # Kunde fra bulk_create (ikke geokodet ennå) tas med når indeksen bygges
+        bulk = Customer.objects.bulk_create([Customer(name='Bulk', address='Vei 2', zip_code='1000', city='By')])[0]
+        self.make_elevator(bulk, 'SN-BULK')
+
+        self.assertEqual(self.nearby(lat=60.0, lon=10.75), ['SN-SOR', 'SN-BULK'])
+        self.assertEqual(self.nearby(lat=60.0, lon=10.75, radius=12), ['SN-SOR', 'SN-BULK', 'SN-MIDT'])
+        self.assertEqual(self.nearby(elevator=Elevator.objects.get(serial_number='SN-MIDT').pk, radius=12, limit=2),
+                         ['SN-MIDT', 'SN-SOR'])
+        # Bergen er bare plassert på region og er ikke med i søket
+        with self.assertNumQueries(0):
+            self.assertEqual(proximity.nearby_elevators(60.39, 5.32), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new = self.make_elevator(middle, 'SN-NY')
+            south.zip_code = '1004'
+            south.save()
+        self.assertEqual(self.nearby(lat=60.1, lon=10.75, radius=1), ['SN-MIDT', 'SN-NY'])
+        self.assertEqual(self.nearby(lat=60.4, lon=10.75, radius=1), ['SN-SOR'])
+        with self.captureOnCommitCallbacks(execute=True):
+            new.delete()
+            middle.delete()
+        self.assertEqual(self.nearby(lat=60.1, lon=10.75, radius=1), [])
+
+    def test_validation(self):
+        url = reverse('elevator-nearby')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'lat': 'x', 'lon': 10}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'lat': 60, 'lon': 10, 'radius': 500}).status_code, 400)
+        elevator = self.make_elevator(self.make_customer('9999'), 'SN-UKJENT')
+        self.assertEqual(self.client.get(url, {'elevator': elevator.pk}).status_code, 400)
+        elevator = self.make_elevator(self.make_customer('5000'), 'SN-REGION')
+        self.assertEqual(self.client.get(url, {'elevator': elevator.pk}).status_code, 400)
+        response = self.client.get(reverse('elevator-nearest-technicians', args=[elevator.pk]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_nearest_available_technician(self):
+        day = date(2025, 6, 2)
+        tech3 = User.objects.create_user('tech3', 'tech3@example.com', 'pw', role='tekniker')
+        absent = User.objects.create_user('tech4', 'tech4@example.com', 'pw', role='tekniker')
+        Absence.objects.create(user=absent, start_date=day, end_date=day, absence_type='sick_leave')
+        target = self.make_elevator(self.make_customer('1000'), 'SN-HAST')
+        self.make_assignment(customer=self.make_customer('1003'), assigned_to=self.tech1, scheduled_date=aware(day))
+        self.make_assignment(customer=self.make_customer('1001'), assigned_to=self.tech2, scheduled_date=aware(day))
+        # Regionsentroiden til tech1s andre oppdrag sier ingenting om hvor teknikeren er
+        self.make_assignment(customer=self.make_customer('1099'), assigned_to=self.tech1, scheduled_date=aware(day, 12))
+        self.make_assignment(customer=self.make_customer('1000'), assigned_to=absent, scheduled_date=aware(day))
+        self.make_assignment(customer=self.make_customer('1000'), assigned_to=tech3,
+                             scheduled_date=aware(day + timedelta(days=1)))
+
+        response = self.client.get(reverse('elevator-nearest-technicians', args=[target.pk]), {'date': '2025-06-02'})
+        self.assertEqual(response.status_code, 200, response.content)
+        ranked = response.data['technicians']
+        self.assertEqual([entry['username'] for entry in ranked], ['tech2', 'tech1', 'tech3'])
+        self.assertAlmostEqual(ranked[0]['distance_km'], 11.1, delta=0.1)
+        self.assertEqual((ranked[2]['distance_km'], ranked[2]['assignments_today']), (None, 0))
+
+
+class ShippedCentroidTests(ApiTestCase):
+    """ Mot den medfølgende postnummertabellen (GeoNames). """
+
+    def setUp(self):
+        super().setUp()
+        proximity.index.built_at = None
+
+    def make_customer(self, zip_code, name='Kunde'):
+        return Customer.objects.create(name=name, address='Gate 1', zip_code=zip_code, city='By')
+
+    def test_table_has_every_postcode_and_flags_city_centres(self):
+        table = geocoding.centroids()
+        self.assertGreater(sum(1 for key in table if len(key) == 4), 5000)
+        self.assertEqual(geocoding.lookup('1300'), geocoding.Location(59.8979, 10.4906, 'postcode'))
+        # GeoNames har ett punkt for hele Oslo: ikke presist nok for ruter
+        self.assertEqual(geocoding.lookup('0150').precision, geocoding.PLACE)
+        # Postnummer som mangler i tabellen faller tilbake på regionen
+        self.assertEqual(geocoding.lookup('1999').precision, 'region')
+
+    def test_route_and_nearby_with_real_postcodes(self):
+        day = date(2025, 6, 2)
+        # Vest-øst: Asker, Sandvika, Bekkestua, Lørenskog; planlagt i annen rekkefølge
+        stops = {}
+        for hour, zip_code in zip((8, 10, 12, 14), ('1473', '1300', '1383', '1357')):
+            stops[zip_code] = self.make_assignment(customer=self.make_customer(zip_code), assigned_to=self.tech1,
+                                                   scheduled_date=aware(day, hour))
+        city = self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(day, 16)) # Kunde AS i Oslo
+        response = self.client.get(reverse('assignment-route'), {'date': '2025-06-02', 'assigned_to': self.tech1.pk,
+                                                                  'start_zip': '1384'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([stop['assignment'] for stop in response.data['stops']],
+                         [stops[code].pk for code in ('1383', '1300', '1357', '1473')] + [city.pk])
+        self.assertEqual(response.data['unrouted'], 1)
+        self.assertGreater(response.data['distance_km'], 20)
+
+        sandvika = Elevator.objects.create(customer=stops['1300'].customer, serial_number='SN-SANDVIKA')
+        Elevator.objects.create(customer=stops['1357'].customer, serial_number='SN-BEKKESTUA')
+        Elevator.objects.create(customer=self.make_customer('1530'), serial_number='SN-MOSS')
+        Elevator.objects.create(customer=self.customer, serial_number='SN-OSLO')
+        response = self.client.get(reverse('elevator-nearby'), {'elevator': sandvika.pk, 'radius': 7})
+        self.assertEqual([row['serial_number'] for row in response.data['results']], ['SN-SANDVIKA', 'SN-BEKKESTUA'])
+
+    def test_new_table_version_regeocodes(self):
+        Customer.objects.filter(pk=self.customer.pk).update(geocode_key='1300', latitude=0, longitude=0)
+        customer = Customer.objects.get(pk=self.customer.pk)
+        self.assertEqual(geocoding.ensure_coordinates([customer]), [customer])
+        self.assertEqual((customer.latitude, customer.geocode_precision), (59.9127, geocoding.PLACE))
+        self.assertTrue(Customer.objects.get(pk=customer.pk).geocode_key.endswith(geocoding.key_suffix()))
+
+    def test_build_command_from_geonames_dump(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source, output = os.path.join(directory, 'NO.txt'), os.path.join(directory, 'postnummer.csv')
+        with open(source, 'w', encoding='utf-8') as handle:
+            for code in range(12):
+                handle.write(f'NO\t70{code:02d}\tTrondheim\tTrøndelag\t50\t\t\t\t\t63.4305\t10.3951\t4\n')
+            handle.write('NO\t7100\tRissa\tTrøndelag\t50\t\t\t\t\t63.5833\t9.9667\t4\n')
+        out = StringIO()
+        call_command('build_postcode_centroids', source, '--output', output, stdout=out)
+        self.assertIn('Skrev 13 postnummer (12 bare med bysentrum) og 2 regioner', out.getvalue())
+        with override_settings(POSTCODE_CENTROIDS_FILE=output):
+            self.assertEqual(geocoding.lookup('7005').precision, geocoding.PLACE)
+            self.assertEqual(geocoding.lookup('7100'), geocoding.Location(63.5833, 9.9667, 'postcode'))
+            self.assertEqual(geocoding.lookup('7199').precision, 'region')
+
+
+class AbsenceTests(ApiTestCase):
+    def absence(self, user, start, end, absence_type='vacation'):
+        return Absence.objects.create(user=user, start_date=start, end_date=end, absence_type=absence_type)
+
+    def test_overlap_is_rejected_by_model_and_api(self):
+        self.absence(self.tech1, date(2025, 3, 3), date(2025, 3, 7))
+        with self.assertRaises(DjangoValidationError):
+            self.absence(self.tech1, date(2025, 3, 7), date(2025, 3, 10))
+        with self.assertRaises(DjangoValidationError):
+            self.absence(self.tech1, date(2025, 3, 1), date(2025, 3, 20))
+        response = self.client.post(reverse('absence-list'), {
+            'user': self.tech1.pk, 'start_date': '2025-03-05', 'end_date': '2025-03-05', 'absence_type': 'sick_leave',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Overlapper', str(response.data['non_field_errors'][0]))
+        response = self.client.post(reverse('absence-list'), {
+            'user': self.tech1.pk, 'start_date': '2025-03-09', 'end_date': '2025-03-08', 'absence_type': 'vacation',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('end_date', response.data)
+        # Tilstøtende perioder og andre brukere er lov
+        self.absence(self.tech1, date(2025, 3, 8), date(2025, 3, 8))
+        self.absence(self.tech2, date(2025, 3, 3), date(2025, 3, 7))
+        self.assertEqual(Absence.objects.count(), 3)
+
+    def test_update_does_not_overlap_itself(self):
+        first = self.absence(self.tech1, date(2025, 3, 3), date(2025, 3, 7))
+        self.absence(self.tech1, date(2025, 3, 10), date(2025, 3, 14))
+        url = reverse('absence-detail', args=[first.pk])
+        response = self.client.patch(url, {'end_date': '2025-03-09'})
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.patch(url, {'end_date': '2025-03-10'})
+        self.assertEqual(response.status_code, 400)
+        first.refresh_from_db()
+        self.assertEqual(first.end_date, date(2025, 3, 9))
+
+    def test_interval_list(self):
+        intervals = absences.IntervalList([
+            (date(2025, 3, 10), date(2025, 3, 12), 'b'),
+            (date(2025, 3, 1), date(2025, 3, 3), 'a'),
+            (date(2025, 3, 20), date(2025, 3, 20), 'c'),
+        ])
+        self.assertEqual([data for _, _, data in intervals.overlapping(date(2025, 3, 3), date(2025, 3, 10))],
+                         ['a', 'b'])
+        self.assertEqual(intervals.overlapping(date(2025, 3, 13), date(2025, 3, 19)), [])
+        self.assertEqual(intervals.free_days(date(2025, 3, 11), date(2025, 3, 14)),
+                         [date(2025, 3, 13), date(2025, 3, 14)])
+
+    def test_free_days_and_absent_endpoints(self):
+        self.absence(self.tech1, date(2025, 2, 20), date(2025, 3, 2))
+        self.absence(self.tech1, date(2025, 3, 4), date(2025, 3, 4), 'sick_leave')
+        self.absence(self.tech1, date(2025, 4, 1), date(2025, 4, 5))
+        self.absence(self.tech2, date(2025, 3, 5), date(2025, 3, 5))
+        self.assertEqual(absences.free_days(self.tech1.pk, date(2025, 3, 1), date(2025, 3, 5)),
+                         [date(2025, 3, 3), date(2025, 3, 5)])
+
+        response = self.client.get(reverse('absence-free-days'),
+                                   {'user': self.tech1.pk, 'start': '2025-03-01', 'end': '2025-03-05'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['free_days'], [date(2025, 3, 3), date(2025, 3, 5)])
+        self.assertEqual(response.data['absent_days'], 3)
+        self.assertEqual(self.client.get(reverse('absence-free-days')).status_code, 400)
+
+        response = self.client.get(reverse('absence-absent'), {'start': '2025-03-04', 'end': '2025-03-05'})
+        self.assertEqual(response.status_code, 200, response.content)
+        by_user = {entry['username']: entry['absences'] for entry in response.data['users']}
+        self.assertEqual(set(by_user), {'tech1', 'tech2'})
+        self.assertEqual([row['absence_type'] for row in by_user['tech1']], ['sick_leave'])
+
+    def test_migration_stops_on_legacy_overlaps(self):
+        migration = import_module('heis_api.migrations.0028_absence_user_period')
+        self.absence(self.tech2, date(2025, 3, 1), date(2025, 3, 2))
+        migration.check_existing_absences(apps, None)
+        # Eldre rader lagret uten kontrollen (bulk_create kaller ikke save())
+        long, inside = Absence.objects.bulk_create([
+            Absence(user=self.tech1, start_date=date(2025, 3, 1), end_date=date(2025, 3, 20), absence_type='vacation'),
+            Absence(user=self.tech1, start_date=date(2025, 3, 5), end_date=date(2025, 3, 6), absence_type='other'),
+        ])
+        with self.assertRaisesMessage(RuntimeError, f'#{inside.pk} (2025-03-05 - 2025-03-06) overlapper #{long.pk}'):
+            migration.check_existing_absences(apps, None)
+
+    def test_overlap_check_uses_user_period_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Planen sjekkes bare på SQLite')
+        self.absence(self.tech1, date(2025, 3, 3), date(2025, 3, 7))
+        candidate = Absence(user=self.tech1, start_date=date(2025, 3, 6), end_date=date(2025, 3, 9))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNotNone(candidate.overlapping())
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + queries.captured_queries[0]['sql'])
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('absence_user_period_idx', plan)
+
+
+class ConflictTests(QueryBudgetTestMixin, ApiTestCase):
+    day = date(2025, 6, 2)
+
+    def payload(self, hour, **kwargs):
+        item = {'title': 'Service', 'description': 'Service', 'customer': self.customer.pk, 'assigned_to': self.tech1.pk,
+                'assignment_type': 'service', 'scheduled_date': aware(self.day, hour).isoformat()}
+        item.update(kwargs)
+        return item
+
+    def test_create_rejects_double_booking_and_absence(self):
+        existing = self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(self.day, 9))
+        url = reverse('assignment-list')
+        response = self.client.post(url, self.payload(10), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'#{existing.pk}', response.data['scheduled_date'][0])
+        # Tilstøtende luke, annen tekniker og avlyst oppdrag er lov
+        self.assertEqual(self.client.post(url, self.payload(11), format='json').status_code, 201)
+        self.assertEqual(self.client.post(url, self.payload(9, assigned_to=self.tech2.pk), format='json').status_code,
+                         201)
+        self.assertEqual(self.client.post(url, self.payload(9, status='cancelled'), format='json').status_code, 201)
+
+        Absence.objects.create(user=self.tech2, start_date=self.day + timedelta(days=1),
+                               end_date=self.day + timedelta(days=2), absence_type='vacation')
+        response = self.client.post(url, self.payload(23, assigned_to=self.tech2.pk), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fravær (Ferie) 03.06.2025-04.06.2025', response.data['scheduled_date'][0])
+        response = self.client.post(f'{url}?allow_conflicts=true', self.payload(23, assigned_to=self.tech2.pk),
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_update_checks_only_schedule_changes(self):
+        first = self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(self.day, 9))
+        second = self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(self.day, 13))
+        response = self.client.patch(reverse('assignment-detail', args=[second.pk]),
+                                     {'scheduled_date': aware(self.day, 10).isoformat()}, format='json')
+        self.assertEqual(response.status_code, 400)
+        # Å flytte oppdraget innen sin egen luke kolliderer ikke med seg selv
+        response = self.client.patch(reverse('assignment-detail', args=[first.pk]),
+                                     {'scheduled_date': aware(self.day, 8).isoformat()}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        # Eksisterende konflikter stopper ikke andre endringer
+        Assignment.objects.filter(pk=second.pk).update(scheduled_date=aware(self.day, 9))
+        response = self.client.patch(reverse('assignment-detail', args=[second.pk]), {'title': 'Nytt navn'},
+                                     format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_bulk_checks_items_against_each_other(self):
+        items = [self.payload(9), self.payload(12), self.payload(10)]
+        response = self.client.post('/api/assignments/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([row['index'] for row in response.data], [0, 2], response.data)
+        self.assertEqual(response.data[0]['errors']['scheduled_date'], ['Kolliderer med element 2 i forespørselen.'])
+        self.assertFalse(Assignment.objects.exists())
+
+    def test_sweep(self):
+        start = aware(self.day, 8)
+
+        def booking(pk, hour, hours=2, kind='assignment'):
+            return conflicts.Booking(kind, pk, self.tech1.pk, start + timedelta(hours=hour),
+                                     start + timedelta(hours=hour + hours))
+
+        found = conflicts.sweep([
+            booking(1, 0), booking(2, 2), booking(3, 3), booking(4, 1, hours=6),
+            booking(5, 9, hours=24, kind='absence'), booking(6, 10),
+        ])
+        pairs = sorted((conflict.first.pk, conflict.second.pk) for conflict in found)
+        self.assertEqual(pairs, [(1, 4), (2, 3), (4, 2), (4, 3), (5, 6)])
+        self.assertEqual([conflict.type for conflict in found if conflict.first.pk == 5], [conflicts.DURING_ABSENCE])
+
+    def test_conflict_report_in_constant_queries(self):
+        for index in range(20):
+            day = self.day + timedelta(days=index)
+            self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(day, 9))
+            self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(day, 10))
+            self.make_assignment(assigned_to=self.tech2, scheduled_date=aware(day, 9))
+        Absence.objects.create(user=self.tech2, start_date=self.day, end_date=self.day + timedelta(days=4),
+                               absence_type='sick_leave')
+        self.make_assignment(assigned_to=self.tech1, scheduled_date=aware(self.day - timedelta(days=1), 9))
+        url = reverse('assignment-conflict-report')
+        with self.assertQueryBudget(2, max_repeats=1):
+            response = self.client.get(url, {'start': '2025-06-02', 'end': '2025-06-30'})
+        self.assertEqual(response.status_code, 200)
+        by_type = {}
+        for conflict in response.data['conflicts']:
+            by_type[conflict['type']] = by_type.get(conflict['type'], 0) + 1
+        self.assertEqual(by_type, {conflicts.DOUBLE_BOOKING: 20, conflicts.DURING_ABSENCE: 5})
+        response = self.client.get(url, {'start': '2025-06-02', 'end': '2025-06-02', 'assigned_to': self.tech2.pk})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['conflicts'][0]['absence'], Absence.objects.get().pk)
+        self.assertEqual(self.client.get(url, {'assigned_to': 'x'}).status_code, 400)
@@ -0,0 +1,146 @@
+"""
+Typeahead (autofullfør) for nedtrekkslister uten databaseoppslag per tastetrykk.
+
+Hver prosess holder en sortert liste av (nøkkel, pk) per type, der nøklene er
+normaliserte verdier fra start av hvert ord ("kunde as", "as"). Et prefiks slås
+opp med bisect og leses sekvensielt til nøkkelen ikke lenger starter med
+prefikset. Indeksen bygges ved første oppslag og oppdateres deretter per
+objekt fra signalene (etter commit). Andre prosesser får endringene ved neste
+fulle oppfrisking, som skjer etter REFRESH_SECONDS.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from .models import Customer, Elevator, ElevatorType, Part
+from .stemmer import tokenize
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+REFRESH_SECONDS = 300
+
+
+def normalize(value):
+    return ' '.join(tokenize(str(value)))
+
+
+def word_keys(value):
+    """ Nøkler for prefikssøk fra start av hvert ord: 'Kunde AS' -> ['kunde as', 'as']. """
+    words = tokenize(str(value))
+    return [' '.join(words[index:]) for index in range(len(words))]
+
+
+class PrefixIndex:
+    """ Sortert liste av (nøkkel, pk) med innsetting/fjerning per objekt. """
+
+    def __init__(self, source):
+        self.source = source
+        self.lock = threading.Lock()
+        self.keys = []
+        self.items = {} # pk -> (nøkler, data)
+        self.built_at = None
+
+    def build(self):
+        keys, items = [], {}
+        for row in self.source.model._default_manager.values(*self.source.fields).iterator(chunk_size=2000):
+            entry_keys = self.source.keys_for(row)
+            items[row['id']] = (entry_keys, row)
+            keys += [(key, row['id']) for key in entry_keys]
+        keys.sort()
+        with self.lock:
+            self.keys, self.items, self.built_at = keys, items, time.monotonic()
+
+    def ensure_fresh(self):
+        if self.built_at is None or time.monotonic() - self.built_at > REFRESH_SECONDS:
+            self.build()
+
+    def add(self, row):
+        with self.lock:
+            self._remove(row['id'])
+            entry_keys = self.source.keys_for(row)
+            self.items[row['id']] = (entry_keys, row)
+            for key in entry_keys:
+                insort(self.keys, (key, row['id']))
+
+    def remove(self, pk):
+        with self.lock:
+            self._remove(pk)
+
+    def _remove(self, pk):
+        entry = self.items.pop(pk, None)
+        if entry is None:
+            return
+        for key in entry[0]:
+            index = bisect_left(self.keys, (key, pk))
+            if index < len(self.keys) and self.keys[index] == (key, pk):
+                del self.keys[index]
+
+    def search(self, prefix, limit=DEFAULT_LIMIT):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self.lock:
+            index = bisect_left(self.keys, (prefix,))
+            while index < len(self.keys) and len(results) < limit:
+                key, pk = self.keys[index]
+                if not key.startswith(prefix):
+                    break
+                if pk not in seen:
+                    seen.add(pk)
+                    results.append(self.items[pk][1])
+                index += 1
+        return results
+
+
+class TypeaheadSource:
+    def __init__(self, model, search_fields, fields):
+        self.model = model
+        self.search_fields = search_fields
+        self.fields = ('id', *fields)
+        self.index = PrefixIndex(self)
+
+    def keys_for(self, row):
+        keys = []
+        for name in self.search_fields:
+            if row.get(name):
+                keys += word_keys(row[name])
+        return list(dict.fromkeys(keys))
+
+    def row_for(self, instance):
+        return {name: getattr(instance, 'pk' if name == 'id' else name) for name in self.fields}
+
+
+SOURCES = {
+    'customers': TypeaheadSource(Customer, ('name',), ('name', 'city')),
+    'elevators': TypeaheadSource(Elevator, ('serial_number',), ('serial_number', 'customer_id', 'elevator_type_id')),
+    'elevator-types': TypeaheadSource(ElevatorType, ('name',), ('name', 'price')),
+    'parts': TypeaheadSource(Part, ('part_number', 'name'), ('part_number', 'name', 'price')),
+}
+SOURCES_BY_MODEL = {source.model: source for source in SOURCES.values()}
+
+
+def search(kind, prefix, limit=DEFAULT_LIMIT):
+    index = SOURCES[kind].index
+    index.ensure_fresh()
+    return index.search(prefix, limit)
+
+
+def handle_saved(instance):
+    source = SOURCES_BY_MODEL.get(type(instance))
+    # Ikke bygget ennå i denne prosessen: bygges fullt ved første oppslag uansett
+    if source is not None and source.index.built_at is not None:
+        source.index.add(source.row_for(instance))
+
+
+def handle_deleted(model, pk):
+    source = SOURCES_BY_MODEL.get(model)
+    if source is not None and source.index.built_at is not None:
+        source.index.remove(pk)
+
+
+def invalidate(model):
+    """ Etter masseskriving uten signaler: indeksen bygges på nytt ved neste oppslag. """
+    source = SOURCES_BY_MODEL.get(model)
+    if source is not None:
+        source.index.built_at = None
@@ -7,8 +7,8 @@ from .views import (
     AssignmentNoteViewSet, AssignmentChecklistViewSet, ReportViewSet,
     SalesOpportunityViewSet, QuoteViewSet, QuoteLineItemViewSet,
     QuotePDFView, OrderViewSet, OrderLineItemViewSet,
-    AbsenceViewSet,
-    ProjectSummaryViewSet
+    AbsenceViewSet, AvailabilityViewSet, ServiceViewSet, SellerDashboardView,
+    ProjectSummaryViewSet, TypeaheadView, ImportView
 )
 
 router = DefaultRouter()
@@ -27,6 +27,8 @@ router.register(r'quote-line-items', QuoteLineItemViewSet)
 router.register(r'orders', OrderViewSet)
 router.register(r'order-line-items', OrderLineItemViewSet)
 router.register(r'absences', AbsenceViewSet)
+router.register(r'services', ServiceViewSet)
+router.register(r'availability', AvailabilityViewSet, basename='availability')
 router.register(r'project-summary', ProjectSummaryViewSet, basename='project-summary')
 
 urlpatterns = [
@@ -35,4 +37,7 @@ urlpatterns = [
     path('api-token-auth/', obtain_auth_token, name='api_token_auth'),
     path('assignments/<int:assignment_pk>/checklist/', AssignmentChecklistViewSet.as_view(), name='assignment-checklist-detail'),
     path('quotes/<int:quote_id>/pdf/', QuotePDFView.as_view(), name='quote-pdf'),
+    path('dashboard/seller/', SellerDashboardView.as_view(), name='seller-dashboard'),
+    path('typeahead/<str:kind>/', TypeaheadView.as_view(), name='typeahead'),
+    path('imports/<str:kind>/', ImportView.as_view(), name='import'),
 ]
\ No newline at end of file
@@ -4,29 +4,48 @@ from rest_framework.response import Response
 from django.utils import timezone
 from django.db.models import Q
 from .models import User, Customer, ElevatorType, Elevator, Assignment, AssignmentNote, Part, AssignmentPart, AssignmentChecklist, Report, SalesOpportunity, Quote, QuoteLineItem, Order, OrderLineItem, Absence
+from .models import QuotePDFBatchJob, Service, order_totals_batch, mark_order_total_dirty
 from .serializers import (
     UserSerializer, CustomerSerializer, CustomerDetailSerializer,
     ElevatorTypeSerializer, ElevatorSerializer, ElevatorDetailSerializer,
     PartSerializer, AssignmentPartSerializer, AssignmentNoteSerializer,
     AssignmentSerializer, AssignmentDetailSerializer, AssignmentChecklistSerializer,
     ReportSerializer, SalesOpportunitySerializer, QuoteSerializer, QuoteLineItemSerializer,
-    OrderSerializer, OrderLineItemSerializer, AbsenceSerializer, ProjectSummarySerializer
+    OrderSerializer, OrderLineItemSerializer, AbsenceSerializer, ProjectSummarySerializer,
+    QuotePDFBatchJobSerializer, ServiceSerializer
 )
+import copy
 import os
 from django.conf import settings
 from django.db.models import Q
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.serializers import as_serializer_error
 from rest_framework.generics import RetrieveUpdateAPIView
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
+from django.http import HttpResponse, FileResponse
 from django.shortcuts import get_object_or_404
-from io import BytesIO
 from django.views import View
 from django.db import transaction
-from django.db.models import OuterRef, Subquery, F, Max, Value, CharField
+from django.db.models import OuterRef, Subquery, F, Max, Value, CharField, Count, Sum, DecimalField
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.views import APIView
 from django.db.models.functions import Coalesce
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+import hashlib
+from .availability import build_availability_matrix, parse_date_range, day_bounds
+from .quote_pdf import QuotePDFError, get_cached_quote_pdf, pdf_filename, quote_pdf_queryset
+from .quote_pdf_batch import enqueue_batch_job
+from .query_planner import QueryPlannerMixin
+from .pagination import KeysetPagination
+from .streaming import ListActionMixin, TRUE_VALUES
+from .search import FullTextSearchFilter
+from .bulk import BulkWriteMixin
+from .exports import ExportActionMixin
+from .importer import IMPORTERS, ImportFileError, import_file
+from . import absences, conflicts, dispatch, geocoding, proximity, typeahead
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -34,7 +53,43 @@ class IsAdminOrReadOnly(permissions.BasePermission):
             return True
         return request.user.is_authenticated and request.user.role == 'admin'
 
-class UserViewSet(viewsets.ModelViewSet):
+def _float_param(params, key, minimum, maximum, default=None):
+    raw = params.get(key)
+    if raw in (None, ''):
+        if default is None:
+            raise ValidationError({key: 'Påkrevd.'})
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        value = None
+    if value is None or not minimum <= value <= maximum:
+        raise ValidationError({key: f'Må være et tall mellom {minimum} og {maximum}.'})
+    return value
+
+def _elevator_location(pk):
+    """ (breddegrad, lengdegrad) for heisen, fra kundens geokodede adresse. """
+    elevator = get_object_or_404(Elevator.objects.select_related('customer'), pk=pk)
+    geocoding.ensure_coordinates([elevator.customer])
+    if elevator.customer.latitude is None:
+        raise ValidationError({'elevator': 'Kundens postnummer kunne ikke geokodes.'})
+    if not geocoding.is_precise(elevator.customer.geocode_precision):
+        raise ValidationError({'elevator': 'Kundens postnummer er bare kjent på regionnivå; for grovt for avstander.'})
+    return elevator.customer.latitude, elevator.customer.longitude
+
+# Filtre for oppdragslister, delt mellom /assignments/ og /elevators/<id>/assignments/
+ASSIGNMENT_FILTERSET_FIELDS = {
+    'status': ['exact', 'in'],
+    'priority': ['exact', 'in'],
+    'assignment_type': ['exact', 'in'],
+    'assigned_to': ['exact'],
+    'customer': ['exact'],
+    'scheduled_date': ['gte', 'lte', 'exact', 'isnull'],
+    'deadline_date': ['gte', 'lte', 'exact', 'isnull'],
+}
+ASSIGNMENT_SEARCH_FIELDS = ['title', 'description', 'customer__name', 'elevator__serial_number']
+
+class UserViewSet(QueryPlannerMixin, ListActionMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminOrReadOnly]
@@ -74,14 +129,13 @@ class UserViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def tekniker(self, request):
-        tekniker = User.objects.filter(role='tekniker', is_active=True)
-        serializer = self.get_serializer(tekniker, many=True)
-        return Response(serializer.data)
+        tekniker = self.get_queryset().filter(role='tekniker', is_active=True).order_by('username')
+        return self.list_response(tekniker)
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(QueryPlannerMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all().order_by('name')
     serializer_class = CustomerSerializer
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['name', 'contact_person', 'email', 'phone', 'address', 'city']
     
     def get_serializer_class(self):
@@ -89,16 +143,16 @@ class CustomerViewSet(viewsets.ModelViewSet):
             return CustomerDetailSerializer
         return CustomerSerializer
 
-class ElevatorTypeViewSet(viewsets.ModelViewSet):
+class ElevatorTypeViewSet(QueryPlannerMixin, viewsets.ModelViewSet):
     queryset = ElevatorType.objects.all().order_by('name')
     serializer_class = ElevatorTypeSerializer
     permission_classes = [IsAdminOrReadOnly]
 
-class ElevatorViewSet(viewsets.ModelViewSet):
+class ElevatorViewSet(QueryPlannerMixin, ListActionMixin, viewsets.ModelViewSet):
     queryset = Elevator.objects.all()
     serializer_class = ElevatorSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
     filterset_fields = ['customer', 'elevator_type']
     search_fields = ['serial_number', 'location_description', 'customer__name']
     
@@ -107,6 +161,46 @@ class ElevatorViewSet(viewsets.ModelViewSet):
             return ElevatorDetailSerializer
         return ElevatorSerializer
     
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """
+        Heiser nær et punkt: ?lat=&lon=&radius=<km> (standard 5, maks 100)&limit=,
+        eller ?elevator=<id> for heiser nær en annen heis. Nærmeste først.
+        """
+        params = request.query_params
+        if params.get('elevator'):
+            if not params['elevator'].isdigit():
+                raise ValidationError({'elevator': 'Må være en heis-ID.'})
+            latitude, longitude = _elevator_location(params['elevator'])
+        else:
+            latitude = _float_param(params, 'lat', -90, 90)
+            longitude = _float_param(params, 'lon', -180, 180)
+        radius = _float_param(params, 'radius', 0, proximity.MAX_RADIUS_KM, default=proximity.DEFAULT_RADIUS_KM)
+        try:
+            limit = int(params.get('limit', proximity.DEFAULT_LIMIT))
+        except ValueError:
+            limit = proximity.DEFAULT_LIMIT
+        limit = max(1, min(limit, proximity.MAX_LIMIT))
+        return Response({
+            'latitude': latitude,
+            'longitude': longitude,
+            'radius_km': radius,
+            'results': proximity.nearby_elevators(latitude, longitude, radius, limit),
+        })
+
+    @action(detail=True, methods=['get'], url_path='nearest-technicians')
+    def nearest_technicians(self, request, pk=None):
+        """ Teknikere uten fravær sortert på avstand fra dagens oppdrag til heisen (?date=). """
+        day, _ = parse_date_range(request.query_params, start_key='date', end_key='date')
+        latitude, longitude = _elevator_location(pk)
+        return Response({
+            'elevator': int(pk),
+            'date': day,
+            'latitude': latitude,
+            'longitude': longitude,
+            'technicians': proximity.nearest_technicians(latitude, longitude, day),
+        })
+
     def perform_update(self, serializer):
         instance = self.get_object()
         request_data = self.request.data
@@ -125,58 +219,262 @@ class ElevatorViewSet(viewsets.ModelViewSet):
         
         serializer.save()
     
-    @action(detail=True, methods=['get'])
+    # Oppdragslisten bruker oppdragenes filtre og paginering, ikke heisenes
+    @action(detail=True, methods=['get'], pagination_class=KeysetPagination,
+            filterset_fields=ASSIGNMENT_FILTERSET_FIELDS, search_fields=ASSIGNMENT_SEARCH_FIELDS)
     def assignments(self, request, pk=None):
-        elevator = self.get_object()
-        assignments = Assignment.objects.filter(elevator=elevator)
-        serializer = AssignmentSerializer(assignments, many=True)
-        return Response(serializer.data)
+        # Ikke get_object(): filtrene for denne actionen gjelder oppdrag
+        elevator = get_object_or_404(Elevator.objects.only('pk'), pk=pk)
+        self.check_object_permissions(request, elevator)
+        assignments = self.plan_queryset(Assignment.objects.filter(elevator=elevator), AssignmentSerializer)
+        return self.list_response(assignments, AssignmentSerializer)
 
-class PartViewSet(viewsets.ModelViewSet):
+class PartViewSet(QueryPlannerMixin, viewsets.ModelViewSet):
     queryset = Part.objects.all().order_by('name')
     serializer_class = PartSerializer
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['name', 'part_number', 'description']
     permission_classes = [IsAdminOrReadOnly]
 
-class AssignmentViewSet(viewsets.ModelViewSet):
+class AssignmentViewSet(QueryPlannerMixin, ListActionMixin, BulkWriteMixin, ExportActionMixin, viewsets.ModelViewSet):
     queryset = Assignment.objects.all().order_by('-created_at')
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = {
-        'status': ['exact', 'in'],
-        'assignment_type': ['exact', 'in'],
-        'assigned_to': ['exact'],
-        'customer': ['exact'],
-        'scheduled_date': ['gte', 'lte', 'exact', 'isnull'],
-        'deadline_date': ['gte', 'lte', 'exact', 'isnull'],
-    }
-    search_fields = ['title', 'description', 'customer__name', 'elevator__serial_number']
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
+    filterset_fields = ASSIGNMENT_FILTERSET_FIELDS
+    search_fields = ASSIGNMENT_SEARCH_FIELDS
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    export_columns = [
+        ('id', 'id'), ('title', 'title'), ('status', 'status'), ('assignment_type', 'assignment_type'),
+        ('customer_id', 'customer_id'), ('customer_name', 'customer__name'),
+        ('elevator_serial', 'elevator__serial_number'), ('assigned_to', 'assigned_to__username'),
+        ('order_id', 'order_id'), ('scheduled_date', 'scheduled_date'), ('deadline_date', 'deadline_date'),
+        ('created_at', 'created_at'), ('completed_at', 'completed_at'),
+    ]
     
     def get_serializer_class(self):
-        if self.action == 'retrieve':
+        # update_procedure snevrer inn til prosedyrefeltene, som bare finnes i detaljserializeren
+        if self.action in ('retrieve', 'update_procedure'):
             return AssignmentDetailSerializer
         return AssignmentSerializer
-    
-    @action(detail=False, methods=['get'])
+
+    def perform_create(self, serializer):
+        self._save_checked(serializer)
+
+    def perform_update(self, serializer):
+        self._save_checked(serializer)
+
+    def _save_checked(self, serializer):
+        with transaction.atomic():
+            errors = self.validate_batch([(serializer.instance, serializer.validated_data)])
+            if errors:
+                raise ValidationError(errors[0]['errors'])
+            serializer.save()
+
+    def validate_batch(self, items):
+        """
+        Avviser dobbeltbooking og oppdrag under fravær (se conflicts.py) når
+        tekniker, tidspunkt eller status endres. ?allow_conflicts=true lagrer likevel.
+        """
+        if self.request.query_params.get('allow_conflicts', '').lower() in TRUE_VALUES:
+            return []
+        candidates = {}
+        for index, (instance, data) in enumerate(items):
+            if conflicts.schedule_changed(instance, data):
+                candidate = copy.copy(instance) if instance is not None else Assignment()
+                for name, value in data.items():
+                    setattr(candidate, name, value)
+                candidates[index] = candidate
+        technician_ids = {
+            candidate.assigned_to_id for candidate in candidates.values() if conflicts.is_scheduled(candidate)
+        }
+        if not technician_ids:
+            return []
+        # Låser teknikerne, så to samtidige bookinger ikke begge passerer kontrollen
+        list(User.objects.select_for_update().filter(pk__in=technician_ids).values_list('pk'))
+        return [
+            {'index': index, 'status': 'invalid', 'errors': {'scheduled_date': messages}}
+            for index, messages in sorted(conflicts.check(candidates).items())
+        ]
+
+    @action(detail=False, methods=['get'], url_path='conflicts')
+    def conflict_report(self, request):
+        """
+        Dobbeltbookinger og oppdrag under fravær som overlapper perioden
+        (?start=&end=, end inkludert), ev. for én tekniker (?assigned_to=<id>).
+        """
+        start, end = parse_date_range(request.query_params)
+        technician_ids = None
+        assigned_to = request.query_params.get('assigned_to')
+        if assigned_to:
+            if not assigned_to.isdigit():
+                return Response({'assigned_to': 'Må være en bruker-ID.'}, status=status.HTTP_400_BAD_REQUEST)
+            technician_ids = [int(assigned_to)]
+        found = [conflict.to_dict() for conflict in conflicts.find_conflicts(start, end, technician_ids)]
+        return Response({'start': start, 'end': end, 'count': len(found), 'conflicts': found})
+
+    @action(detail=False, methods=['get'], keyset_ordering=('status', 'scheduled_date', 'id'))
     def mine(self, request):
-        assignments = Assignment.objects.filter(assigned_to=request.user).order_by('status', 'scheduled_date')
-        serializer = self.get_serializer(assignments, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.get_queryset().filter(assigned_to=request.user))
     
     @action(detail=False, methods=['get'])
     def today(self, request):
-        today = timezone.now().date()
-        assignments = Assignment.objects.filter(scheduled_date=today).order_by('scheduled_time')
+        today = timezone.localdate()
+        day_start, day_end = day_bounds(today, today)
+        assignments = self.get_queryset().filter(
+            scheduled_date__gte=day_start, scheduled_date__lt=day_end
+        ).order_by('scheduled_date')
         serializer = self.get_serializer(assignments, many=True)
         return Response(serializer.data)
-    
+
     @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """
+        Kompakt kalenderfeed for synlig periode (?start=&end=, end inkludert).
+        Returnerer kun tildelte og planlagte oppdrag som overlapper perioden,
+        med feltene kalenderen viser. Støtter ETag/Last-Modified (304).
+        """
+        start, end = parse_date_range(request.query_params)
+        start_dt, end_dt = day_bounds(start, end)
+        # To disjunkte, indekserte grener: starter i vinduet, eller startet før
+        # vinduet men har frist inne i/etter det (flerdagersoppdrag)
+        queryset = Assignment.objects.filter(
+            Q(scheduled_date__gte=start_dt, scheduled_date__lt=end_dt)
+            | Q(scheduled_date__lt=start_dt, deadline_date__gte=start),
+            assigned_to__isnull=False,
+        )
+        assigned_to = request.query_params.get('assigned_to')
+        if assigned_to:
+            if not assigned_to.isdigit():
+                return Response({'assigned_to': 'Må være en bruker-ID.'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(assigned_to=assigned_to)
+
+        # Billig fingeravtrykk av vinduet: antall rader + siste endring
+        stamp = queryset.aggregate(count=Count('id'), last_modified=Max('updated_at'))
+        last_modified = stamp['last_modified']
+        etag = hashlib.md5(
+            f"{start}:{end}:{assigned_to}:{stamp['count']}:{last_modified and last_modified.isoformat()}".encode()
+        ).hexdigest()
+        last_modified_ts = last_modified.timestamp() if last_modified else None
+
+        not_modified = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified_ts)
+        if not_modified is None:
+            events = list(
+                queryset.order_by('scheduled_date').values(
+                    'id', 'title', 'status', 'assigned_to', 'scheduled_date', 'deadline_date',
+                    customer_name=F('customer__name'),
+                )
+            )
+            response = Response(events)
+        else:
+            response = not_modified
+        response['ETag'] = quote_etag(etag)
+        if last_modified_ts is not None:
+            response['Last-Modified'] = http_date(last_modified_ts)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    
+    @action(detail=False, methods=['get'], keyset_ordering=('scheduled_date', 'id'))
     def unassigned(self, request):
-        assignments = Assignment.objects.filter(assigned_to=None, status='pending').order_by('scheduled_date')
-        serializer = self.get_serializer(assignments, many=True)
-        return Response(serializer.data)
+        return self.list_response(self.get_queryset().filter(assigned_to=None, status='pending'))
     
+    @action(detail=False, methods=['get'])
+    def route(self, request):
+        """
+        Foreslått kjørerekkefølge for en teknikers oppdrag en dag:
+        ?date=YYYY-MM-DD&assigned_to=<id> (standard i dag og innlogget bruker),
+        ev. start_zip=<postnummer> for startpunktet. Oppdrag uten presise
+        koordinater (ukjent postnummer eller bare region) ordnes ikke, men kommer
+        sist i planlagt rekkefølge; antallet står i `unrouted`.
+        """
+        day, _ = parse_date_range(request.query_params, start_key='date', end_key='date')
+        assigned_to = request.query_params.get('assigned_to') or str(request.user.pk)
+        if not assigned_to.isdigit():
+            return Response({'assigned_to': 'Må være en bruker-ID.'}, status=status.HTTP_400_BAD_REQUEST)
+        start = None
+        if request.query_params.get('start_zip'):
+            start = geocoding.lookup(request.query_params['start_zip'])
+            if start is None:
+                return Response({'start_zip': 'Ukjent postnummer.'}, status=status.HTTP_400_BAD_REQUEST)
+            if not geocoding.is_precise(start.precision):
+                return Response({'start_zip': 'Postnummeret er bare kjent på regionnivå.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            start = (start.latitude, start.longitude)
+
+        day_start, day_end = day_bounds(day, day)
+        assignments = list(
+            Assignment.objects.filter(assigned_to=assigned_to, scheduled_date__gte=day_start,
+                                      scheduled_date__lt=day_end)
+            .exclude(status='cancelled').select_related('customer').order_by('scheduled_date', 'pk')
+        )
+        geocoding.ensure_coordinates({assignment.customer_id: assignment.customer for assignment in assignments}.values())
+        located = [assignment for assignment in assignments
+                   if assignment.customer.latitude is not None
+                   and geocoding.is_precise(assignment.customer.geocode_precision)]
+        order, distance = geocoding.order_route(
+            [(assignment.customer.latitude, assignment.customer.longitude) for assignment in located], start)
+        routed = {assignment.pk for assignment in located}
+        unrouted = [assignment for assignment in assignments if assignment.pk not in routed]
+        route = [located[index] for index in order] + unrouted
+        return Response({
+            'date': day,
+            'assigned_to': int(assigned_to),
+            'distance_km': round(distance, 1),
+            'unrouted': len(unrouted),
+            'stops': [
+                {
+                    'assignment': assignment.pk,
+                    'title': assignment.title,
+                    'scheduled_date': assignment.scheduled_date,
+                    'customer': assignment.customer_id,
+                    'customer_name': assignment.customer.name,
+                    'address': assignment.customer.address,
+                    'zip_code': assignment.customer.zip_code,
+                    'city': assignment.customer.city,
+                    'latitude': assignment.customer.latitude,
+                    'longitude': assignment.customer.longitude,
+                    'geocode_precision': assignment.customer.geocode_precision,
+                }
+                for assignment in route
+            ],
+        })
+
+    @action(detail=False, methods=['post'], url_path='dispatch', permission_classes=[IsAdminOrReadOnly])
+    def auto_dispatch(self, request):
+        """
+        Fordeler ufordelte oppdrag på teknikere (se dispatch.py). Body: start/end
+        (periode, standard to uker fra i dag), capacity (oppdrag per tekniker per
+        dag) og dry_run=true for bare å se planen.
+        """
+        start, end = parse_date_range(request.data, default_days=dispatch.DEFAULT_HORIZON_DAYS)
+        try:
+            capacity = int(request.data.get('capacity', dispatch.DEFAULT_CAPACITY))
+        except (TypeError, ValueError):
+            capacity = 0
+        if not 1 <= capacity <= 255:
+            return Response({'capacity': 'Må være et heltall mellom 1 og 255.'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in TRUE_VALUES
+        weekdays_only = str(request.data.get('weekdays_only', 'true')).lower() in TRUE_VALUES
+        plan, applied = dispatch.dispatch(start, (end - start).days + 1, capacity, weekdays_only, dry_run=dry_run)
+        return Response({
+            'start': plan.start,
+            'end': plan.end,
+            'dry_run': dry_run,
+            'applied': applied,
+            'planned': [
+                {
+                    'assignment': entry.assignment_id,
+                    'assigned_to': entry.technician_id,
+                    'assigned_to_username': plan.technicians[entry.technician_id],
+                    'scheduled_date': entry.scheduled_date,
+                    'deadline_date': entry.deadline_date,
+                    'priority': entry.priority,
+                }
+                for entry in plan.planned
+            ],
+            'unplanned': [{'assignment': pk, 'reason': reason} for pk, reason in plan.unplanned],
+            'technicians': dispatch.plan_summary(plan),
+        })
+
     @action(detail=True, methods=['post'])
     def add_note(self, request, pk=None):
         assignment = self.get_object()
@@ -229,21 +527,22 @@ class AssignmentViewSet(viewsets.ModelViewSet):
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class AssignmentNoteViewSet(viewsets.ModelViewSet):
+class AssignmentNoteViewSet(QueryPlannerMixin, viewsets.ModelViewSet):
     queryset = AssignmentNote.objects.all()
     serializer_class = AssignmentNoteSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class AssignmentPartViewSet(viewsets.ModelViewSet):
+class AssignmentPartViewSet(QueryPlannerMixin, viewsets.ModelViewSet):
     queryset = AssignmentPart.objects.all()
     serializer_class = AssignmentPartSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        queryset = AssignmentPart.objects.all()
+        queryset = super().get_queryset()
         assignment_id = self.request.query_params.get('assignment', None)
         if assignment_id is not None:
             queryset = queryset.filter(assignment_id=assignment_id)
@@ -296,10 +595,11 @@ class AssignmentChecklistViewSet(RetrieveUpdateAPIView):
 
         serializer.save()
 
-class ReportViewSet(viewsets.ModelViewSet):
+class ReportViewSet(QueryPlannerMixin, viewsets.ModelViewSet):
     queryset = Report.objects.all()
     serializer_class = ReportSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -311,7 +611,7 @@ class ReportViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
-class SalesOpportunityViewSet(viewsets.ModelViewSet):
+class SalesOpportunityViewSet(QueryPlannerMixin, viewsets.ModelViewSet):
     """ API endpoint som tillater salgsmuligheter å bli sett eller redigert."""
     queryset = SalesOpportunity.objects.all().order_by('-created_at')
     serializer_class = SalesOpportunitySerializer
@@ -321,18 +621,20 @@ class SalesOpportunityViewSet(viewsets.ModelViewSet):
     # filter_backends = [DjangoFilterBackend]
     # filterset_fields = ['status', 'customer']
 
-class QuoteViewSet(viewsets.ModelViewSet):
+class QuoteViewSet(QueryPlannerMixin, viewsets.ModelViewSet):
     """ API endpoint for tilbud. """
-    queryset = Quote.objects.all().prefetch_related(
-        'line_items__elevator_type', 
-        'opportunity__customer', 
-        'order'
-    ).order_by('-issue_date')
+    queryset = Quote.objects.all().order_by('-issue_date') # Relasjoner hentes etter serializeren (QueryPlannerMixin)
     serializer_class = QuoteSerializer
     permission_classes = [permissions.IsAuthenticated] # Bør justeres (f.eks. admin/selger)
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = ['status', 'opportunity', 'opportunity__customer']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = {
+        'status': ['exact'],
+        'opportunity': ['exact'],
+        'opportunity__customer': ['exact'],
+        'total_amount': ['gte', 'lte'], # Lagret totalsum, filtreres i SQL
+    }
     search_fields = ['quote_number', 'opportunity__name', 'opportunity__customer__name']
+    ordering_fields = ['issue_date', 'total_amount', 'created_at']
 
     def perform_create(self, serializer):
         quote = serializer.save() 
@@ -350,37 +652,68 @@ class QuoteViewSet(viewsets.ModelViewSet):
         if hasattr(quote, 'order') and quote.order is not None:
              return Response({'detail': 'Det finnes allerede en ordre for dette tilbudet.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        new_order = Order.objects.create(
-            quote=quote,
-            customer=quote.opportunity.customer,
-            order_date=timezone.localdate(),
-            total_amount=quote.total_amount,
-        )
+        with order_totals_batch():
+            new_order = Order.objects.create(
+                quote=quote,
+                customer=quote.opportunity.customer,
+                order_date=timezone.localdate(),
+            )
 
-        order_lines = []
-        for quote_line in quote.line_items.all():
-            if quote_line.elevator_type:
-                order_lines.append(OrderLineItem(
-                    order=new_order,
-                    elevator_type=quote_line.elevator_type,
-                    quantity=quote_line.quantity,
-                    unit_price_at_order=quote_line.elevator_type.price or 0 
-                ))
-        
-        if order_lines:
-            OrderLineItem.objects.bulk_create(order_lines)
-            calculated_total = sum(line.quantity * line.unit_price_at_order for line in order_lines)
-            if new_order.total_amount != calculated_total:
-                 print(f"Recalculating order total for order {new_order.id}. Initial: {new_order.total_amount}, Calculated: {calculated_total}")
-                 new_order.total_amount = calculated_total
-                 new_order.save()
+            order_lines = []
+            for quote_line in quote.line_items.all():
+                if quote_line.elevator_type:
+                    unit_price = quote_line.elevator_type.price or 0
+                    order_lines.append(OrderLineItem(
+                        order=new_order,
+                        elevator_type=quote_line.elevator_type,
+                        quantity=quote_line.quantity,
+                        unit_price_at_order=unit_price,
+                        line_total=quote_line.quantity * unit_price, # bulk_create kaller ikke save()
+                    ))
+
+            if order_lines:
+                OrderLineItem.objects.bulk_create(order_lines)
+            mark_order_total_dirty(new_order.id)
+        new_order.refresh_from_db(fields=['total_amount'])
 
         serializer = OrderSerializer(new_order, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class QuoteLineItemViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='pdf-batch')
+    def pdf_batch(self, request):
+        """ Starter bakgrunnsrendering av mange tilbud. Returnerer jobben (202). """
+        serializer = QuotePDFBatchJobSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        quote_ids = serializer.validated_data['quote_ids']
+        missing = set(quote_ids) - set(Quote.objects.filter(pk__in=quote_ids).values_list('pk', flat=True))
+        if missing:
+            return Response({'quote_ids': f'Ukjente tilbud: {sorted(missing)}'}, status=status.HTTP_400_BAD_REQUEST)
+        job = serializer.save(created_by=request.user, total=len(quote_ids))
+        enqueue_batch_job(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    def get_pdf_batch_job(self, request, job_id):
+        job = get_object_or_404(QuotePDFBatchJob, pk=job_id)
+        if not (request.user.is_staff or job.created_by_id == request.user.id):
+            raise PermissionDenied("Du har ikke tilgang til denne jobben.")
+        return job
+
+    @action(detail=False, methods=['get'], url_path=r'pdf-batch/(?P<job_id>\d+)')
+    def pdf_batch_status(self, request, job_id=None):
+        job = self.get_pdf_batch_job(request, job_id)
+        return Response(QuotePDFBatchJobSerializer(job, context={'request': request}).data)
+
+    @action(detail=False, methods=['get'], url_path=r'pdf-batch/(?P<job_id>\d+)/download')
+    def pdf_batch_download(self, request, job_id=None):
+        job = self.get_pdf_batch_job(request, job_id)
+        if job.status != 'completed' or not job.archive:
+            return Response({'detail': 'Jobben er ikke ferdig ennå.'}, status=status.HTTP_409_CONFLICT)
+        return FileResponse(job.archive.open('rb'), as_attachment=True,
+                            filename=f'tilbud_{job.id}.zip', content_type='application/zip')
+
+class QuoteLineItemViewSet(QueryPlannerMixin, viewsets.ModelViewSet):
     """ API endpoint for tilbudslinjer. """
-    queryset = QuoteLineItem.objects.all().select_related('elevator_type')
+    queryset = QuoteLineItem.objects.all()
     serializer_class = QuoteLineItemSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -398,84 +731,32 @@ class QuoteLineItemViewSet(viewsets.ModelViewSet):
         return Response({"message": "Test create called successfully"}, status=status.HTTP_201_CREATED)
 
 class QuotePDFView(View):
-    """ Genererer en PDF-versjon av et spesifikt tilbud. """
-    
-    # Beholder link_callback for evt. andre bilder i templaten,
-    # men den brukes ikke for hovedlogoen lenger.
-    def link_callback(self, uri, rel):
-        # ... (eksisterende link_callback logikk forblir her) ...
-        # Denne kan potensielt forenkles senere hvis den ikke trengs
-        # for annet enn logoen.
-        # Standard fallback:
-        print(f"link_callback called for: {uri}")
-        return uri
+    """
+    Genererer en PDF-versjon av et spesifikt tilbud.
+    Ferdige PDF-er caches på disk under MEDIA_ROOT, nøklet på tilbudets innhold,
+    slik at gjentatte nedlastinger serveres som fil uten å kjøre xhtml2pdf.
+    """
 
     def get(self, request, *args, **kwargs):
         quote_id = kwargs.get('quote_id')
-        quote = get_object_or_404(Quote.objects.select_related(
-            'opportunity__customer'
-        ).prefetch_related(
-            'line_items__elevator_type'
-        ), pk=quote_id)
-
-        template_path = 'quote_pdf_template.html'
-        template = get_template(template_path)
-        
-        serializer_context = {'request': request}
-        quote_serializer = QuoteSerializer(quote, context=serializer_context)
-        quote_data = quote_serializer.data
-        
-        # --- Ny, direkte måte å finne logo-sti --- 
-        logo_relative_path = 'images/logo.png' 
-        logo_abs_path = None
-        # Søk i STATICFILES_DIRS definert i settings.py
-        for static_dir in getattr(settings, 'STATICFILES_DIRS', []):
-            potential_path = os.path.join(static_dir, logo_relative_path)
-            if os.path.isfile(potential_path):
-                logo_abs_path = potential_path
-                break # Fant logoen, trenger ikke lete mer
-        
-        if not logo_abs_path:
-            # Fallback hvis STATICFILES_DIRS ikke er satt opp riktig 
-            # eller logoen ligger i en app sin static-mappe.
-            # Prøv å bygge stien relativt til BASE_DIR hvis mulig.
-            # Dette er en antagelse og må kanskje justeres basert på din struktur.
-            potential_path_basedir = os.path.join(settings.BASE_DIR, 'heis_api', 'static', logo_relative_path) 
-            if os.path.isfile(potential_path_basedir):
-                 logo_abs_path = potential_path_basedir
-            else:
-                 print(f"Warning: Could not find logo at '{logo_relative_path}' in STATICFILES_DIRS or common locations.")
-        # --- Slutt ny logikk --- 
-
-        context = {
-            'quote': quote,
-            'line_items': quote_data['line_items'],
-            'total_amount': quote_data['total_amount'],
-            'logo_path': logo_abs_path # Send med den absolutte stien vi fant
-        }
-        
-        html = template.render(context)
-        
-        result = BytesIO()
-        # Sender fortsatt med link_callback i tilfelle andre bilder
-        pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result, link_callback=self.link_callback)
-        
-        if not pdf.err:
-            response = HttpResponse(result.getvalue(), content_type='application/pdf')
-            filename = f"Tilbud_{quote.quote_number or quote.id}.pdf"
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
-            
-        print(f"Error generating PDF for quote {quote_id}: {pdf.err}")
-        return HttpResponse("Feil ved generering av PDF.", status=500)
+        quote = get_object_or_404(quote_pdf_queryset(), pk=quote_id)
 
-class OrderViewSet(viewsets.ModelViewSet):
+        try:
+            path = get_cached_quote_pdf(quote, request=request)
+        except QuotePDFError as exc:
+            print(exc)
+            return HttpResponse("Feil ved generering av PDF.", status=500)
+
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=pdf_filename(quote),
+            content_type='application/pdf',
+        )
+
+class OrderViewSet(QueryPlannerMixin, ExportActionMixin, viewsets.ModelViewSet):
     """ API endpoint for Ordrer. """
-    queryset = Order.objects.all().select_related(
-        'customer', 'quote'
-    ).prefetch_related(
-        'line_items__elevator_type' # For å vise detaljer i listen/detaljvisning
-    ).order_by('-order_date')
+    queryset = Order.objects.all().order_by('-order_date') # Relasjoner hentes etter serializeren (QueryPlannerMixin)
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated] # Juster tilgang etter behov
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
@@ -485,28 +766,83 @@ class OrderViewSet(viewsets.ModelViewSet):
         'order_date': ['gte', 'lte', 'exact']
     }
     search_fields = ['id', 'customer__name', 'quote__quote_number']
+    export_columns = [
+        ('id', 'id'), ('order_date', 'order_date'), ('status', 'status'), ('customer_id', 'customer_id'),
+        ('customer_name', 'customer__name'), ('quote_number', 'quote__quote_number'),
+        ('total_amount', 'total_amount'), ('created_at', 'created_at'),
+    ]
 
     # Tillater ikke direkte oppretting av ordre via POST til /orders/
     # Ordre skal opprettes via 'create-order' action på QuoteViewSet.
     http_method_names = ['get', 'put', 'patch', 'delete', 'head', 'options'] # Fjerner 'post'
 
-    # TODO: Implementer logikk for å oppdatere total_amount hvis ordrelinjer endres/slettes
+    # total_amount er read-only og vedlikeholdes av OrderLineItem (se order_totals_batch)
 
 
-class OrderLineItemViewSet(viewsets.ModelViewSet):
+class OrderLineItemViewSet(QueryPlannerMixin, ExportActionMixin, viewsets.ModelViewSet):
     """ API endpoint for Ordrelinjer. """
-    queryset = OrderLineItem.objects.all().select_related('elevator_type')
+    queryset = OrderLineItem.objects.all()
     serializer_class = OrderLineItemSerializer
     permission_classes = [permissions.IsAuthenticated] # Juster tilgang
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['order']
+    filterset_fields = {
+        'order': ['exact'],
+        # Årsuttrekk av linjer for regnskap
+        'order__order_date': ['gte', 'lte'],
+        'order__status': ['exact', 'in'],
+    }
+    export_columns = [
+        ('id', 'id'), ('order_id', 'order_id'), ('order_date', 'order__order_date'),
+        ('order_status', 'order__status'), ('customer_name', 'order__customer__name'),
+        ('elevator_type', 'elevator_type__name'), ('quantity', 'quantity'),
+        ('unit_price_at_order', 'unit_price_at_order'), ('line_total', 'line_total'),
+    ]
+
+    # Order.total_amount regnes om én gang per forespørsel, også når en liste
+    # med linjer sendes inn samtidig (POST med JSON-array).
+    def create(self, request, *args, **kwargs):
+        many = isinstance(request.data, list)
+        serializer = self.get_serializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data) if not many else {}
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
-    # TODO: Logikk for å oppdatere Order.total_amount ved CUD
+    def perform_create(self, serializer):
+        with order_totals_batch():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with order_totals_batch():
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        with order_totals_batch():
+            instance.delete()
+
+# ViewSet for Servicehistorikk (Read Only)
+class ServiceViewSet(QueryPlannerMixin, ExportActionMixin, viewsets.ReadOnlyModelViewSet):
+    """ Servicehistorikk per heis (lesing og eksport). """
+    queryset = Service.objects.all().order_by('-service_date', '-id')
+    serializer_class = ServiceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {
+        'elevator': ['exact'],
+        'elevator__customer': ['exact'],
+        'completed': ['exact'],
+        'service_date': ['gte', 'lte', 'exact'],
+    }
+    export_columns = [
+        ('id', 'id'), ('service_date', 'service_date'), ('elevator_id', 'elevator_id'),
+        ('elevator_serial', 'elevator__serial_number'), ('customer_name', 'elevator__customer__name'),
+        ('completed', 'completed'), ('description', 'description'),
+    ]
 
 # ViewSet for Fravær (kun admin har full tilgang)
-class AbsenceViewSet(viewsets.ModelViewSet):
+class AbsenceViewSet(QueryPlannerMixin, viewsets.ModelViewSet):
     """ API endpoint for å administrere fravær. """
-    queryset = Absence.objects.all().select_related('user').order_by('-start_date')
+    queryset = Absence.objects.all().order_by('-start_date')
     serializer_class = AbsenceSerializer
     # Kun admin kan opprette/endre/slette, andre kan kanskje lese?
     permission_classes = [IsAdminOrReadOnly] 
@@ -518,17 +854,145 @@ class AbsenceViewSet(viewsets.ModelViewSet):
         'end_date': ['gte', 'lte', 'exact']
     }
 
-    # Kan legge til logikk her for å f.eks. validere datoer, 
-    # eller automatisk sette 'registered_by' hvis det feltet legges til.
-    # def perform_create(self, serializer):
-    #     serializer.save(registered_by=self.request.user)
+    def perform_create(self, serializer):
+        self._save_checked(serializer)
+
+    def perform_update(self, serializer):
+        self._save_checked(serializer)
+
+    def _save_checked(self, serializer):
+        # Serializeren sjekker overlapp; save() sjekker på nytt med brukeren låst (samtidige forespørsler)
+        try:
+            serializer.save()
+        except DjangoValidationError as exc:
+            raise ValidationError(as_serializer_error(exc))
+
+    @action(detail=False, methods=['get'])
+    def absent(self, request):
+        """ Brukere med fravær i perioden (?start=&end=, end inkludert), med fraværene. """
+        start, end = parse_date_range(request.query_params, default_days=1)
+        absent = absences.absent_users(start, end)
+        users = User.objects.filter(pk__in=list(absent)).order_by('username').values(
+            'id', 'username', 'first_name', 'last_name')
+        return Response({
+            'start': start,
+            'end': end,
+            'users': [{**user, 'absences': absent[user['id']]} for user in users],
+        })
+
+    @action(detail=False, methods=['get'], url_path='free-days')
+    def free_days(self, request):
+        """ Dager uten fravær for én bruker: ?user=<id>&start=&end=. """
+        user_id = request.query_params.get('user', '')
+        if not user_id.isdigit():
+            raise ValidationError({'user': 'Må være en bruker-ID.'})
+        start, end = parse_date_range(request.query_params)
+        free = absences.free_days(int(user_id), start, end)
+        return Response({
+            'user': int(user_id),
+            'start': start,
+            'end': end,
+            'free_days': free,
+            'absent_days': (end - start).days + 1 - len(free),
+        })
+
+# ViewSet for tilgjengelighetsmatrise (tekniker x dag)
+class AvailabilityViewSet(viewsets.ViewSet):
+    """
+    Returnerer en kompakt tilgjengelighetsmatrise for alle aktive teknikere.
+    Bruk ?start=YYYY-MM-DD&end=YYYY-MM-DD (end inkludert, default 7 dager frem).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        start, end = parse_date_range(request.query_params)
+        return Response(build_availability_matrix(start, end))
+
+class SellerDashboardView(APIView):
+    """
+    Nøkkeltall for selger-dashboardet, beregnet med aggregater i databasen.
+    Resultatet caches kort per bruker.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    cache_timeout = 60 # sekunder
+
+    def get(self, request):
+        cache_key = f'seller-dashboard:{request.user.pk}'
+        stats = cache.get(cache_key)
+        if stats is None:
+            stats = self.compute_stats()
+            cache.set(cache_key, stats, self.cache_timeout)
+        return Response(stats)
+
+    def compute_stats(self):
+        month_start = timezone.localdate().replace(day=1)
+        month_start_dt, _ = day_bounds(month_start, month_start)
+
+        opportunity_stats = SalesOpportunity.objects.aggregate(
+            total_opportunities=Count('id'),
+            won_this_month=Count('id', filter=Q(status='won', created_at__gte=month_start_dt)),
+            pipeline_value=Coalesce(
+                Sum('estimated_value', filter=~Q(status='lost')),
+                Value(0, output_field=DecimalField(max_digits=12, decimal_places=2)),
+            ),
+        )
+        quote_stats = Quote.objects.aggregate(
+            active_quotes=Count('id', filter=Q(status__in=['draft', 'sent'])),
+        )
+        recent_customers = list(
+            Customer.objects.order_by('-created_at').values('id', 'name', 'city', 'email')[:5]
+        )
+        return {
+            **opportunity_stats,
+            **quote_stats,
+            'recent_customers': recent_customers,
+        }
+
+class ImportView(APIView):
+    """
+    Opplasting av CSV/XLSX for import: POST /api/imports/<customers|elevators>/ med
+    multipart-feltet `file` (og ev. dry_run=true). Svarer med antall og feil per rad.
+    """
+    permission_classes = [IsAdminOrReadOnly]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, kind):
+        if kind not in IMPORTERS:
+            raise NotFound(f"Ukjent type '{kind}'. Gyldige: {', '.join(sorted(IMPORTERS))}.")
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': 'Påkrevd.'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', request.query_params.get('dry_run', ''))).lower() in TRUE_VALUES
+        try:
+            # Store opplastinger ligger i en midlertidig fil og leses derfra i bolker
+            result = import_file(kind, upload.file, upload.name, dry_run=dry_run)
+        except ImportFileError as exc:
+            return Response({'file': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result.as_dict())
+
+class TypeaheadView(APIView):
+    """
+    Autofullfør for nedtrekkslister: /api/typeahead/<type>/?q=<prefiks>&limit=.
+    Slås opp i en minneindeks per prosess (se typeahead.py), ikke i databasen.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, kind):
+        if kind not in typeahead.SOURCES:
+            raise NotFound(f"Ukjent type '{kind}'. Gyldige: {', '.join(sorted(typeahead.SOURCES))}.")
+        try:
+            limit = int(request.query_params.get('limit', typeahead.DEFAULT_LIMIT))
+        except ValueError:
+            limit = typeahead.DEFAULT_LIMIT
+        limit = max(1, min(limit, typeahead.MAX_LIMIT))
+        return Response(typeahead.search(kind, request.query_params.get('q', ''), limit))
 
 # ViewSet for Prosjektsammendrag (Read Only)
-class ProjectSummaryViewSet(viewsets.ReadOnlyModelViewSet):
+class ProjectSummaryViewSet(QueryPlannerMixin, viewsets.ReadOnlyModelViewSet):
     """ Viser et sammendrag av salgsmuligheter med relatert status. """
     serializer_class = ProjectSummarySerializer
     permission_classes = [permissions.IsAuthenticated] # Admin/Selger?
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     # Filtrering/Søk kan legges til her om ønskelig
     filterset_fields = {
         'status': ['exact', 'in'], 
@@ -538,6 +1002,7 @@ class ProjectSummaryViewSet(viewsets.ReadOnlyModelViewSet):
         # 'order_status': ['exact', 'isnull'],
     }
     search_fields = ['name', 'customer__name']
+    ordering_fields = ['created_at', 'estimated_value', 'last_quote_total', 'order_total']
 
     def get_queryset(self):
         # Subquery for å hente status for det siste (nyeste) tilbudet
@@ -550,12 +1015,18 @@ class ProjectSummaryViewSet(viewsets.ReadOnlyModelViewSet):
             quote__opportunity=OuterRef('pk') # Kobler via Quote til Opportunity
         )
 
-        queryset = SalesOpportunity.objects.select_related('customer').annotate(
+        queryset = SalesOpportunity.objects.annotate(
             # Henter status for siste tilbud, setter '-' hvis ingen tilbud finnes
             last_quote_status=Coalesce(
                 Subquery(latest_quote_sq.values('status')[:1]),
                 Value('-', output_field=CharField())
             ),
+            # Lagret totalsum for siste tilbud (0 hvis ingen tilbud)
+            last_quote_total=Coalesce(
+                Subquery(latest_quote_sq.values('total_amount')[:1]),
+                Value(0, output_field=DecimalField(max_digits=12, decimal_places=2))
+            ),
+             order_total=Subquery(order_sq.values('total_amount')[:1]),
              # Henter ID for ordren, setter None hvis ingen ordre finnes
              order_id=Subquery(order_sq.values('id')[:1]),
              # Henter status for ordren, setter '-' hvis ingen ordre finnes
@@ -581,6 +1052,6 @@ class ProjectSummaryViewSet(viewsets.ReadOnlyModelViewSet):
         #     entry.last_quote_status_display = quote_status_map.get(entry.last_quote_status, entry.last_quote_status)
         #     entry.order_status_display = order_status_map.get(entry.order_status, entry.order_status)
             
-        return queryset
+        return self.plan_queryset(queryset)
 
 # Setup the router in urls.py
\ No newline at end of file
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'heis_api.query_budget.QueryBudgetMiddleware',  # Spørringsteller i headere (kun DEBUG)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
@@ -72,6 +73,12 @@ CORS_ALLOWED_ORIGINS = os.getenv(
 # ]
 
 CORS_ALLOW_CREDENTIALS = True
+# Lar frontend lese spørringsheaderne fra QueryBudgetMiddleware
+CORS_EXPOSE_HEADERS = ['X-Query-Count', 'X-Query-Time-Ms', 'X-Query-Duplicates']
+
+# Spørringsteller per forespørsel (headere + advarsel ved mistenkt N+1)
+QUERY_BUDGET_HEADERS = os.getenv('QUERY_BUDGET_HEADERS', str(DEBUG)).lower() == 'true'
+QUERY_BUDGET_DUPLICATE_WARNING = 5
 
 # Legg til i produksjon
 if not DEBUG:
@@ -172,4 +179,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 import os # Sørg for at os er importert øverst i filen om den ikke er det
 
 MEDIA_URL = '/media/' 
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Maks størrelse på disk-cachen for tilbuds-PDF-er (MEDIA_ROOT/quote_pdf_cache)
+QUOTE_PDF_CACHE_MAX_BYTES = int(os.getenv('QUOTE_PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+# Antall prosesser for bakgrunnsrendering av PDF-batcher (None = antall kjerner, 0 = i samme tråd)
+QUOTE_PDF_BATCH_WORKERS = int(os.environ['QUOTE_PDF_BATCH_WORKERS']) if os.getenv('QUOTE_PDF_BATCH_WORKERS') else None
+# Jobber som har stått som 'running' lenger enn dette (f.eks. etter omstart midt i en batch), kjøres på nytt
+QUOTE_PDF_BATCH_STALE_MINUTES = int(os.getenv('QUOTE_PDF_BATCH_STALE_MINUTES', 60))
+
+# Sentroider for postnummer til offline geokoding (postnummer;sted;breddegrad;lengdegrad;presisjon).
+# Den medfølgende filen er bygget fra GeoNames med `manage.py build_postcode_centroids`.
+POSTCODE_CENTROIDS_FILE = os.getenv('POSTCODE_CENTROIDS_FILE', str(BASE_DIR / 'heis_api' / 'data' / 'postcode_centroids.csv'))
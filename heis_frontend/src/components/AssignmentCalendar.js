@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useCallback, useRef } from 'react';
 import axios from 'axios';
 import FullCalendar from '@fullcalendar/react';
 import dayGridPlugin from '@fullcalendar/daygrid';
@@ -38,6 +38,8 @@ const AssignmentCalendar = () => {
     const [isModalOpen, setIsModalOpen] = useState(false);
     const [editingAssignment, setEditingAssignment] = useState(null);
     const [modalInitialDate, setModalInitialDate] = useState(null);
+    // Husker synlig periode slik at vi kan hente på nytt etter lagring
+    const visibleRange = useRef(null);
 
     // Henter brukerinfo fra localStorage
     let userRole = null;
@@ -53,6 +55,10 @@ const AssignmentCalendar = () => {
     }
 
     const fetchEvents = useCallback(async (fetchInfo) => {
+        if (fetchInfo) {
+            visibleRange.current = fetchInfo;
+        }
+        fetchInfo = visibleRange.current;
         setIsLoading(true);
         setError(null);
         
@@ -65,29 +71,26 @@ const AssignmentCalendar = () => {
         const startDate = fetchInfo && fetchInfo.startStr ? fetchInfo.startStr.split('T')[0] : null;
         const endDate = fetchInfo && fetchInfo.endStr ? fetchInfo.endStr.split('T')[0] : null;
 
-        let assignmentsUrl = `${API_BASE_URL}/api/assignments/`;
+        // Kalenderfeeden returnerer kun tildelte, planlagte oppdrag i vinduet
+        let assignmentsUrl = `${API_BASE_URL}/api/assignments/calendar/`;
         let absencesUrl = `${API_BASE_URL}/api/absences/`;
         const usersUrl = `${API_BASE_URL}/api/users/`; // Brukere hentes alltid fullt ut for ressursvisning
 
-        // Bygg query-parametre for datoer hvis de finnes
-        const dateParams = [];
-        if (startDate) dateParams.push(`start_date=${startDate}`);
-        if (endDate) dateParams.push(`end_date=${endDate}`);
-        const queryParams = dateParams.join('&');
-
-        if (queryParams) {
-            assignmentsUrl += `?${queryParams}`;
-            absencesUrl += `?${queryParams}`;
+        const assignmentParams = [];
+        if (startDate) assignmentParams.push(`start=${startDate}`);
+        if (endDate) assignmentParams.push(`end=${endDate}`);
+        // Teknikere ser kun egne oppdrag
+        if (userRole === 'tekniker' && userId) assignmentParams.push(`assigned_to=${userId}`);
+        if (assignmentParams.length) {
+            assignmentsUrl += `?${assignmentParams.join('&')}`;
         }
-        
-        // Hvis brukerrollen er tekniker og vi har en userId, filtrer oppdrag på den teknikeren
-        // Dette overstyrer eventuelle datofiltre for oppdrag hvis begge er satt, 
-        // eller legges til hvis ingen datofiltre er satt.
-        if (userRole === 'tekniker' && userId) {
-            assignmentsUrl = `${API_BASE_URL}/api/assignments/?assigned_to=${userId}`;
-            // Hvis vi også har datofiltre, kan vi legge dem til:
-            // if (queryParams) assignmentsUrl += `&${queryParams}`; 
-            // For nå, la oss prioritere assigned_to filteret for teknikere.
+
+        // Fravær som overlapper perioden
+        const absenceParams = [];
+        if (startDate) absenceParams.push(`end_date__gte=${startDate}`);
+        if (endDate) absenceParams.push(`start_date__lte=${endDate}`);
+        if (absenceParams.length) {
+            absencesUrl += `?${absenceParams.join('&')}`;
         }
 
         try {
@@ -108,9 +111,8 @@ const AssignmentCalendar = () => {
             setResources(formattedResources);
 
             // Behandle oppdrag (legger til resourceId og farge)
-            const assignments = assignmentsRes.data.results || assignmentsRes.data;
+            const assignments = assignmentsRes.data;
             const formattedAssignmentEvents = assignments
-                .filter(a => a.assigned_to && a.scheduled_date) // Vis kun tildelte OG planlagte
                 .map(assignment => ({
                     id: `assign_${assignment.id}`,
                     resourceId: assignment.assigned_to.toString(),
@@ -150,7 +152,7 @@ const AssignmentCalendar = () => {
         } finally {
             setIsLoading(false);
         }
-    }, []);
+    }, [userRole, userId]);
 
     // Hjelpefunksjon for å legge til en dag (for FullCalendar allDay end date)
     const addOneDay = (dateString) => {
@@ -165,19 +167,30 @@ const AssignmentCalendar = () => {
         }
     };
 
-    // Hent data når komponenten lastes
-    useEffect(() => {
-        fetchEvents();
-    }, [userRole, userId, fetchEvents]); // Endret fetch-funksjon
-
     // Åpne modal for redigering når et event klikkes
-    const handleEventClick = (clickInfo) => {
+    const handleEventClick = async (clickInfo) => {
         const eventType = clickInfo.event.extendedProps.eventType;
         if (eventType === 'assignment') {
-            // Åpne oppdragsmodal som før
-            setEditingAssignment(clickInfo.event.extendedProps);
-            setModalInitialDate(null);
-            setIsModalOpen(true);
+            // Feeden er kompakt, så hent hele oppdraget før redigering
+            try {
+                const token = localStorage.getItem('token');
+                const response = await axios.get(
+                    `${API_BASE_URL}/api/assignments/${clickInfo.event.extendedProps.id}/`,
+                    { headers: { 'Authorization': `Token ${token}` } }
+                );
+                const detail = response.data;
+                setEditingAssignment({
+                    ...detail,
+                    customer: detail.customer?.id ?? detail.customer,
+                    elevator: detail.elevator?.id ?? detail.elevator,
+                    assigned_to: detail.assigned_to?.id ?? detail.assigned_to,
+                });
+                setModalInitialDate(null);
+                setIsModalOpen(true);
+            } catch (err) {
+                console.error('Kunne ikke hente oppdrag:', err);
+                setError('Kunne ikke hente oppdraget.');
+            }
         } else if (eventType === 'absence') {
             // Korrigerer formatering av sluttdato for alert
             const endDate = clickInfo.event.end ? new Date(clickInfo.event.end.getTime() - 1) : null; // Trekk fra 1 ms for å få riktig dato
@@ -258,6 +271,7 @@ const AssignmentCalendar = () => {
                 resources={resources} 
                 resourceAreaHeaderContent='Ansatte' // Tittel på ressurskolonnen
                 events={[...assignmentEvents, ...absenceEvents]} 
+                datesSet={fetchEvents} // Henter kun synlig periode ved navigering
                 eventClick={handleEventClick} 
                 select={handleDateSelect} 
                 // Legger til eventContent prop
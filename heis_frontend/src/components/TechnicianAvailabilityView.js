@@ -30,10 +30,8 @@ const TechnicianAvailabilityView = () => {
     const [startDate, setStartDate] = useState(formatDateISO(new Date()));
     const [endDate, setEndDate] = useState(formatDateISO(getDateOffset(7)));
     
-    // State for hentet data
-    const [technicians, setTechnicians] = useState([]);
-    const [assignments, setAssignments] = useState([]);
-    const [absences, setAbsences] = useState([]);
+    // State for hentet matrise (tekniker x dag) fra /api/availability/
+    const [matrix, setMatrix] = useState(null);
     
     const [isLoading, setIsLoading] = useState(false);
     const [error, setError] = useState('');
@@ -41,121 +39,60 @@ const TechnicianAvailabilityView = () => {
     // Effekt for å hente data når datoer endres
     useEffect(() => {
         if (startDate && endDate && new Date(endDate) >= new Date(startDate)) {
-            fetchAllData(startDate, endDate);
+            fetchAvailability(startDate, endDate);
         }
     }, [startDate, endDate]);
 
-    const fetchAllData = async (start, end) => {
+    const fetchAvailability = async (start, end) => {
         setIsLoading(true);
         setError('');
-        console.log(`Henter data for ${start} til ${end}`);
 
         const token = localStorage.getItem('token');
-        const config = { headers: { 'Authorization': `Token ${token}` } };
-        
-        // Sjekk om start og end er definert før du bruker dem
-        const startDate = start ? start.toISOString().split('T')[0] : null;
-        const endDate = end ? end.toISOString().split('T')[0] : null;
-
-        // Bygg URLer med dato-filtrering hvis start og end finnes
-        const assignmentsUrl = startDate && endDate ? `${API_BASE_URL}/api/assignments/?start_date=${startDate}&end_date=${endDate}` : `${API_BASE_URL}/api/assignments/`;
-        const absencesUrl = startDate && endDate ? `${API_BASE_URL}/api/absences/?start_date=${startDate}&end_date=${endDate}` : `${API_BASE_URL}/api/absences/`;
-        const usersUrl = `${API_BASE_URL}/api/users/`; // Antar at brukerlisten ikke trenger datofiltrering her
+        const config = {
+            headers: { 'Authorization': `Token ${token}` },
+            params: { start, end }
+        };
 
         try {
-            const [assignmentRes, absenceRes, userRes] = await Promise.all([
-                axios.get(assignmentsUrl, config),
-                axios.get(absencesUrl, config),
-                axios.get(usersUrl, config)
-            ]);
-
-            setAssignments(assignmentRes.data.results || assignmentRes.data);
-            setAbsences(absenceRes.data.results || absenceRes.data);
-            setTechnicians(userRes.data.results || userRes.data);
-            console.log('Data hentet:', { 
-                assignments: assignmentRes.data.results || assignmentRes.data,
-                absences: absenceRes.data.results || absenceRes.data,
-                technicians: userRes.data.results || userRes.data 
-            });
-
+            // Matrisen beregnes på serveren med datoavgrensede spørringer
+            const response = await axios.get(`${API_BASE_URL}/api/availability/`, config);
+            setMatrix(response.data);
         } catch (err) {
             console.error('Feil ved henting av tilgjengelighetsdata:', err.response || err.message);
             setError('Kunne ikke hente nødvendig data for tilgjengelhet.');
-            setAssignments([]);
-            setAbsences([]);
-            setTechnicians([]);
+            setMatrix(null);
         } finally {
             setIsLoading(false);
         }
     };
 
-    // ----- Prosesserer hentet data for å bygge tilgjengelighetsmatrise ----- 
+    const technicians = matrix ? matrix.technicians : [];
+
+    // ----- Gjør om kompakt matrise til oppslag per tekniker og dato ----- 
     const availabilityData = useMemo(() => {
-        if (!technicians.length || (!assignments.length && !absences.length) || !startDate || !endDate) {
+        if (!matrix) {
             return {};
         }
-        console.log("Prosesserer data for tilgjengelighet...");
-
         const availability = {};
-        const start = new Date(startDate + 'T00:00:00'); // Sikrer start på dagen
-        const end = new Date(endDate + 'T00:00:00');   // Sikrer start på dagen
-
-        // Initialiser struktur for hver tekniker
-        technicians.forEach(tech => {
+        matrix.technicians.forEach(tech => {
             availability[tech.id] = {};
-        });
-
-        // Gå gjennom hver dag i tidsrommet
-        let currentDate = new Date(start);
-        while (currentDate <= end) {
-            const currentDateStr = formatDateISO(currentDate);
-            
-            // Initialiser dagen for hver tekniker
-            technicians.forEach(tech => {
-                availability[tech.id][currentDateStr] = { status: 'free', details: [] };
-            });
-
-            // Sjekk fravær for denne dagen
-            absences.forEach(absence => {
-                const absenceStart = new Date(absence.start_date + 'T00:00:00');
-                const absenceEnd = new Date(absence.end_date + 'T00:00:00');
-                if (currentDate >= absenceStart && currentDate <= absenceEnd) {
-                    if (availability[absence.user] && availability[absence.user][currentDateStr]) {
-                        availability[absence.user][currentDateStr] = { 
-                            status: 'absence', 
-                            details: [`Fravær: ${absence.absence_type_display}`] 
-                        };
-                    }
+            matrix.days.forEach((dateStr, idx) => {
+                const absenceType = tech.absence[idx];
+                const assignmentCount = tech.assignments[idx];
+                if (absenceType) {
+                    availability[tech.id][dateStr] = {
+                        status: 'absence',
+                        details: [`Fravær: ${matrix.absence_types[absenceType] || absenceType}`]
+                    };
+                } else if (assignmentCount > 0) {
+                    availability[tech.id][dateStr] = { status: 'busy_assignment', count: assignmentCount };
+                } else {
+                    availability[tech.id][dateStr] = { status: 'free' };
                 }
             });
-
-            // Sjekk oppdrag for denne dagen (kun for de som ikke allerede har fravær)
-            assignments.forEach(assignment => {
-                // Sikrer at scheduled_date er gyldig
-                if (!assignment.scheduled_date) return;
-                
-                const assignmentStart = new Date(assignment.scheduled_date);
-                // Bruker deadline for å definere slutt, ellers bare startdagen
-                const assignmentEnd = assignment.deadline_date ? new Date(assignment.deadline_date + 'T23:59:59') : new Date(assignmentStart.toISOString().split('T')[0] + 'T23:59:59');
-                
-                const techId = assignment.assigned_to;
-                
-                // Sjekker om dagen faller innenfor oppdragsperioden OG om teknikeren ikke har fravær
-                if (techId && availability[techId] && availability[techId][currentDateStr]?.status !== 'absence' && 
-                    currentDate >= new Date(assignmentStart.toISOString().split('T')[0] + 'T00:00:00') && 
-                    currentDate <= assignmentEnd) 
-                {
-                    availability[techId][currentDateStr].status = 'busy_assignment';
-                    availability[techId][currentDateStr].details.push(`Oppdrag: ${assignment.title}`);
-                }
-            });
-
-            // Gå til neste dag
-            currentDate.setDate(currentDate.getDate() + 1);
-        }
-        console.log("Prosessert availability:", availability);
+        });
         return availability;
-    }, [technicians, assignments, absences, startDate, endDate]);
+    }, [matrix]);
     // ------------------------------------------------------------------------
     
     // Hjelpefunksjon for å få alle datoer i range (til tabell-header)
@@ -236,8 +173,8 @@ const TechnicianAvailabilityView = () => {
                                             cellTitle = cellContent;
                                         } else if (dayData?.status === 'busy_assignment') {
                                             cellClass = 'status-busy';
-                                            cellContent = `${dayData.details.length} oppdrag`; // Viser antall oppdrag
-                                            cellTitle = dayData.details.join('\n'); // Viser detaljer på hover
+                                            cellContent = `${dayData.count} oppdrag`; // Viser antall oppdrag
+                                            cellTitle = cellContent;
                                         }
                                         
                                         return (
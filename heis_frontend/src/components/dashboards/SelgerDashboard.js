@@ -31,45 +31,16 @@ const SelgerDashboard = () => {
             const token = localStorage.getItem('token');
             const headers = { 'Authorization': `Token ${token}` };
 
-            // Hent salgsmuligheter
-            const opportunitiesRes = await axios.get(`${API_BASE_URL}/api/sales-opportunities/`, { headers });
-            const opportunities = opportunitiesRes.data.results || opportunitiesRes.data;
-
-            // Hent kunder
-            const customersRes = await axios.get(`${API_BASE_URL}/api/customers/`, { headers });
-            const customers = customersRes.data.results || customersRes.data;
-
-            // Hent tilbud
-            const quotesRes = await axios.get(`${API_BASE_URL}/api/quotes/`, { headers });
-            const quotes = quotesRes.data.results || quotesRes.data;
-
-            // Beregn statistikk
-            const now = new Date();
-            const thisMonth = now.getMonth();
-            const thisYear = now.getFullYear();
-
-            const wonThisMonth = opportunities.filter(opp => {
-                const createdDate = new Date(opp.created_at);
-                return opp.status === 'won' && 
-                       createdDate.getMonth() === thisMonth && 
-                       createdDate.getFullYear() === thisYear;
-            }).length;
-
-            const totalValue = opportunities
-                .filter(opp => opp.status !== 'lost')
-                .reduce((sum, opp) => sum + (parseFloat(opp.estimated_value) || 0), 0);
-
-            const activeQuotes = quotes.filter(q => q.status === 'sent' || q.status === 'draft').length;
-
-            // Siste 5 kunder
-            const recentCustomers = customers.slice(0, 5);
+            // Nøkkeltallene beregnes med aggregater på serveren
+            const response = await axios.get(`${API_BASE_URL}/api/dashboard/seller/`, { headers });
+            const stats = response.data;
 
             setDashboardStats({
-                totalOpportunities: opportunities.length,
-                wonThisMonth,
-                totalValue,
-                activeQuotes,
-                recentCustomers
+                totalOpportunities: stats.total_opportunities,
+                wonThisMonth: stats.won_this_month,
+                totalValue: parseFloat(stats.pipeline_value) || 0,
+                activeQuotes: stats.active_quotes,
+                recentCustomers: stats.recent_customers
             });
         } catch (error) {
             console.error('Feil ved henting av dashboard-statistikk:', error);